@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Compare the accelerated and table driven CRC-16 of OSDP messages"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from osdp import PollCommand  # noqa: E402
+
+
+def main():
+	message = PollCommand(address=0x7F)
+	number = 20000
+	print("{0:>6} {1:>14} {2:>14} {3:>8}".format("bytes", "table (us)", "crc_hqx (us)", "speedup"))
+	for size in (8, 16, 32, 64, 128):
+		data = os.urandom(size)
+		assert message.calculate_crc(data) == message.calculate_crc_with_table(data)
+		table = timeit.timeit(lambda: message.calculate_crc_with_table(data), number=number) / number * 1e6
+		accelerated = timeit.timeit(lambda: message.calculate_crc(data), number=number) / number * 1e6
+		print("{0:>6} {1:>14.3f} {2:>14.3f} {3:>7.1f}x".format(size, table, accelerated, table / accelerated))
+
+
+if __name__ == '__main__':
+	main()
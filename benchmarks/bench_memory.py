@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Memory retained by the objects of 10k poll cycles, with and without __slots__"""
+
+import os
+import sys
+import timeit
+import tracemalloc
+from uuid import uuid4
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from osdp import Device, PollCommand, RawCardData, ReplyType, UnknownReply  # noqa: E402
+
+
+# Subclasses without __slots__ get back a per-instance __dict__, as before
+class DictPollCommand(PollCommand):
+	pass
+
+
+class DictRawCardData(RawCardData):
+	pass
+
+
+class DictReply(UnknownReply):
+
+	DataParsers = {
+		ReplyType.RawReaderData: lambda reply: DictRawCardData(*raw_card_data_fields(RawCardData.parse_data(reply)))
+	}
+
+
+def raw_card_data_fields(raw_card_data: RawCardData) -> tuple:
+	return (raw_card_data.reader_number, raw_card_data.format_code, raw_card_data.bit_count, raw_card_data.data)
+
+
+RAW_CARD_DATA_REPLY = bytes.fromhex('53 FF 0F 00 02 50 FF 01 1A 00 CD 22 C7 16 67')
+
+
+def poll_cycle(command_type, reply_type, device: Device, connection_id):
+	command = command_type(address=0x7F)
+	command.build_command(device)
+	reply = reply_type(RAW_CARD_DATA_REPLY, connection_id, command, device)
+	reply.decoded_data
+	return reply
+
+
+def measure(command_type, reply_type, cycles: int) -> tuple:
+	device = Device(address=0x7F, use_crc=False, use_secure_channel=False)
+	connection_id = uuid4()
+	poll_cycle(command_type, reply_type, device, connection_id)
+
+	tracemalloc.start()
+	before = tracemalloc.take_snapshot()
+	replies = [poll_cycle(command_type, reply_type, device, connection_id) for _ in range(cycles)]
+	after = tracemalloc.take_snapshot()
+	tracemalloc.stop()
+
+	statistics = after.compare_to(before, 'filename')
+	retained_bytes = sum(statistic.size_diff for statistic in statistics)
+	retained_blocks = sum(statistic.count_diff for statistic in statistics)
+	elapsed = timeit.timeit(lambda: poll_cycle(command_type, reply_type, device, connection_id), number=cycles)
+	del replies
+	return retained_bytes, retained_blocks, elapsed
+
+
+def main():
+	cycles = 10000
+	print("{0:>10} {1:>16} {2:>16} {3:>12}".format("model", "bytes/10k", "blocks/10k", "seconds"))
+	for name, command_type, reply_type in (
+		("__dict__", DictPollCommand, DictReply),
+		("__slots__", PollCommand, UnknownReply)
+	):
+		retained_bytes, retained_blocks, elapsed = measure(command_type, reply_type, cycles)
+		print("{0:>10} {1:>16} {2:>16} {3:>12.3f}".format(name, retained_bytes, retained_blocks, elapsed))
+
+
+if __name__ == '__main__':
+	main()
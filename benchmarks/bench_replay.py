@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Replay a wire capture through Reply.parse at full speed
+
+Given no capture, one is recorded first from a control panel polling simulated devices.
+Run it under cProfile to see where parsing time goes:
+
+python -m cProfile -s cumtime benchmarks/bench_replay.py bus.osdpcap
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from osdp import (  # noqa: E402
+	CaptureOsdpConnection, CaptureReader, CaptureWriter, ControlPanel, DeviceSimulator, SimulatedDevice,
+	SimulatedOsdpConnection
+)
+
+
+def record(path: str, devices: int, duration: float):
+	simulator = DeviceSimulator([
+		SimulatedDevice(address, card_reads_per_second=5.0, key_presses_per_second=1.0) for address in range(devices)
+	])
+	with CaptureWriter(path) as writer:
+		control_panel = ControlPanel()
+		connection_id = control_panel.start_connection(CaptureOsdpConnection(SimulatedOsdpConnection(simulator), writer))
+		for address in range(devices):
+			control_panel.add_device(connection_id, address, True, False)
+		time.sleep(duration)
+		control_panel.shutdown()
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('capture', nargs='?', help="capture file, recorded from simulated devices when not given")
+	parser.add_argument('--devices', type=int, default=32, help="simulated devices when recording")
+	parser.add_argument('--duration', type=float, default=2.0, help="seconds to record")
+	parser.add_argument('--repeat', type=int, default=5)
+	parser.add_argument('--address', type=int, help="only replay replies of this address")
+	parser.add_argument('--decode', action='store_true', help="also decode reply data")
+	args = parser.parse_args()
+
+	path = args.capture
+	if path is None:
+		path = os.path.join(tempfile.mkdtemp(), 'simulated.osdpcap')
+		record(path, args.devices, args.duration)
+		print("Recorded {0}".format(path))
+
+	with CaptureReader(path) as reader:
+		print("{0} frames".format(len(reader)))
+		for _ in range(args.repeat):
+			print(reader.replay(address=args.address, decode=args.decode))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""MAC and encryption throughput of one secure channel session"""
+
+import os
+import sys
+import timeit
+
+from Crypto.Cipher import AES
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from osdp import SecureChannel  # noqa: E402
+
+
+def established_session() -> SecureChannel:
+	secure_channel = SecureChannel(master_key=os.urandom(16))
+	secure_channel.cuid = os.urandom(8)
+	scbk = secure_channel.calculate_scbk()
+	server_random_number = secure_channel.server_random_number
+	client_random_number = os.urandom(8)
+
+	# Client cryptogram as the PD computes it
+	enc = AES.new(scbk, AES.MODE_ECB).encrypt(bytes([0x01, 0x82]) + server_random_number[:6] + bytes(8))
+	client_cryptogram = AES.new(enc, AES.MODE_ECB).encrypt(server_random_number + client_random_number)
+
+	secure_channel.initialize(secure_channel.cuid, client_random_number, client_cryptogram)
+	secure_channel.establish(os.urandom(16))
+	return secure_channel
+
+
+def uncached_mac(secure_channel: SecureChannel, message: bytes) -> bytes:
+	# One cipher per block, as before the key schedules were cached
+	mac = b'\x00' * 16
+	iv = secure_channel._rmac
+	current_location = 0
+	key = secure_channel._smac1
+	while current_location < len(message):
+		input_buffer = bytearray(message[current_location:(current_location + 16)])
+		if len(input_buffer) < 16:
+			input_buffer.extend(b'\x00' * (16 - len(input_buffer)))
+		current_location += 16
+		if current_location > len(message):
+			key = secure_channel._smac2
+			if len(message) % 16 != 0:
+				input_buffer[len(message) % 16] = 0x80
+		mac = AES.new(key, AES.MODE_CBC, iv).encrypt(bytes(input_buffer))
+		iv = mac
+	return mac
+
+
+def main():
+	secure_channel = established_session()
+	number = 20000
+	print("{0:>6} {1:>16} {2:>16} {3:>16} {4:>16}".format(
+		"bytes", "uncached MAC/s", "MAC/s", "encrypt/s", "decrypt/s"
+	))
+	for size in (8, 16, 32, 64, 128):
+		message = os.urandom(size)
+		encrypted = secure_channel.encrypt_data(message)
+		uncached = number / timeit.timeit(lambda: uncached_mac(secure_channel, message), number=number)
+		mac = number / timeit.timeit(lambda: secure_channel.generate_mac(message, True), number=number)
+		encrypt = number / timeit.timeit(lambda: secure_channel.encrypt_data(message), number=number)
+		decrypt = number / timeit.timeit(lambda: secure_channel.decrypt_data(encrypted), number=number)
+		print("{0:>6} {1:>16.0f} {2:>16.0f} {3:>16.0f} {4:>16.0f}".format(size, uncached, mac, encrypt, decrypt))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""End to end throughput and latency of control panels polling simulated devices over loopback transports
+
+Results are printed and may be saved as JSON with --output, then compared against a
+stored baseline with --baseline. The exit status is 1 when a result regressed by more
+than the tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import timedelta
+from time import perf_counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from osdp import (  # noqa: E402
+	Bus, ControlPanel, DeviceSimulator, FixedPollScheduler, LocalStatusReportCommand, OutputControl,
+	OutputControlCode, OutputControlCommand, OutputControls, Reply, ReplyType, SimulatedDevice,
+	SimulatedOsdpConnection, TcpClientOsdpConnection
+)
+
+
+DEVICE_COUNTS = (1, 8, 32, 126)
+TRANSPORTS = ('simulated', 'tcp')
+MASTER_KEY = bytes(range(16))
+
+
+class UnpacedPollScheduler(FixedPollScheduler):
+	'''
+	Polls back to back without the idle line delay, so the bus runs as fast as the stack allows
+	'''
+
+	def __init__(self):
+		super().__init__(timedelta(0))
+
+	def delay_after_reply(self, device, reply, idle_line_delay: timedelta) -> timedelta:
+		return timedelta(0)
+
+
+class TimedSimulatedDevice(SimulatedDevice):
+	'''
+	Records when each card read leaves the device
+	'''
+
+	def __init__(self, address: int, sent: dict, **kwargs):
+		super().__init__(address, **kwargs)
+		self._sent = sent
+
+	def on_poll(self, command, data: bytes):
+		reply = super().on_poll(command, data)
+		if reply.type == ReplyType.RawReaderData:
+			self._sent[(self.address, reply.data()[4:])] = perf_counter()
+		return reply
+
+
+class TimedControlPanel(ControlPanel):
+	'''
+	Records the time from a card read leaving the device to its callback
+	'''
+
+	def __init__(self, sent: dict, master_key: bytes = None):
+		super().__init__(master_key)
+		self._sent = sent
+		self.latencies = []
+
+	def on_raw_card_data_reply_received(self, address: int, raw_card_data):
+		sent = self._sent.pop((address, raw_card_data.data), None)
+		if sent is not None:
+			self.latencies.append(perf_counter() - sent)
+
+
+def result(name: str, transport: str, devices: int, value: float, unit: str, higher_is_better: bool) -> dict:
+	return {
+		'name': name, 'transport': transport, 'devices': devices, 'value': value, 'unit': unit,
+		'higher_is_better': higher_is_better
+	}
+
+
+def percentile(values: list, fraction: float) -> float:
+	values = sorted(values)
+	return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def start_bus(control_panel: ControlPanel, simulator: DeviceSimulator, transport: str, count: int, secure: bool):
+	if transport == 'tcp':
+		connection = TcpClientOsdpConnection('127.0.0.1', simulator.serve_tcp())
+	else:
+		connection = SimulatedOsdpConnection(simulator)
+	connection_id = control_panel.start_connection(connection, UnpacedPollScheduler())
+	for address in range(count):
+		control_panel.add_device(connection_id, address, True, secure)
+
+	deadline = time.time() + 60.0
+	while time.time() < deadline:
+		online = [control_panel.is_online(connection_id, address) for address in range(count)]
+		if all(online) and (not secure or len(control_panel.secure_channel_establishment_times(connection_id)) == count):
+			return connection_id
+		time.sleep(0.01)
+	raise TimeoutError("Devices did not come online")
+
+
+def measure_polls(transport: str, count: int, duration: float) -> list:
+	simulator = DeviceSimulator([SimulatedDevice(address) for address in range(count)])
+	control_panel = ControlPanel()
+	try:
+		start_bus(control_panel, simulator, transport, count, False)
+		commands = sum(device.command_count for device in simulator.devices.values())
+		cpu_time, start = time.process_time(), perf_counter()
+		time.sleep(duration)
+		elapsed = perf_counter() - start
+		cpu_time = time.process_time() - cpu_time
+		commands = sum(device.command_count for device in simulator.devices.values()) - commands
+	finally:
+		control_panel.shutdown()
+		simulator.close()
+
+	return [
+		result('polls_per_second', transport, count, commands / elapsed, 'polls/s', True),
+		# Simulated devices run in this process, their cost is included
+		result('cpu_per_device', transport, count, cpu_time / elapsed / count * 1000, 'cpu ms/s', False)
+	]
+
+
+def measure_card_latency(transport: str, count: int, duration: float) -> list:
+	sent = {}
+	simulator = DeviceSimulator([
+		TimedSimulatedDevice(address, sent, card_reads_per_second=2.0) for address in range(count)
+	])
+	control_panel = TimedControlPanel(sent)
+	try:
+		start_bus(control_panel, simulator, transport, count, False)
+		control_panel.latencies.clear()
+		time.sleep(duration)
+		latencies = list(control_panel.latencies)
+	finally:
+		control_panel.shutdown()
+		simulator.close()
+
+	if not latencies:
+		return []
+	return [
+		result('card_latency_p50', transport, count, percentile(latencies, 0.5) * 1000, 'ms', False),
+		result('card_latency_p99', transport, count, percentile(latencies, 0.99) * 1000, 'ms', False)
+	]
+
+
+def measure_round_trips(transport: str, count: int, samples: int) -> list:
+	simulator = DeviceSimulator([SimulatedDevice(address) for address in range(count)])
+	control_panel = ControlPanel()
+	round_trips = []
+	try:
+		connection_id = start_bus(control_panel, simulator, transport, count, False)
+		for sample in range(samples):
+			start = perf_counter()
+			control_panel.send_command(connection_id, LocalStatusReportCommand(sample % count))
+			round_trips.append(perf_counter() - start)
+	finally:
+		control_panel.shutdown()
+		simulator.close()
+
+	return [
+		result('send_command_p50', transport, count, percentile(round_trips, 0.5) * 1000, 'ms', False),
+		result('send_command_p90', transport, count, percentile(round_trips, 0.9) * 1000, 'ms', False),
+		result('send_command_p99', transport, count, percentile(round_trips, 0.99) * 1000, 'ms', False)
+	]
+
+
+def per_call(function, number: int) -> float:
+	for i in range(number // 10):
+		function(i)
+	start = perf_counter()
+	for i in range(number):
+		function(i)
+	return (perf_counter() - start) / number
+
+
+def measure_message_costs(count: int, number: int) -> list:
+	results = []
+	output_controls = OutputControls([OutputControl(0, OutputControlCode.PermanentStateOnAbortTimedOperation, 0)])
+	for security in ('plaintext', 'secure'):
+		simulator = DeviceSimulator([SimulatedDevice(address) for address in range(count)])
+		connection = SimulatedOsdpConnection(simulator)
+		connection.open()
+		bus = Bus(connection, None, UnpacedPollScheduler())
+		devices = [bus.add_device(address, True, security == 'secure', MASTER_KEY) for address in range(count)]
+		for device in devices:
+			while device.message_control.sequence == 0 or device.is_establishing_secure_channel:
+				bus.poll_device(device)
+
+		commands = [OutputControlCommand(device.address, output_controls) for device in devices]
+		replies = [
+			simulator.handle_frame(command.build_command(device)) for command, device in zip(commands, devices)
+		]
+
+		build = per_call(lambda i: commands[i % count].build_command(devices[i % count]), number)
+		parse = per_call(lambda i: Reply.parse(replies[i % count], bus.id, commands[i % count], devices[i % count]), number)
+
+		results.append(result('build_command_' + security, None, count, build * 1e6, 'us', False))
+		results.append(result('reply_parse_' + security, None, count, parse * 1e6, 'us', False))
+	return results
+
+
+def run(device_counts, transports, duration: float, samples: int) -> list:
+	results = []
+	for count in device_counts:
+		results.extend(measure_message_costs(count, 5000))
+		for transport in transports:
+			results.extend(measure_polls(transport, count, duration))
+			results.extend(measure_card_latency(transport, count, duration))
+			results.extend(measure_round_trips(transport, count, samples))
+	return results
+
+
+def result_key(entry: dict) -> tuple:
+	return (entry['name'], entry['transport'], entry['devices'])
+
+
+def compare(results: list, baseline: list, tolerance: float) -> list:
+	baseline = {result_key(entry): entry for entry in baseline}
+	regressions = []
+	for entry in results:
+		base = baseline.get(result_key(entry))
+		if base is None or base['value'] == 0:
+			entry['change'] = None
+			continue
+		change = (entry['value'] - base['value']) / base['value']
+		entry['change'] = change
+		if (change < -tolerance) if entry['higher_is_better'] else (change > tolerance):
+			regressions.append(entry)
+	return regressions
+
+
+def print_results(results: list):
+	print("{0:<24} {1:>10} {2:>8} {3:>14} {4:<10} {5:>8}".format(
+		"measurement", "transport", "devices", "value", "unit", "change"
+	))
+	for entry in results:
+		change = entry.get('change')
+		print("{0:<24} {1:>10} {2:>8} {3:>14.3f} {4:<10} {5:>8}".format(
+			entry['name'], entry['transport'] or '-', entry['devices'], entry['value'], entry['unit'],
+			'-' if change is None else '{0:+.1%}'.format(change)
+		))
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--devices', default=','.join(str(count) for count in DEVICE_COUNTS))
+	parser.add_argument('--transports', default=','.join(TRANSPORTS))
+	parser.add_argument('--duration', type=float, default=2.0, help="seconds per throughput and latency run")
+	parser.add_argument('--samples', type=int, default=200, help="send_command round trips per run")
+	parser.add_argument('--output', help="save the results as JSON")
+	parser.add_argument('--baseline', help="JSON results to compare against")
+	parser.add_argument('--tolerance', type=float, default=0.25, help="relative change reported as a regression")
+	args = parser.parse_args()
+
+	results = run(
+		[int(count) for count in args.devices.split(',')], args.transports.split(','), args.duration, args.samples
+	)
+
+	regressions = []
+	if args.baseline:
+		with open(args.baseline) as baseline_file:
+			regressions = compare(results, json.load(baseline_file)['results'], args.tolerance)
+	print_results(results)
+
+	if args.output:
+		with open(args.output, 'w') as output_file:
+			json.dump({
+				'python': platform.python_version(),
+				'platform': platform.platform(),
+				'processor': platform.processor() or platform.machine(),
+				'results': [
+					{key: value for key, value in entry.items() if key != 'change'} for entry in results
+				]
+			}, output_file, indent='\t')
+			output_file.write('\n')
+
+	for entry in regressions:
+		print("Regression: {0} {1} {2} devices {3:+.1%}".format(
+			entry['name'], entry['transport'] or '-', entry['devices'], entry['change']
+		))
+	sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+	main()
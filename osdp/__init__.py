@@ -12,16 +12,17 @@ Python OSDP Module.
 
 
 from ._types import (
-	ReplyType, SecurityBlockType, Control, ErrorCode, Nak, DeviceIdentification, CapabilityFunction,
-	DeviceCapability, DeviceCapabilities, InputStatus, OutputStatus, LocalStatus, ReaderTamperStatus,
-	ReaderStatus, OutputControlCode, OutputControl, OutputControls, TemporaryReaderControlCode,
-	PermanentReaderControlCode, LedColor, ReaderLedControl, ReaderLedControls, ToneCode, ReaderBuzzerControl,
-	TextCommand, ReaderTextOutput, FormatCode, RawCardData, KeypadData, DataEvent
+	ReplyType, SecurityBlockType, CommandPriority, DeviceStatus, ConnectionStatus, FrameDirection, OverflowPolicy,
+	Control, ErrorCode, Nak, DeviceIdentification, CapabilityFunction, DeviceCapability, DeviceCapabilities,
+	InputStatus, OutputStatus, LocalStatus,
+	ReaderTamperStatus, ReaderStatus, OutputControlCode, OutputControl, OutputControls,
+	TemporaryReaderControlCode, PermanentReaderControlCode, LedColor, ReaderLedControl, ReaderLedControls,
+	ToneCode, ReaderBuzzerControl, TextCommand, ReaderTextOutput, FormatCode, RawCardData, KeypadData, DataEvent
 )
 from ._connection import (
 	OsdpConnection, SerialPortOsdpConnection, TcpClientOsdpConnection, TcpServerOsdpConnection
 )
-from ._device import Device
+from ._device import Device, CommandQueueStatistics
 from ._message import Message
 from ._command import (
 	Command, PollCommand, IdReportCommand, DeviceCapabilitiesCommand, LocalStatusReportCommand,
@@ -32,8 +33,26 @@ from ._command import (
 )
 from ._reply import Reply, AckReply, UnknownReply
 from ._secure_channel import SecureChannel
+from ._timeout_policy import ReplyTimeoutPolicy
+from ._reconnect_policy import ReconnectPolicy
+from ._poll_scheduler import PollScheduler, FixedPollScheduler, AdaptivePollScheduler, PollStatistics
+from ._frame_reader import FrameReader
+from ._metrics import MetricsSink, Histogram, MetricsRegistry
+from ._event_stream import EventStream, ReplyEvent, DeviceStatusEvent, ConnectionStatusEvent
+from ._discovery import DiscoveredDevice, AddressScan
 from ._bus import Bus
-from ._control_panel import ControlPanel
+from ._control_panel import ControlPanel, BatchResult
+from ._async_connection import (
+	AsyncOsdpConnection, AsyncSerialPortOsdpConnection, AsyncTcpClientOsdpConnection, AsyncTcpServerOsdpConnection
+)
+from ._async_bus import AsyncBus
+from ._async_control_panel import AsyncControlPanel
+from ._sharded_control_panel import ShardedControlPanel
+from ._tcp_server import TcpServer, TcpPeerOsdpConnection, AsyncTcpServer, AsyncTcpPeerOsdpConnection
+from ._simulator import SimulatedDevice, DeviceSimulator, SimulatedOsdpConnection
+from ._capture import (
+	CaptureWriter, CaptureReader, CapturedFrame, ReplayStatistics, CaptureOsdpConnection, AsyncCaptureOsdpConnection
+)
 
 
 __author__ = 'Ryan Hu<huzhiren@gmail.com>'
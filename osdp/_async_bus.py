@@ -0,0 +1,149 @@
+import asyncio
+import logging
+from datetime import timedelta
+
+from ._device import Device
+from ._command import Command, PollCommand, IdReportCommand, DeviceCapabilitiesCommand
+from ._reply import Reply
+from ._timeout_policy import ReplyTimeoutPolicy
+from ._discovery import DiscoveredDevice
+from ._bus import Bus
+
+log = logging.getLogger('osdp')
+
+
+class AsyncBus(Bus):
+	'''
+	A group of OSDP devices sharing communications, polled from an asyncio event loop.
+	Only the waits on the connection differ from Bus, the rest of the polling is shared.
+	'''
+
+	async def close(self):
+		self._is_shutting_down = True
+		self.cancel_scan()
+		await self._connection.close()
+		self._frame_reader.clear()
+
+	async def run_polling_loop(self):
+		while not self._is_shutting_down:
+			if not self._connection.is_open:
+				self.connection_lost()
+				await asyncio.sleep(self.delay_before_open())
+				if self._is_shutting_down:
+					return
+				try:
+					await self._connection.open()
+				except asyncio.CancelledError:
+					raise
+				except Exception as error:
+					self.connection_failed(error)
+					continue
+				if self._connection.is_open:
+					self.connection_opened()
+
+			await asyncio.sleep(self.delay_before_cycle())
+
+			devices = self.start_cycle()
+			if devices is None:
+				continue
+			for device in devices:
+				if self._is_shutting_down:
+					# Closed while this task waited on the connection
+					return
+				if not self._connection.is_open:
+					break
+				await self.poll_expedited_devices()
+				if self._poll_scheduler.should_poll(device):
+					await self.poll_device(device)
+				self.update_device_status(device)
+			await self.poll_expedited_devices()
+
+			if self._scan is not None:
+				await self.scan_step()
+
+	async def scan_step(self):
+		scan = self._scan
+		for address in scan.next_addresses(self._configured_devices):
+			if self._scan is not scan:
+				return
+			try:
+				discovered = await self.probe_address(address, scan.reply_timeout)
+			except asyncio.CancelledError:
+				raise
+			except Exception as error:
+				self.probe_failed(address, error)
+				await self._connection.close()
+				return
+			self.address_probed(scan, address, discovered)
+		self.scan_pass_completed(scan)
+
+	async def probe_address(self, address: int, reply_timeout: timedelta) -> DiscoveredDevice:
+		for use_crc in (True, False):
+			device = self.probe_device(address, use_crc, reply_timeout)
+			device = self.answering_device(device, await self.probe(device, PollCommand(address)), reply_timeout)
+			if device is not None:
+				break
+		else:
+			return None
+
+		device.timeout_policy = ReplyTimeoutPolicy(retries=1)
+		identification = await self.probe(device, IdReportCommand(address))
+		capabilities = await self.probe(device, DeviceCapabilitiesCommand(address))
+		return self.discovered_device(device, identification, capabilities)
+
+	async def probe(self, device: Device, command: Command) -> Reply:
+		try:
+			reply = await self.send_command_and_receive_reply(bytearray([self.DRIVER_BYTE]), command, device)
+		except TimeoutError:
+			self._frame_reader.clear()
+			return None
+		return self.probe_reply(device, reply)
+
+	async def poll_expedited_devices(self):
+		device = self.next_expedited_device()
+		while device is not None:
+			await self.poll_device(device)
+			device = self.next_expedited_device()
+
+	async def poll_device(self, device: Device):
+		command = self.next_poll_command(device)
+		try:
+			reply = await self.send_command_and_receive_reply(bytearray([self.DRIVER_BYTE]), command, device)
+		except asyncio.CancelledError:
+			raise
+		except Exception as error:
+			if self.exchange_failed(device, command, error):
+				await self._connection.close()
+			return
+
+		if not self.poll_reply_received(reply, device):
+			await self._connection.close()
+			return
+		await asyncio.sleep(self.delay_after_reply(device, reply))
+
+	async def send_command_and_receive_reply(self, data: bytearray, command: Command, device: Device) -> Reply:
+		frame = self.start_exchange(data, command, device)
+		attempts = self.reply_attempts(device)
+		for attempt in range(attempts):
+			# Anything received before the command is written is a late reply to an earlier one
+			self._frame_reader.clear()
+			await self._connection.discard_input()
+			await self._connection.write(frame)
+			self.command_written()
+			try:
+				reply_buffer = await self.receive_frame(device.address)
+			except TimeoutError:
+				self.reply_timed_out(device)
+				if attempt == attempts - 1:
+					raise
+				continue
+			return self.finish_exchange(reply_buffer, command, device)
+
+	async def receive_frame(self, address: int = None) -> bytes:
+		while True:
+			frame = self._frame_reader.next_frame(address)
+			if frame is not None:
+				return frame
+			self.bytes_received(
+				await self._connection.read_available(self._frame_reader.bytes_needed, self._frame_reader.chunk_size)
+			)
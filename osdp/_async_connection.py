@@ -0,0 +1,240 @@
+from abc import ABC, abstractmethod
+import asyncio
+import serial
+
+from ._connection import enable_rs485
+
+
+async def discard_stream_input(reader: asyncio.StreamReader):
+	# A read only completes without waiting when the stream has bytes buffered already
+	while True:
+		read = asyncio.ensure_future(reader.read(4096))
+		await asyncio.sleep(0)
+		if not read.done():
+			read.cancel()
+			try:
+				await read
+			except asyncio.CancelledError:
+				pass
+			return
+		if not read.result():
+			return
+
+
+class AsyncOsdpConnection(ABC):
+
+	@property
+	@abstractmethod
+	def baud_rate(self) -> int:
+		pass
+
+	@property
+	@abstractmethod
+	def is_open(self) -> bool:
+		pass
+
+	@abstractmethod
+	async def open(self):
+		pass
+
+	@abstractmethod
+	async def close(self):
+		pass
+
+	@abstractmethod
+	async def write(self, buf: bytes):
+		pass
+
+	@abstractmethod
+	async def read(self, size: int = 1) -> bytes:
+		pass
+
+	async def read_available(self, minimum: int, maximum: int) -> bytes:
+		return await self.read(minimum)
+
+	def set_read_timeout(self, timeout: float):
+		pass
+
+	async def discard_input(self):
+		pass
+
+
+class AsyncSerialPortOsdpConnection(AsyncOsdpConnection):
+
+	def __init__(self, port: str, baud_rate: int, raspberry_pi: bool = False, read_timeout: float = 2.0):
+		self._port = port
+		self._baud_rate = baud_rate
+		self._read_timeout = read_timeout
+		self.serial_port = None
+		self.raspberry_pi = raspberry_pi
+
+	@property
+	def baud_rate(self) -> int:
+		return self._baud_rate
+
+	@property
+	def is_open(self) -> bool:
+		return self.serial_port is not None and self.serial_port.is_open
+
+	async def open(self):
+		# Non-blocking port, readiness is reported by the event loop
+		self.serial_port = serial.Serial(port=self._port, baudrate=self._baud_rate, timeout=0)
+		if self.raspberry_pi:
+			enable_rs485(self.serial_port.fileno())
+
+	async def close(self):
+		if self.serial_port is not None:
+			self.serial_port.close()
+			self.serial_port = None
+
+	async def write(self, buf: bytes):
+		self.serial_port.write(buf)
+
+	async def read(self, size: int = 1) -> bytes:
+		data = self.serial_port.read(size)
+		if len(data) > 0:
+			return data
+
+		loop = asyncio.get_event_loop()
+		readable = loop.create_future()
+		fd = self.serial_port.fileno()
+		loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+		try:
+			await asyncio.wait_for(readable, self._read_timeout)
+		except asyncio.TimeoutError:
+			return b''
+		finally:
+			loop.remove_reader(fd)
+		return self.serial_port.read(size)
+
+	async def read_available(self, minimum: int, maximum: int) -> bytes:
+		return await self.read(maximum)
+
+	async def discard_input(self):
+		self.serial_port.reset_input_buffer()
+
+	def set_read_timeout(self, timeout: float):
+		self._read_timeout = timeout
+
+
+class AsyncTcpClientOsdpConnection(AsyncOsdpConnection):
+
+	def __init__(self, server: str, port_number: int, read_timeout: float = 2.0):
+		self._server = server
+		self._port_number = port_number
+		self._read_timeout = read_timeout
+		self._reader = None
+		self._writer = None
+
+	@property
+	def baud_rate(self) -> int:
+		return 9600
+
+	@property
+	def is_open(self) -> bool:
+		return self._writer is not None
+
+	async def open(self):
+		self._reader, self._writer = await asyncio.wait_for(
+			asyncio.open_connection(self._server, self._port_number),
+			self._read_timeout
+		)
+
+	async def close(self):
+		if self._writer is not None:
+			self._writer.close()
+		self._reader = None
+		self._writer = None
+
+	async def write(self, buf: bytes):
+		self._writer.write(buf)
+		await self._writer.drain()
+
+	async def read(self, size: int = 1) -> bytes:
+		try:
+			data = await asyncio.wait_for(self._reader.read(size), self._read_timeout)
+		except asyncio.TimeoutError:
+			return b''
+		if len(data) == 0:
+			# Peer closed the connection
+			await self.close()
+		return data
+
+	async def read_available(self, minimum: int, maximum: int) -> bytes:
+		return await self.read(maximum)
+
+	async def discard_input(self):
+		if self._reader is not None:
+			await discard_stream_input(self._reader)
+
+	def set_read_timeout(self, timeout: float):
+		self._read_timeout = timeout
+
+
+class AsyncTcpServerOsdpConnection(AsyncOsdpConnection):
+
+	def __init__(self, port_number: int, read_timeout: float = 2.0):
+		self._port_number = port_number
+		self._read_timeout = read_timeout
+		self._server = None
+		self._accepted = None
+		self._reader = None
+		self._writer = None
+
+	@property
+	def baud_rate(self) -> int:
+		return 9600
+
+	@property
+	def is_open(self) -> bool:
+		return self._writer is not None
+
+	async def open(self):
+		loop = asyncio.get_event_loop()
+		self._accepted = loop.create_future()
+		if self._server is None:
+			self._server = await asyncio.start_server(self._on_client_connected, '0.0.0.0', self._port_number)
+		self._reader, self._writer = await self._accepted
+
+	def _on_client_connected(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+		if self._accepted is None or self._accepted.done():
+			# Only one peer is served at a time
+			writer.close()
+			return
+		self._accepted.set_result((reader, writer))
+
+	async def close(self):
+		if self._writer is not None:
+			self._writer.close()
+		self._reader = None
+		self._writer = None
+
+	async def shutdown(self):
+		await self.close()
+		if self._server is not None:
+			self._server.close()
+			await self._server.wait_closed()
+			self._server = None
+
+	async def write(self, buf: bytes):
+		self._writer.write(buf)
+		await self._writer.drain()
+
+	async def read(self, size: int = 1) -> bytes:
+		try:
+			data = await asyncio.wait_for(self._reader.read(size), self._read_timeout)
+		except asyncio.TimeoutError:
+			return b''
+		if len(data) == 0:
+			await self.close()
+		return data
+
+	async def read_available(self, minimum: int, maximum: int) -> bytes:
+		return await self.read(maximum)
+
+	async def discard_input(self):
+		if self._reader is not None:
+			await discard_stream_input(self._reader)
+
+	def set_read_timeout(self, timeout: float):
+		self._read_timeout = timeout
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+from datetime import timedelta
+from uuid import UUID
+
+from ._types import (
+	DeviceIdentification, DeviceCapabilities, LocalStatus, InputStatus, OutputStatus, ReaderStatus,
+	OutputControls, ReplyType, ReaderLedControls, CommandPriority, OverflowPolicy
+)
+from ._async_connection import AsyncOsdpConnection
+from ._command import (
+	Command, IdReportCommand, DeviceCapabilitiesCommand, LocalStatusReportCommand, InputStatusReportCommand,
+	OutputStatusReportCommand, ReaderStatusReportCommand, OutputControlCommand, ReaderLedControlCommand,
+	KeySetCommand
+)
+from ._reply import Reply
+from ._async_bus import AsyncBus
+from ._poll_scheduler import PollScheduler
+from ._metrics import MetricsSink
+from ._reconnect_policy import ReconnectPolicy
+from ._discovery import AddressScan
+from ._control_panel import ControlPanel, BatchResult
+from ._event_stream import EventStream
+
+
+log = logging.getLogger('osdp')
+
+
+class AsyncControlPanel(ControlPanel):
+	'''
+	Control panel driving every bus from a single asyncio event loop
+	'''
+
+	def __init__(self, master_key: bytes = None, metrics: MetricsSink = None):
+		super().__init__(master_key, metrics)
+		self._polling_tasks = {}
+
+	def start_connection(
+		self, connection: AsyncOsdpConnection, poll_scheduler: PollScheduler = None,
+		reconnect_policy: ReconnectPolicy = None
+	) -> UUID:
+		bus = AsyncBus(
+			connection, self.on_reply_received, poll_scheduler, self._metrics, self._device_status_changed,
+			reconnect_policy, self._connection_status_changed
+		)
+		self._buses[bus.id] = bus
+		self._polling_tasks[bus.id] = asyncio.ensure_future(bus.run_polling_loop())
+		return bus.id
+
+	def events(
+		self,
+		max_size: int = 1024,
+		overflow_policy: OverflowPolicy = OverflowPolicy.DropOldest,
+		event_types=None,
+		block_timeout: float = None
+	) -> EventStream:
+		'''
+		Subscribe to events as ControlPanel does. Events are published from the event loop that
+		consumes them, so a full stream cannot block until there is room and the block policy is refused.
+		'''
+		if overflow_policy == OverflowPolicy.Block:
+			raise ValueError("Overflow policy Block would stall the event loop of an AsyncControlPanel")
+		return super().events(max_size, overflow_policy, event_types, block_timeout)
+
+	async def send_custom_command(self, connection_id: UUID, command: Command):
+		await self.send_command(connection_id, command)
+
+	async def id_report(self, connection_id: UUID, address: int) -> DeviceIdentification:
+		return DeviceIdentification.parse_data(await self.send_command(connection_id, IdReportCommand(address)))
+
+	async def device_capabilities(self, connection_id: UUID, address: int) -> DeviceCapabilities:
+		return DeviceCapabilities.parse_data(
+			await self.send_command(connection_id, DeviceCapabilitiesCommand(address))
+		)
+
+	async def local_status(self, connection_id: UUID, address: int) -> LocalStatus:
+		return LocalStatus.parse_data(await self.send_command(connection_id, LocalStatusReportCommand(address)))
+
+	async def input_status(self, connection_id: UUID, address: int) -> InputStatus:
+		return InputStatus.parse_data(await self.send_command(connection_id, InputStatusReportCommand(address)))
+
+	async def output_status(self, connection_id: UUID, address: int) -> OutputStatus:
+		return OutputStatus.parse_data(await self.send_command(connection_id, OutputStatusReportCommand(address)))
+
+	async def reader_status(self, connection_id: UUID, address: int) -> ReaderStatus:
+		return ReaderStatus.parse_data(await self.send_command(connection_id, ReaderStatusReportCommand(address)))
+
+	async def output_control(self, connection_id: UUID, address: int, output_controls: OutputControls) -> bool:
+		reply = await self.send_command(connection_id, OutputControlCommand(address, output_controls))
+		return reply.type == ReplyType.Ack or reply.type == ReplyType.OutputStatusReport
+
+	async def reader_led_control(
+		self, connection_id: UUID, address: int, reader_led_controls: ReaderLedControls
+	) -> bool:
+		reply = await self.send_command(connection_id, ReaderLedControlCommand(address, reader_led_controls))
+		return reply.type == ReplyType.Ack
+
+	async def keyset(self, connection_id: UUID, address: int) -> bool:
+		reply = await self.send_command(connection_id, KeySetCommand(address, bytes([])))
+		return reply.type == ReplyType.Ack
+
+	async def discover_devices(
+		self, connection_id: UUID, addresses=range(0x7F), reply_timeout: timedelta = timedelta(milliseconds=50),
+		timeout: float = 30.0
+	) -> list:
+		future = asyncio.get_event_loop().create_future()
+
+		def on_complete(scan: AddressScan):
+			if not future.done():
+				future.set_result(scan.discovered)
+
+		scan = AddressScan(addresses, reply_timeout, on_complete=on_complete)
+		bus = self._buses[connection_id]
+		bus.start_scan(scan)
+		try:
+			return await asyncio.wait_for(future, timeout)
+		except asyncio.TimeoutError:
+			bus.cancel_scan(scan)
+			raise TimeoutError()
+
+	async def send_command(
+		self, connection_id: UUID, command: Command, timeout: float = None, priority: CommandPriority = None
+	) -> Reply:
+		future = asyncio.get_event_loop().create_future()
+
+		def on_reply(reply: Reply):
+			if not future.done():
+				future.set_result(reply)
+
+		key = self._add_pending_reply(connection_id, command, on_reply)
+		try:
+			self._queue_command(connection_id, command, priority)
+			return await asyncio.wait_for(future, self._reply_timeout if timeout is None else timeout)
+		except asyncio.TimeoutError:
+			raise TimeoutError()
+		finally:
+			self._remove_pending_reply(key)
+
+	async def send_commands(self, requests, timeout: float = None):
+		'''
+		Send (connection_id, address, command) requests to all buses at once and
+		yield a BatchResult for each one as its reply arrives or it times out.
+		The command may be a Command, or a command type created with the address.
+		'''
+		batch = [
+			self._send_batch_command(BatchResult(connection_id, address, command), timeout)
+			for connection_id, address, command in self._batch_requests(requests)
+		]
+
+		for completed in asyncio.as_completed(batch):
+			yield await completed
+
+	async def _send_batch_command(self, result: BatchResult, timeout: float) -> BatchResult:
+		try:
+			result.reply = await self.send_command(result.connection_id, result.command, timeout)
+		except asyncio.CancelledError:
+			raise
+		except Exception as error:
+			result.error = error
+		return result
+
+	async def shutdown(self):
+		for bus in list(self._buses.values()):
+			await bus.close()
+		for task in list(self._polling_tasks.values()):
+			task.cancel()
+		await asyncio.gather(*self._polling_tasks.values(), return_exceptions=True)
+		self._polling_tasks.clear()
+		self._close_event_streams()
@@ -1,15 +1,22 @@
 import logging
 from datetime import datetime, timedelta
 import time
-from threading import Lock
+from time import perf_counter
+from collections import deque
+from threading import Lock, Event
 from uuid import uuid4
 
-from ._types import ReplyType, ErrorCode
+from ._types import ReplyType, ErrorCode, CommandPriority
 from ._connection import OsdpConnection
-from ._device import Device
-from ._message import Message
-from ._command import Command
+from ._device import Device, CommandQueueStatistics
+from ._command import Command, PollCommand, IdReportCommand, DeviceCapabilitiesCommand
 from ._reply import Reply
+from ._frame_reader import FrameReader
+from ._poll_scheduler import PollScheduler, AdaptivePollScheduler, PollStatistics
+from ._metrics import MetricsSink
+from ._timeout_policy import ReplyTimeoutPolicy
+from ._reconnect_policy import ReconnectPolicy
+from ._discovery import AddressScan, DiscoveredDevice
 
 log = logging.getLogger('osdp')
 
@@ -20,36 +27,74 @@ class Bus:
 	'''
 	DRIVER_BYTE = 0xFF
 
-	def __init__(self, connection: OsdpConnection, on_reply_received):
+	def __init__(
+		self, connection: OsdpConnection, on_reply_received, poll_scheduler: PollScheduler = None,
+		metrics: MetricsSink = None, on_device_status_changed=None, reconnect_policy: ReconnectPolicy = None,
+		on_connection_status_changed=None
+	):
 		self._connection = connection
 		self._on_reply_received = on_reply_received
+		self._on_device_status_changed = on_device_status_changed
+		self._on_connection_status_changed = on_connection_status_changed
+		self._reconnect_policy = reconnect_policy or ReconnectPolicy()
+		self._is_connected = False
+		self._connection_failures = 0
+		self._next_open_time = 0.0
+		self._connection_log_time = None
+		self._unlogged_connection_errors = 0
+		self._poll_scheduler = poll_scheduler or AdaptivePollScheduler()
+		self.poll_statistics = PollStatistics()
+		self._frame_reader = FrameReader()
 		self._configured_devices = {}
 		self._configured_devices_lock = Lock()
-		self._read_timeout = timedelta(milliseconds=200)
+		self._expedited_addresses = deque()
+		self._last_message_sent_time = datetime.min
+		self._scan = None
+		# Timings are only taken when a metrics sink is given
+		self._metrics = metrics
+		self._metric_labels = {}
+		self._first_byte_time = None
+		self._exchange_times = None
 		self.id = uuid4()
 		self._is_shutting_down = False
+		self._closed = Event()
 
 	@property
 	def idle_line_delay(self) -> timedelta:
 		return timedelta(milliseconds=(1000.0 / self._connection.baud_rate * 16.0) * 100)
 
+	@property
+	def is_connected(self) -> bool:
+		return self._is_connected
+
 	def close(self):
 		self._is_shutting_down = True
+		self._closed.set()
+		self.cancel_scan()
 		self._connection.close()
+		self._frame_reader.clear()
 
-	def send_command(self, command: Command):
+	def send_command(self, command: Command, priority: CommandPriority = None):
 		found_device = self._configured_devices.get(command.address)
 		if found_device is not None:
-			found_device.send_command(command)
+			found_device.send_command(command, priority)
+			if found_device.pending_priority == CommandPriority.Actuation:
+				# Polled next, ahead of the rest of the current pass
+				self._expedited_addresses.append(command.address)
 		else:
 			log.warning("Device not found with address %s", command.address)
 
-	def add_device(self, address: int, use_crc: bool, use_secure_channel: bool, master_key: bytes = None) -> Device:
+	def add_device(
+		self, address: int, use_crc: bool, use_secure_channel: bool, master_key: bytes = None,
+		coalesce_commands: bool = False, timeout_policy: ReplyTimeoutPolicy = None
+	) -> Device:
 		found_device = self._configured_devices.get(address)
 		self._configured_devices_lock.acquire()
 		if found_device is not None:
 			self._configured_devices.pop(address)
-		self._configured_devices[address] = Device(address, use_crc, use_secure_channel, master_key)
+		self._configured_devices[address] = Device(
+			address, use_crc, use_secure_channel, master_key, coalesce_commands, timeout_policy
+		)
 		self._configured_devices_lock.release()
 		return self._configured_devices[address]
 
@@ -68,77 +113,363 @@ class Bus:
 		else:
 			return found_device.is_online
 
+	def command_queue_depth(self, address: int) -> int:
+		found_device = self._configured_devices.get(address)
+		if found_device is None:
+			return 0
+		else:
+			return found_device.command_queue_depth
+
+	def command_queue_statistics(self, address: int) -> CommandQueueStatistics:
+		found_device = self._configured_devices.get(address)
+		if found_device is None:
+			return None
+		else:
+			return found_device.command_queue_statistics
+
+	def secure_channel_establishment_times(self) -> dict:
+		return {
+			address: device.secure_channel_establishment_time
+			for address, device in list(self._configured_devices.items())
+			if device.secure_channel_establishment_time is not None
+		}
+
 	def run_polling_loop(self):
-		last_message_sent_time = datetime.min
 		while not self._is_shutting_down:
 			if not self._connection.is_open:
+				self.connection_lost()
+				self._closed.wait(self.delay_before_open())
+				if self._is_shutting_down:
+					return
 				try:
 					self._connection.open()
-				except:
-					log.exception("Error while opening connection %s", self._connection)
+				except Exception as error:
+					self.connection_failed(error)
+					continue
+				if self._connection.is_open:
+					self.connection_opened()
 
-			time_difference = timedelta(milliseconds=100) - (datetime.now() - last_message_sent_time)
-			time.sleep(max(time_difference, timedelta(seconds=0)).total_seconds())
+			time.sleep(self.delay_before_cycle())
 
-			if not self._configured_devices:
-				last_message_sent_time = datetime.now()
+			devices = self.start_cycle()
+			if devices is None:
 				continue
+			for device in devices:
+				if self._is_shutting_down:
+					# Closed from another thread while polling, the connection is gone
+					return
+				if not self._connection.is_open:
+					break
+				self.poll_expedited_devices()
+				if self._poll_scheduler.should_poll(device):
+					self.poll_device(device)
+				self.update_device_status(device)
+			self.poll_expedited_devices()
+
+			if self._scan is not None:
+				self.scan_step()
+
+	def delay_before_cycle(self) -> float:
+		return self._poll_scheduler.delay_before_cycle(self._last_message_sent_time).total_seconds()
+
+	def start_cycle(self) -> list:
+		'''
+		Devices to poll in this cycle, or None when there are neither devices nor a scan
+		'''
+		if not self._configured_devices and self._scan is None:
+			self._last_message_sent_time = datetime.now()
+			return None
+		self.poll_statistics.cycle_started()
+		return self._poll_scheduler.poll_order(list(self._configured_devices.values()))
+
+	def delay_before_open(self) -> float:
+		return max(self._next_open_time - perf_counter(), 0.0)
+
+	def connection_opened(self):
+		log.debug("Connection %s opened after %d failures", self._connection, self._connection_failures)
+		self.connection_status_changed(True)
+
+	def connection_failed(self, error: Exception):
+		self.schedule_reconnect()
+		self.log_connection_error("Error while opening connection %s: %s", self._connection, error)
+		# Devices are not polled until the connection opens, but still go offline
+		for device in list(self._configured_devices.values()):
+			self.update_device_status(device)
+
+	def connection_lost(self):
+		if not self._is_connected:
+			return
+		self.schedule_reconnect()
+		self.log_connection_error("Connection %s lost", self._connection)
+		self._frame_reader.clear()
+		self.connection_status_changed(False)
+
+	def schedule_reconnect(self):
+		# Failures go on counting until a device replies, so a link dropping as soon as it opens backs off too
+		self._connection_failures += 1
+		self._next_open_time = (
+			perf_counter() + self._reconnect_policy.delay_for(self._connection_failures).total_seconds()
+		)
+
+	def log_connection_error(self, message: str, *args):
+		now = perf_counter()
+		if self._connection_log_time is not None and \
+			now - self._connection_log_time < self._reconnect_policy.log_interval.total_seconds():
+			self._unlogged_connection_errors += 1
+			return
+		log.warning(
+			message + ", retrying in %.1f s (%d failures, %d errors not logged)",
+			*args, self.delay_before_open(), self._connection_failures, self._unlogged_connection_errors
+		)
+		self._connection_log_time = now
+		self._unlogged_connection_errors = 0
+
+	def connection_status_changed(self, is_connected: bool):
+		self._is_connected = is_connected
+		if self._on_connection_status_changed is not None:
+			self._on_connection_status_changed(self.id, is_connected)
+
+	def start_scan(self, scan: AddressScan):
+		if self._scan is not None:
+			raise RuntimeError("An address scan is already running on this bus")
+		self._scan = scan
+
+	def cancel_scan(self, scan: AddressScan = None):
+		'''
+		Stops the running scan, only when it is the given one if a scan is given
+		'''
+		running_scan = self._scan
+		if running_scan is None or (scan is not None and running_scan is not scan):
+			return
+		self._scan = None
+		running_scan.cancel()
 
-			for device in list(self._configured_devices.values()):
-				data = bytearray([self.DRIVER_BYTE])
-				command = device.get_next_command_data()
+	def scan_step(self):
+		scan = self._scan
+		for address in scan.next_addresses(self._configured_devices):
+			if self._scan is not scan:
+				return
+			try:
+				discovered = self.probe_address(address, scan.reply_timeout)
+			except Exception as error:
+				self.probe_failed(address, error)
+				self._connection.close()
+				return
+			self.address_probed(scan, address, discovered)
+		self.scan_pass_completed(scan)
+
+	def probe_failed(self, address: int, error: Exception):
+		self._frame_reader.clear()
+		if isinstance(error, OSError):
+			# Reported as a lost connection before it is opened again
+			log.debug("Connection %s failed while probing address %s: %s", self._connection, address, error)
+		else:
+			log.error("Error while probing address %s", address, exc_info=error)
+
+	@staticmethod
+	def address_probed(scan: AddressScan, address: int, discovered: DiscoveredDevice):
+		if discovered is not None:
+			log.info("Device discovered at address %s", address)
+			scan.discovered.append(discovered)
+
+	def scan_pass_completed(self, scan: AddressScan):
+		if scan.remaining == 0 and self._scan is scan:
+			self._scan = None
+			scan.complete()
+
+	def probe_address(self, address: int, reply_timeout: timedelta) -> DiscoveredDevice:
+		# CRC is tried before checksum
+		for use_crc in (True, False):
+			device = self.probe_device(address, use_crc, reply_timeout)
+			device = self.answering_device(device, self.probe(device, PollCommand(address)), reply_timeout)
+			if device is not None:
+				break
+		else:
+			return None
 
-				last_message_sent_time = datetime.now()
+		device.timeout_policy = ReplyTimeoutPolicy(retries=1)
+		identification = self.probe(device, IdReportCommand(address))
+		capabilities = self.probe(device, DeviceCapabilitiesCommand(address))
+		return self.discovered_device(device, identification, capabilities)
 
-				reply = None
-				try:
-					reply = self.send_command_and_receive_reply(data, command, device)
-				except:
-					log.exception("Error while sending command %s and receiving reply", command)
-					self._connection.close()
-					continue
+	def probe(self, device: Device, command: Command) -> Reply:
+		try:
+			reply = self.send_command_and_receive_reply(bytearray([self.DRIVER_BYTE]), command, device)
+		except TimeoutError:
+			self._frame_reader.clear()
+			return None
+		return self.probe_reply(device, reply)
+
+	@staticmethod
+	def probe_device(address: int, use_crc: bool, reply_timeout: timedelta) -> Device:
+		return Device(address, use_crc, False, timeout_policy=ReplyTimeoutPolicy(reply_timeout, 0, 0))
+
+	@staticmethod
+	def answering_device(device: Device, reply: Reply, reply_timeout: timedelta) -> Device:
+		# A NAK rejects the mode the device was addressed in, other replies are sent in the mode it uses
+		if reply is None or reply.type == ReplyType.Nak:
+			return None
+		if reply.is_using_crc != device.message_control.use_crc:
+			return Bus.probe_device(device.address, reply.is_using_crc, reply_timeout)
+		return device
+
+	@staticmethod
+	def probe_reply(device: Device, reply: Reply) -> Reply:
+		if not reply.is_valid_reply:
+			return None
+		device.valid_reply_has_been_received()
+		return reply
+
+	@staticmethod
+	def discovered_device(device: Device, identification: Reply, capabilities: Reply) -> DiscoveredDevice:
+		if identification is not None:
+			identification = identification.decoded_data if identification.type == ReplyType.PdIdReport else None
+		if capabilities is not None:
+			capabilities = capabilities.decoded_data if capabilities.type == ReplyType.PdCapabilitiesReport else None
+		return DiscoveredDevice(device.address, device.message_control.use_crc, identification, capabilities)
+
+	def update_device_status(self, device: Device):
+		if device.update_online_status():
+			log.info("Device %s is %s", device.address, "online" if device.is_online else "offline")
+			if self._on_device_status_changed is not None:
+				self._on_device_status_changed(self.id, device.address, device.is_online)
+
+	def next_expedited_device(self) -> Device:
+		while self._expedited_addresses:
+			device = self._configured_devices.get(self._expedited_addresses.popleft())
+			if device is not None and device.has_pending_commands:
+				return device
+		return None
+
+	def poll_expedited_devices(self):
+		device = self.next_expedited_device()
+		while device is not None:
+			self.poll_device(device)
+			device = self.next_expedited_device()
+
+	def poll_device(self, device: Device):
+		command = self.next_poll_command(device)
+		try:
+			reply = self.send_command_and_receive_reply(bytearray([self.DRIVER_BYTE]), command, device)
+		except Exception as error:
+			if self.exchange_failed(device, command, error):
+				self._connection.close()
+			return
 
-				try:
-					self.process_reply(reply, device)
-				except:
-					log.exception("Error while processing reply %s", reply)
-					self._connection.close()
-					continue
+		if not self.poll_reply_received(reply, device):
+			self._connection.close()
+			return
+		time.sleep(self.delay_after_reply(device, reply))
+
+	def next_poll_command(self, device: Device) -> Command:
+		command = device.get_next_command_data()
+		self._last_message_sent_time = datetime.now()
+		return command
+
+	def exchange_failed(self, device: Device, command: Command, error: Exception) -> bool:
+		'''
+		Logs a failed command and reply, True when the connection has to be closed
+		'''
+		self._frame_reader.clear()
+		if isinstance(error, TimeoutError):
+			# A device not answering leaves the connection usable for the others
+			self.log_reply_timeout(device, command, error)
+			return False
+		if isinstance(error, OSError):
+			# Reported as a lost connection before it is opened again
+			log.debug("Connection %s failed: %s", self._connection, error)
+		else:
+			log.error("Error while sending command %s and receiving reply", command, exc_info=error)
+		return True
+
+	def poll_reply_received(self, reply: Reply, device: Device) -> bool:
+		'''
+		Processes a polled reply, False when the connection has to be closed
+		'''
+		try:
+			self.process_reply(reply, device)
+		except Exception:
+			log.exception("Error while processing reply %s", reply)
+			self._frame_reader.clear()
+			return False
+		return True
 
-				time.sleep(self.idle_line_delay.total_seconds())
+	def delay_after_reply(self, device: Device, reply: Reply) -> float:
+		return self._poll_scheduler.delay_after_reply(device, reply, self.idle_line_delay).total_seconds()
 
 	def process_reply(self, reply: Reply, device: Device):
 		if not reply.is_valid_reply:
 			return
 
 		if reply.is_secure_message:
-			mac = device.generate_mac(reply.message_for_mac_generation, False)
-			if not reply.is_valid_mac(mac):
-				device.reset_security()
+			if self._metrics is not None:
+				start_time = perf_counter()
+			mac = device.generate_mac(reply.message_for_mac_generation_view, False)
+			is_valid_mac = reply.is_valid_mac(mac)
+			if self._metrics is not None:
+				self._metrics.observe('osdp_reply_mac_seconds', perf_counter() - start_time, self.metric_labels(device))
+			if not is_valid_mac:
+				self.reset_security(device)
 				return
 
 		if reply.type != ReplyType.Busy:
 			device.valid_reply_has_been_received()
+		self._connection_failures = 0
 
 		if reply.type == ReplyType.Nak:
-			extract_reply_data = reply.extract_reply_data
-			error_code = ErrorCode(extract_reply_data[0])
+			error_code = ErrorCode(reply.reply_data_view[0])
 			if error_code == ErrorCode.DoesNotSupportSecurityBlock or error_code == ErrorCode.DoesNotSupportSecurityBlock:
-				device.reset_security()
+				self.reset_security(device)
 
 		if reply.type == ReplyType.CrypticData:
 			device.initialize_secure_channel(reply)
 		elif reply.type == ReplyType.InitialRMac:
 			if device.validate_secure_channel_establishment(reply):
-				log.debug("Secure session established.")
+				log.debug("Secure session established with %s in %s", device.address, device.secure_channel_establishment_time)
 
 		if device.reset_security_after_reply == True:
-			device.reset_security()
+			self.reset_security(device)
 
 		if self._on_reply_received is not None:
 			self._on_reply_received(reply)
 
-	def send_command_and_receive_reply(self, data: bytearray, command: Command, device: Device) -> Reply:
+	def reset_security(self, device: Device):
+		device.reset_security()
+		if self._metrics is not None:
+			self._metrics.increment('osdp_security_resets_total', self.metric_labels(device))
+
+	def metric_labels(self, device: Device) -> tuple:
+		labels = self._metric_labels.get(device.address)
+		if labels is None:
+			labels = (('bus', str(self.id)), ('address', str(device.address)))
+			self._metric_labels[device.address] = labels
+		return labels
+
+	def record_exchange(
+		self, command: Command, device: Device,
+		start_time: float, build_time: float, write_time: float, receive_time: float, parse_time: float
+	):
+		labels = self.metric_labels(device)
+		command_labels = labels + (('command', type(command).__name__),)
+		first_byte_time = self._first_byte_time or write_time
+		self._metrics.observe('osdp_command_build_seconds', build_time - start_time, command_labels)
+		self._metrics.observe('osdp_command_write_seconds', write_time - build_time, labels)
+		self._metrics.observe('osdp_reply_first_byte_seconds', first_byte_time - write_time, command_labels)
+		self._metrics.observe('osdp_reply_seconds', receive_time - write_time, command_labels)
+		self._metrics.observe('osdp_reply_parse_seconds', parse_time - receive_time, labels)
+
+	def log_reply_timeout(self, device: Device, command: Command, error: TimeoutError):
+		if device.is_online:
+			log.warning("%s: %s to %s", error, type(command).__name__, device.address)
+		else:
+			log.debug("%s: %s to %s", error, type(command).__name__, device.address)
+
+	def reply_attempts(self, device: Device) -> int:
+		policy = device.timeout_policy
+		self._connection.set_read_timeout(policy.reply_timeout_for(self._connection.baud_rate).total_seconds())
+		return policy.retries_for(device) + 1
+
+	def build_command_data(self, data: bytearray, command: Command, device: Device):
 		command_data = None
 		try:
 			command_data = command.build_command(device)
@@ -149,53 +480,68 @@ class Bus:
 
 		log.debug("Raw command data: %s", command_data.hex())
 
-		self._connection.write(bytes(data))
-
-		reply_buffer = bytearray()
-
-		if not self.wait_for_start_of_message(reply_buffer):
-			raise TimeoutError("Timeout waiting for reply message")
-
-		if not self.wait_for_message_length(reply_buffer):
-			raise TimeoutError("Timeout waiting for reply message length")
-
-		if not self.wait_for_rest_of_message(reply_buffer, self.extract_message_length(reply_buffer)):
-			raise TimeoutError("Timeout waiting for rest of reply message")
+	def send_command_and_receive_reply(self, data: bytearray, command: Command, device: Device) -> Reply:
+		frame = self.start_exchange(data, command, device)
+		attempts = self.reply_attempts(device)
+		for attempt in range(attempts):
+			# Anything received before the command is written is a late reply to an earlier one
+			self._frame_reader.clear()
+			self._connection.discard_input()
+			self._connection.write(frame)
+			self.command_written()
+			try:
+				reply_buffer = self.receive_frame(device.address)
+			except TimeoutError:
+				self.reply_timed_out(device)
+				if attempt == attempts - 1:
+					raise
+				continue
+			return self.finish_exchange(reply_buffer, command, device)
+
+	def start_exchange(self, data: bytearray, command: Command, device: Device) -> bytes:
+		# Start, build, write and receive times, taken only when metrics are recorded
+		if self._metrics is not None:
+			self._exchange_times = [perf_counter()]
+		self.build_command_data(data, command, device)
+		if self._metrics is not None:
+			self._exchange_times.append(perf_counter())
+		# Retries send the same frame again, as the sequence number has not moved on
+		return bytes(data)
+
+	def command_written(self):
+		if self._metrics is not None:
+			# Only the last attempt is timed
+			del self._exchange_times[2:]
+			self._exchange_times.append(perf_counter())
+			self._first_byte_time = None
+
+	def reply_timed_out(self, device: Device):
+		if self._metrics is not None:
+			self._metrics.increment('osdp_reply_timeouts_total', self.metric_labels(device))
+
+	def finish_exchange(self, reply_buffer: bytes, command: Command, device: Device) -> Reply:
+		if self._metrics is not None:
+			self._exchange_times.append(perf_counter())
 
 		log.debug("Raw reply data: %s", reply_buffer.hex())
 
-		return Reply.parse(bytes(reply_buffer), self.id, command, device)
-
-	def extract_message_length(self, reply_buffer: bytearray) -> int:
-		return int.from_bytes(bytes(reply_buffer[2:3]), byteorder='little')
-
-	def wait_for_rest_of_message(self, buffer: bytearray, reply_length: int):
-		while len(buffer) < reply_length:
-			bytes_read = self._connection.read(reply_length - len(buffer))
-			if len(bytes_read) > 0:
-				buffer.extend(bytes_read)
-			else:
-				return False
-		return True
+		reply = Reply.parse(reply_buffer, self.id, command, device)
+		if self._metrics is not None:
+			self.record_exchange(command, device, *self._exchange_times, perf_counter())
+		return reply
 
-	def wait_for_message_length(self, buffer: bytearray) -> bool:
-		while len(buffer) < 4:
-			bytes_read = self._connection.read(4)
-			if len(bytes_read) > 0:
-				buffer.extend(bytes_read)
-			else:
-				return False
-		return True
-
-	def wait_for_start_of_message(self, buffer: bytearray) -> bool:
+	def receive_frame(self, address: int = None) -> bytes:
 		while True:
-			bytes_read = self._connection.read(1)
-			if len(bytes_read) == 0:
-				return False
-
-			if bytes_read[0] != Message.SOM:
-				continue
-
-			buffer.extend(bytes_read)
-			break
-		return True
+			frame = self._frame_reader.next_frame(address)
+			if frame is not None:
+				return frame
+			self.bytes_received(
+				self._connection.read_available(self._frame_reader.bytes_needed, self._frame_reader.chunk_size)
+			)
+
+	def bytes_received(self, bytes_read: bytes):
+		if len(bytes_read) == 0:
+			raise TimeoutError(self._frame_reader.timeout_message)
+		if self._metrics is not None and self._first_byte_time is None:
+			self._first_byte_time = perf_counter()
+		self._frame_reader.feed(bytes_read)
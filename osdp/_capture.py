@@ -0,0 +1,427 @@
+import logging
+import mmap
+import os
+import struct
+import time
+from array import array
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+from uuid import uuid4
+
+from ._types import FrameDirection
+from ._connection import OsdpConnection
+from ._async_connection import AsyncOsdpConnection
+from ._command import Command
+from ._reply import Reply
+from ._frame_reader import FrameReader
+
+log = logging.getLogger('osdp')
+
+
+# A capture is a header followed by records of a fixed header and the frame bytes,
+# its index file holds one fixed size entry per record so frames are found by time
+# and address without reading the capture
+CAPTURE_MAGIC = b'OSDPCAP1'
+INDEX_MAGIC = b'OSDPIDX1'
+RECORD_HEADER = struct.Struct('<qBBH')
+INDEX_ENTRY = struct.Struct('<qQBB')
+
+
+class CaptureWriter:
+	'''
+	Appends timestamped frames to a capture file and its index
+	'''
+
+	def __init__(self, path: str):
+		self.path = path
+		self._lock = Lock()
+		self._data_file = open(path, 'ab')
+		self._index_file = open(path + '.idx', 'ab')
+		if self._data_file.tell() == 0:
+			self._data_file.write(CAPTURE_MAGIC)
+		if self._index_file.tell() == 0:
+			self._index_file.write(INDEX_MAGIC)
+		self._offset = self._data_file.tell()
+
+	def record(self, direction: FrameDirection, frame: bytes, timestamp: int = None):
+		'''
+		Timestamps are nanoseconds since the epoch, the current time when not given
+		'''
+		timestamp = time.time_ns() if timestamp is None else timestamp
+		address = frame[1] & 0x7F
+		with self._lock:
+			self._data_file.write(RECORD_HEADER.pack(timestamp, direction, address, len(frame)))
+			self._data_file.write(frame)
+			self._index_file.write(INDEX_ENTRY.pack(timestamp, self._offset, direction, address))
+			self._offset += RECORD_HEADER.size + len(frame)
+
+	def flush(self):
+		with self._lock:
+			self._data_file.flush()
+			self._index_file.flush()
+
+	def close(self):
+		with self._lock:
+			self._data_file.close()
+			self._index_file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+
+class _FrameRecorder:
+	'''
+	Splits the bytes crossing a connection into frames for a capture writer
+	'''
+
+	def __init__(self, writer: CaptureWriter):
+		self._writer = writer
+		self._transmitted = FrameReader()
+		self._received = FrameReader()
+
+	def transmitted(self, data: bytes):
+		# Bytes left from a reply that was given up on are not part of the next one
+		self._received.clear()
+		self._record(self._transmitted, FrameDirection.Transmit, data)
+
+	def received(self, data: bytes):
+		self._record(self._received, FrameDirection.Receive, data)
+
+	def _record(self, frame_reader: FrameReader, direction: FrameDirection, data: bytes):
+		if not data:
+			return
+		frame_reader.feed(data)
+		while True:
+			frame = frame_reader.next_frame()
+			if frame is None:
+				return
+			try:
+				self._writer.record(direction, frame)
+			except Exception:
+				log.exception("Error while recording frame to %s", self._writer.path)
+
+
+class CaptureOsdpConnection(OsdpConnection):
+	'''
+	Records the frames written to and read from a connection
+	'''
+
+	def __init__(self, connection: OsdpConnection, writer: CaptureWriter):
+		self._connection = connection
+		self._recorder = _FrameRecorder(writer)
+
+	@property
+	def baud_rate(self) -> int:
+		return self._connection.baud_rate
+
+	@property
+	def is_open(self) -> bool:
+		return self._connection.is_open
+
+	def open(self):
+		self._connection.open()
+
+	def close(self):
+		self._connection.close()
+
+	def write(self, buf: bytes):
+		self._connection.write(buf)
+		self._recorder.transmitted(buf)
+
+	def read(self, size: int = 1) -> bytes:
+		data = self._connection.read(size)
+		self._recorder.received(data)
+		return data
+
+	def read_available(self, minimum: int, maximum: int) -> bytes:
+		data = self._connection.read_available(minimum, maximum)
+		self._recorder.received(data)
+		return data
+
+	def discard_input(self):
+		self._connection.discard_input()
+
+	def set_read_timeout(self, timeout: float):
+		self._connection.set_read_timeout(timeout)
+
+	def __repr__(self):
+		return "Capture of {0}".format(self._connection)
+
+
+class AsyncCaptureOsdpConnection(AsyncOsdpConnection):
+	'''
+	Records the frames written to and read from an asyncio connection
+	'''
+
+	def __init__(self, connection: AsyncOsdpConnection, writer: CaptureWriter):
+		self._connection = connection
+		self._recorder = _FrameRecorder(writer)
+
+	@property
+	def baud_rate(self) -> int:
+		return self._connection.baud_rate
+
+	@property
+	def is_open(self) -> bool:
+		return self._connection.is_open
+
+	async def open(self):
+		await self._connection.open()
+
+	async def close(self):
+		await self._connection.close()
+
+	async def write(self, buf: bytes):
+		await self._connection.write(buf)
+		self._recorder.transmitted(buf)
+
+	async def read(self, size: int = 1) -> bytes:
+		data = await self._connection.read(size)
+		self._recorder.received(data)
+		return data
+
+	async def read_available(self, minimum: int, maximum: int) -> bytes:
+		data = await self._connection.read_available(minimum, maximum)
+		self._recorder.received(data)
+		return data
+
+	async def discard_input(self):
+		await self._connection.discard_input()
+
+	def set_read_timeout(self, timeout: float):
+		self._connection.set_read_timeout(timeout)
+
+	def __repr__(self):
+		return "Capture of {0}".format(self._connection)
+
+
+class CapturedFrame:
+
+	__slots__ = ('timestamp', 'direction', 'address', 'frame')
+
+	def __init__(self, timestamp: int, direction: FrameDirection, address: int, frame: memoryview):
+		self.timestamp = timestamp
+		self.direction = direction
+		self.address = address
+		self.frame = frame
+
+	def __repr__(self):
+		return "{0} {1} Address: {2} Frame: {3}".format(
+			self.timestamp, self.direction.name, self.address, bytes(self.frame).hex()
+		)
+
+
+class ReplayStatistics:
+
+	def __init__(self):
+		self.commands = 0
+		self.replies = 0
+		self.invalid_replies = 0
+		self.bytes = 0
+		self.seconds = 0.0
+
+	@property
+	def replies_per_second(self) -> float:
+		return self.replies / self.seconds if self.seconds > 0 else 0.0
+
+	def __repr__(self):
+		return "Commands: {0} Replies: {1} Invalid: {2} Bytes: {3} Seconds: {4:.3f} Replies/s: {5:.0f}".format(
+			self.commands, self.replies, self.invalid_replies, self.bytes, self.seconds, self.replies_per_second
+		)
+
+
+class _CapturedCommand(Command):
+	'''
+	Stands in for the command a captured reply answered
+	'''
+
+	__slots__ = ('_command_code',)
+
+	def __init__(self, address: int, command_code: int):
+		self.address = address
+		self._command_code = command_code
+
+	@property
+	def command_code(self) -> int:
+		return self._command_code
+
+	def security_control_block(self) -> bytes:
+		return bytes([])
+
+	def data(self) -> bytes:
+		return bytes([])
+
+	def custom_command_update(self, command_buffer: bytearray):
+		pass
+
+
+class _ReplayDevice:
+	'''
+	Session keys are not captured, encrypted reply data is parsed as it is
+	'''
+
+	@staticmethod
+	def decrypt_data(data) -> bytes:
+		return bytes(data)
+
+
+class _Timestamps:
+	'''
+	Timestamps of the index entries as a sequence, for bisection
+	'''
+
+	def __init__(self, index, count: int):
+		self._index = index
+		self._count = count
+
+	def __len__(self) -> int:
+		return self._count
+
+	def __getitem__(self, i: int) -> int:
+		return INDEX_ENTRY.unpack_from(self._index, len(INDEX_MAGIC) + i * INDEX_ENTRY.size)[0]
+
+
+class CaptureReader:
+	'''
+	Memory maps a capture and its index. Without an index file, for instance after a
+	crash, the index is rebuilt in memory from the capture. The entries of each address
+	are listed once on opening, so frames of one address are found without a full scan.
+	'''
+
+	def __init__(self, path: str):
+		self.path = path
+		self._index_file = None
+		self._data_file = open(path, 'rb')
+		self._data = mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ)
+		if self._data[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+			self._data.close()
+			self._data_file.close()
+			raise ValueError("Not an OSDP capture: {0}".format(path))
+		self._index = self._open_index(path + '.idx')
+		self._count = (len(self._index) - len(INDEX_MAGIC)) // INDEX_ENTRY.size
+		self._timestamps = _Timestamps(self._index, self._count)
+		self._address_entries = self._index_addresses()
+
+	def _open_index(self, path: str):
+		if os.path.exists(path) and os.path.getsize(path) > len(INDEX_MAGIC):
+			self._index_file = open(path, 'rb')
+			index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+			if index[:len(INDEX_MAGIC)] == INDEX_MAGIC:
+				return index
+			index.close()
+			self._index_file.close()
+			self._index_file = None
+
+		log.info("Rebuilding the index of %s", self.path)
+		index = bytearray(INDEX_MAGIC)
+		offset = len(CAPTURE_MAGIC)
+		while offset + RECORD_HEADER.size <= len(self._data):
+			timestamp, direction, address, length = RECORD_HEADER.unpack_from(self._data, offset)
+			index.extend(INDEX_ENTRY.pack(timestamp, offset, direction, address))
+			offset += RECORD_HEADER.size + length
+		return index
+
+	def _index_addresses(self) -> dict:
+		address_entries = {}
+		entries = memoryview(self._index)[len(INDEX_MAGIC):(len(INDEX_MAGIC) + self._count * INDEX_ENTRY.size)]
+		try:
+			for i, (_, _, _, address) in enumerate(INDEX_ENTRY.iter_unpack(entries)):
+				numbers = address_entries.get(address)
+				if numbers is None:
+					numbers = address_entries[address] = array('Q')
+				numbers.append(i)
+		finally:
+			entries.release()
+		return address_entries
+
+	def __len__(self) -> int:
+		return self._count
+
+	def frames(self, start: int = None, end: int = None, address: int = None, direction: FrameDirection = None):
+		'''
+		Frames recorded from the start time up to the end time, in nanoseconds since the epoch.
+		Frames are views of the mapped capture, copy them to keep them after closing the reader.
+		'''
+		first = 0 if start is None else bisect_left(self._timestamps, start)
+		if address is None:
+			entries = range(first, self._count)
+		else:
+			numbers = self._address_entries.get(address, array('Q'))
+			entries = (numbers[j] for j in range(bisect_left(numbers, first), len(numbers)))
+
+		with memoryview(self._data) as data:
+			for i in entries:
+				timestamp, offset, frame_direction, frame_address = INDEX_ENTRY.unpack_from(
+					self._index, len(INDEX_MAGIC) + i * INDEX_ENTRY.size
+				)
+				if end is not None and timestamp >= end:
+					break
+				if direction is not None and frame_direction != direction:
+					continue
+
+				frame_start = offset + RECORD_HEADER.size
+				length = RECORD_HEADER.unpack_from(data, offset)[3] if frame_start <= len(data) else 0
+				if frame_start + length > len(data):
+					# Record cut short while it was being written
+					break
+				frame = data[frame_start:(frame_start + length)]
+				try:
+					yield CapturedFrame(timestamp, FrameDirection(frame_direction), frame_address, frame)
+				finally:
+					frame.release()
+
+	def replay(
+		self, start: int = None, end: int = None, address: int = None, decode: bool = False
+	) -> ReplayStatistics:
+		'''
+		Parse every captured reply as fast as possible, each with the command sent
+		before it to the same address
+		'''
+		statistics = ReplayStatistics()
+		connection_id = uuid4()
+		device = _ReplayDevice()
+		commands = {}
+
+		start_time = perf_counter()
+		for captured in self.frames(start, end, address):
+			frame = captured.frame
+			statistics.bytes += len(frame)
+			if captured.direction == FrameDirection.Transmit:
+				secure_block_size = frame[5] if frame[4] & 0x08 else 0
+				commands[captured.address] = _CapturedCommand(captured.address, frame[5 + secure_block_size])
+				statistics.commands += 1
+				continue
+
+			command = commands.get(captured.address)
+			if command is None:
+				command = commands[captured.address] = _CapturedCommand(captured.address, 0x60)
+			statistics.replies += 1
+			try:
+				reply = Reply.parse(frame, connection_id, command, device)
+				is_valid = reply.is_valid_reply
+				if is_valid and decode:
+					reply.decoded_data
+			except (IndexError, ValueError):
+				is_valid = False
+			reply = None
+			if not is_valid:
+				statistics.invalid_replies += 1
+		statistics.seconds = perf_counter() - start_time
+		return statistics
+
+	def close(self):
+		if self._index_file is not None:
+			self._index.close()
+			self._index_file.close()
+		self._data.close()
+		self._data_file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
@@ -1,7 +1,7 @@
 from abc import abstractmethod
 import logging
 
-from ._types import OutputControls, ReaderLedControls, ReaderBuzzerControl, ReaderTextOutput
+from ._types import OutputControls, ReaderLedControls, ReaderBuzzerControl, ReaderTextOutput, CommandPriority
 from ._message import Message
 import datetime
 
@@ -10,10 +10,29 @@ log = logging.getLogger('osdp')
 
 class Command(Message):
 
+	__slots__ = ('_code', '_coalesced_commands')
+
+	# Frames of commands with a fixed payload only depend on the address and control byte
+	# while no security block is used, so they are built once and reused
+	is_cacheable = False
+	_frame_cache = {}
+
+	# Queued commands are sent in priority order, lower values first
+	priority = CommandPriority.Normal
+
 	def __init__(self):
 		self._address = None
 		self._code = None
 
+	@property
+	def coalesced_commands(self) -> tuple:
+		# Earlier commands folded into this one while queued, they are answered by its reply
+		return getattr(self, '_coalesced_commands', ())
+
+	@coalesced_commands.setter
+	def coalesced_commands(self, value: tuple):
+		self._coalesced_commands = value
+
 	@property
 	def command_code(self) -> int:
 		pass
@@ -26,7 +45,25 @@ class Command(Message):
 	def custom_command_update(self, command_buffer: bytearray):
 		pass
 
+	def coalescing_key(self):
+		# Queued commands with the same key may be coalesced, None never is
+		return None
+
+	def coalesce(self, newer):
+		return newer
+
 	def build_command(self, device) -> bytes:
+		if not self.is_cacheable or device.message_control.has_security_control_block:
+			return self._build_command(device)
+
+		key = (self.command_code, self.address, device.message_control.control_byte, self.data())
+		frame = self._frame_cache.get(key)
+		if frame is None:
+			frame = self._build_command(device)
+			self._frame_cache[key] = frame
+		return frame
+
+	def _build_command(self, device) -> bytes:
 		command_buffer = bytearray([
 			self.SOM,
 			self.address,
@@ -71,6 +108,10 @@ class Command(Message):
 
 class PollCommand(Command):
 
+	__slots__ = ()
+
+	is_cacheable = True
+
 	def __init__(self, address: int):
 		self.address = address
 
@@ -90,6 +131,11 @@ class PollCommand(Command):
 
 class IdReportCommand(Command):
 
+	__slots__ = ()
+
+	is_cacheable = True
+	priority = CommandPriority.Diagnostics
+
 	def __init__(self, address: int):
 		self.address = address
 
@@ -109,6 +155,11 @@ class IdReportCommand(Command):
 
 class DeviceCapabilitiesCommand(Command):
 
+	__slots__ = ()
+
+	is_cacheable = True
+	priority = CommandPriority.Diagnostics
+
 	def __init__(self, address: int):
 		self.address = address
 
@@ -128,6 +179,11 @@ class DeviceCapabilitiesCommand(Command):
 
 class LocalStatusReportCommand(Command):
 
+	__slots__ = ()
+
+	is_cacheable = True
+	priority = CommandPriority.Diagnostics
+
 	def __init__(self, address: int):
 		self.address = address
 
@@ -147,6 +203,11 @@ class LocalStatusReportCommand(Command):
 
 class InputStatusReportCommand(Command):
 
+	__slots__ = ()
+
+	is_cacheable = True
+	priority = CommandPriority.Diagnostics
+
 	def __init__(self, address: int):
 		self.address = address
 
@@ -166,6 +227,11 @@ class InputStatusReportCommand(Command):
 
 class OutputStatusReportCommand(Command):
 
+	__slots__ = ()
+
+	is_cacheable = True
+	priority = CommandPriority.Diagnostics
+
 	def __init__(self, address: int):
 		self.address = address
 
@@ -185,6 +251,11 @@ class OutputStatusReportCommand(Command):
 
 class ReaderStatusReportCommand(Command):
 
+	__slots__ = ()
+
+	is_cacheable = True
+	priority = CommandPriority.Diagnostics
+
 	def __init__(self, address: int):
 		self.address = address
 
@@ -204,6 +275,10 @@ class ReaderStatusReportCommand(Command):
 
 class OutputControlCommand(Command):
 
+	__slots__ = ('output_controls',)
+
+	priority = CommandPriority.Actuation
+
 	def __init__(self, address: int, output_controls: OutputControls):
 		self.address = address
 		self.output_controls = output_controls
@@ -221,9 +296,22 @@ class OutputControlCommand(Command):
 	def custom_command_update(self, command_buffer: bytearray):
 		pass
 
+	def coalescing_key(self):
+		return self.command_code
+
+	def coalesce(self, newer):
+		controls = {control.output_number: control for control in self.output_controls.controls}
+		for control in newer.output_controls.controls:
+			controls[control.output_number] = control
+		return OutputControlCommand(self.address, OutputControls(list(controls.values())))
+
 
 class ReaderLedControlCommand(Command):
 
+	__slots__ = ('reader_led_controls',)
+
+	priority = CommandPriority.Feedback
+
 	def __init__(self, address: int, reader_led_controls: ReaderLedControls):
 		self.address = address
 		self.reader_led_controls = reader_led_controls
@@ -241,9 +329,22 @@ class ReaderLedControlCommand(Command):
 	def custom_command_update(self, command_buffer: bytearray):
 		pass
 
+	def coalescing_key(self):
+		return self.command_code
+
+	def coalesce(self, newer):
+		controls = {(control.reader_number, control.led_number): control for control in self.reader_led_controls.controls}
+		for control in newer.reader_led_controls.controls:
+			controls[(control.reader_number, control.led_number)] = control
+		return ReaderLedControlCommand(self.address, ReaderLedControls(list(controls.values())))
+
 
 class ReaderBuzzerControlCommand(Command):
 
+	__slots__ = ('reader_buzzer_control',)
+
+	priority = CommandPriority.Feedback
+
 	def __init__(self, address: int, reader_buzzer_control: ReaderBuzzerControl):
 		self.address = address
 		self.reader_buzzer_control = reader_buzzer_control
@@ -261,9 +362,16 @@ class ReaderBuzzerControlCommand(Command):
 	def custom_command_update(self, command_buffer: bytearray):
 		pass
 
+	def coalescing_key(self):
+		return (self.command_code, self.reader_buzzer_control.reader_number)
+
 
 class ReaderTextOutputCommand(Command):
 
+	__slots__ = ('reader_text_output',)
+
+	priority = CommandPriority.Feedback
+
 	def __init__(self, address: int, reader_text_output: ReaderTextOutput):
 		self.address = address
 		self.reader_text_output = reader_text_output
@@ -281,9 +389,15 @@ class ReaderTextOutputCommand(Command):
 	def custom_command_update(self, command_buffer: bytearray):
 		pass
 
+	def coalescing_key(self):
+		text_output = self.reader_text_output
+		return (self.command_code, text_output.reader_number, text_output.text_command, text_output.row, text_output.column)
+
 
 class SetDateTimeCommand(Command):
 
+	__slots__ = ('timestamp',)
+
 	def __init__(self, address: int, timestamp: datetime.datetime):
 		self.address = address
 		self.timestamp = timestamp
@@ -313,6 +427,8 @@ class SetDateTimeCommand(Command):
 
 class ManufacturerSpecificCommand(Command):
 
+	__slots__ = ('manufacturer_data',)
+
 	def __init__(self, address: int, manufacturer_data: bytes):
 		self.address = address
 		self.manufacturer_data = manufacturer_data
@@ -333,6 +449,8 @@ class ManufacturerSpecificCommand(Command):
 
 class SecurityInitializationRequestCommand(Command):
 
+	__slots__ = ('server_random_number',)
+
 	def __init__(self, address: int, server_random_number: bytes):
 		self.address = address
 		self.server_random_number = server_random_number
@@ -353,6 +471,8 @@ class SecurityInitializationRequestCommand(Command):
 
 class ServerCryptogramCommand(Command):
 
+	__slots__ = ('server_cryptogram',)
+
 	def __init__(self, address: int, server_cryptogram: bytes):
 		self.address = address
 		self.server_cryptogram = server_cryptogram
@@ -373,6 +493,8 @@ class ServerCryptogramCommand(Command):
 
 class KeySetCommand(Command):
 
+	__slots__ = ('scbk',)
+
 	def __init__(self, address: int, scbk: bytes):
 		self.address = address
 		self.scbk = scbk
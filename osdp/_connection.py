@@ -5,6 +5,25 @@ import struct
 import socket
 
 
+def enable_rs485(fd: int):
+	# See struct serial_rs485 in linux kernel.
+	# SER_RS485_ENABLED = 1 and SER_RS485_RTS_ON_SEND = 1
+	# https://www.kernel.org/doc/Documentation/serial/serial-rs485.txt
+	serial_rs485 = struct.pack('IIIIIIII', 3, 0, 0, 0, 0, 0, 0, 0)
+	fcntl.ioctl(fd, 0x542F, serial_rs485)
+
+
+def discard_socket_input(sock: socket.socket, timeout: float):
+	sock.setblocking(False)
+	try:
+		while sock.recv(4096):
+			pass
+	except (BlockingIOError, InterruptedError):
+		pass
+	finally:
+		sock.settimeout(timeout)
+
+
 class OsdpConnection(ABC):
 
 	@property
@@ -33,12 +52,28 @@ class OsdpConnection(ABC):
 	def read(self, size: int = 1) -> bytes:
 		pass
 
+	def read_available(self, minimum: int, maximum: int) -> bytes:
+		# Waits for at least minimum bytes, connections able to tell how many
+		# bytes are waiting return up to maximum of them in the same call
+		return self.read(minimum)
+
+	def set_read_timeout(self, timeout: float):
+		# Set by the bus before each reply from the device policy, connections without
+		# a configurable timeout keep their own
+		pass
+
+	def discard_input(self):
+		# Called by the bus before each command, bytes still received after it are late
+		# replies the bus skips by address
+		pass
+
 
 class SerialPortOsdpConnection(OsdpConnection):
 
-	def __init__(self, port: str, baud_rate: int, raspberry_pi: bool = False):
+	def __init__(self, port: str, baud_rate: int, raspberry_pi: bool = False, read_timeout: float = 2.0):
 		self._port = port
 		self._baud_rate = baud_rate
+		self._read_timeout = read_timeout
 		self.serial_port = None
 		self.raspberry_pi = raspberry_pi
 
@@ -51,14 +86,9 @@ class SerialPortOsdpConnection(OsdpConnection):
 		return self.serial_port is not None and self.serial_port.is_open
 
 	def open(self):
-		self.serial_port = serial.Serial(port=self._port, baudrate=self._baud_rate, timeout=2.0)
+		self.serial_port = serial.Serial(port=self._port, baudrate=self._baud_rate, timeout=self._read_timeout)
 		if self.raspberry_pi:
-			fd = self.serial_port.fileno()
-			# See struct serial_rs485 in linux kernel.
-			# SER_RS485_ENABLED = 1 and SER_RS485_RTS_ON_SEND = 1
-			# https://www.kernel.org/doc/Documentation/serial/serial-rs485.txt
-			serial_rs485 = struct.pack('IIIIIIII', 3, 0, 0, 0, 0, 0, 0, 0)
-			fcntl.ioctl(fd, 0x542F, serial_rs485)
+			enable_rs485(self.serial_port.fileno())
 
 	def close(self):
 		if self.serial_port is not None:
@@ -71,14 +101,27 @@ class SerialPortOsdpConnection(OsdpConnection):
 	def read(self, size: int = 1) -> bytes:
 		return self.serial_port.read(size)
 
+	def read_available(self, minimum: int, maximum: int) -> bytes:
+		return self.serial_port.read(min(max(minimum, self.serial_port.in_waiting), maximum))
+
+	def discard_input(self):
+		self.serial_port.reset_input_buffer()
+
+	def set_read_timeout(self, timeout: float):
+		# Changing the timeout reconfigures the port, so it is only done when it differs
+		if timeout != self._read_timeout:
+			self._read_timeout = timeout
+			if self.serial_port is not None:
+				self.serial_port.timeout = timeout
+
 
 class TcpClientOsdpConnection(OsdpConnection):
 
-	def __init__(self, server: str, port_number: int):
+	def __init__(self, server: str, port_number: int, read_timeout: float = 2.0):
 		self._server = server
 		self._port_number = port_number
-		self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-		self.sock.settimeout(2)
+		self._read_timeout = read_timeout
+		self.sock = None
 		self.is_connected = False
 
 	@property
@@ -90,32 +133,65 @@ class TcpClientOsdpConnection(OsdpConnection):
 		return self.is_connected
 
 	def open(self):
+		# A closed socket cannot connect again, so each attempt gets a new one
+		self.close()
+		self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.sock.settimeout(2)
 		server_address = (self._server, self._port_number)
-		self.sock.connect(server_address)
+		try:
+			self.sock.connect(server_address)
+		except OSError:
+			self.close()
+			raise
+		self.sock.settimeout(self._read_timeout)
 		self.is_connected = True
 
 	def close(self):
-		self.sock.close()
+		if self.sock is not None:
+			self.sock.close()
+			self.sock = None
 		self.is_connected = False
 
 	def write(self, buf: bytes):
+		if self.sock is None:
+			raise ConnectionError("Not connected to {0}:{1}".format(self._server, self._port_number))
 		try:
 			self.sock.send(buf)
 		except socket.timeout:
-			self.is_connected = False
+			self.close()
 
 	def read(self, size: int = 1) -> bytes:
+		if self.sock is None:
+			raise ConnectionError("Not connected to {0}:{1}".format(self._server, self._port_number))
 		try:
-			return self.sock.recv(size)
+			data = self.sock.recv(size)
 		except socket.timeout:
-			self.is_connected = False
-		return b''
+			# The device did not answer in time, the connection itself is still up
+			return b''
+		if len(data) == 0:
+			# Peer closed the connection
+			self.close()
+		return data
+
+	def read_available(self, minimum: int, maximum: int) -> bytes:
+		return self.read(maximum)
+
+	def discard_input(self):
+		if self.sock is not None:
+			discard_socket_input(self.sock, self._read_timeout)
+
+	def set_read_timeout(self, timeout: float):
+		if timeout != self._read_timeout:
+			self._read_timeout = timeout
+			if self.is_connected:
+				self.sock.settimeout(timeout)
 
 
 class TcpServerOsdpConnection(OsdpConnection):
 
-	def __init__(self, port_number: int):
+	def __init__(self, port_number: int, read_timeout: float = 2.0):
 		self._port_number = port_number
+		self._read_timeout = read_timeout
 		self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 		self.sock.settimeout(2)
 		server_address = ('0.0.0.0', self._port_number)
@@ -133,20 +209,41 @@ class TcpServerOsdpConnection(OsdpConnection):
 	def open(self):
 		self.sock.listen(1)
 		self.connection, _ = self.sock.accept()
+		self.connection.settimeout(self._read_timeout)
 
 	def close(self):
-		self.connection.close()
-		self.connection = None
+		if self.connection is not None:
+			self.connection.close()
+			self.connection = None
 
 	def write(self, buf: bytes):
+		if self.connection is None:
+			raise ConnectionError("No peer connected on port {0}".format(self._port_number))
 		try:
 			self.connection.sendall(buf)
 		except socket.timeout:
 			self.close()
 
 	def read(self, size: int = 1) -> bytes:
+		if self.connection is None:
+			raise ConnectionError("No peer connected on port {0}".format(self._port_number))
 		try:
-			return self.connection.recv(size)
+			data = self.connection.recv(size)
 		except socket.timeout:
+			return b''
+		if len(data) == 0:
 			self.close()
-		return b''
+		return data
+
+	def read_available(self, minimum: int, maximum: int) -> bytes:
+		return self.read(maximum)
+
+	def discard_input(self):
+		if self.connection is not None:
+			discard_socket_input(self.connection, self._read_timeout)
+
+	def set_read_timeout(self, timeout: float):
+		if timeout != self._read_timeout:
+			self._read_timeout = timeout
+			if self.connection is not None:
+				self.connection.settimeout(timeout)
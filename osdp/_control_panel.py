@@ -1,10 +1,14 @@
 import logging
+import queue
+import time
+from datetime import timedelta
 from uuid import UUID
-from threading import Thread
+from threading import Thread, Lock
 
 from ._types import (
 	DeviceIdentification, DeviceCapabilities, LocalStatus, InputStatus, OutputStatus, ReaderStatus,
-	OutputControls, ReplyType, ReaderLedControls, DataEvent, Nak, RawCardData, KeypadData
+	OutputControls, ReplyType, ReaderLedControls, DataEvent, Nak, RawCardData, KeypadData, CommandPriority,
+	OverflowPolicy, DeviceStatus, ConnectionStatus
 )
 from ._connection import OsdpConnection
 from ._command import (
@@ -13,7 +17,14 @@ from ._command import (
 	KeySetCommand
 )
 from ._reply import Reply
+from ._event_stream import EventStream, ReplyEvent, DeviceStatusEvent, ConnectionStatusEvent
+from ._device import CommandQueueStatistics
 from ._bus import Bus
+from ._poll_scheduler import PollScheduler, PollStatistics
+from ._metrics import MetricsSink
+from ._timeout_policy import ReplyTimeoutPolicy
+from ._reconnect_policy import ReconnectPolicy
+from ._discovery import AddressScan
 
 
 log = logging.getLogger('osdp')
@@ -21,19 +32,62 @@ console_handler = logging.StreamHandler()
 log.addHandler(console_handler)
 
 
+class BatchResult:
+
+	def __init__(self, connection_id: UUID, address: int, command: Command):
+		self.connection_id = connection_id
+		self.address = address
+		self.command = command
+		self.reply = None
+		self.error = None
+
+	@property
+	def is_success(self) -> bool:
+		return self.reply is not None
+
+	def __repr__(self):
+		return "Connection ID: {0} Address: {1} Command: {2} Reply: {3} Error: {4}".format(
+			self.connection_id, self.address, type(self.command).__name__, self.reply, repr(self.error)
+		)
+
+
 class ControlPanel:
 
-	def __init__(self, master_key: bytes = None):
+	# Handlers called for replies without a command waiting for them
+	ReplyHandlers = {
+		ReplyType.Nak: 'on_nak_reply_received',
+		ReplyType.LocalStatusReport: 'on_local_status_report_reply_received',
+		ReplyType.InputStatusReport: 'on_input_status_report_reply_received',
+		ReplyType.OutputStatusReport: 'on_output_status_report_reply_received',
+		ReplyType.ReaderStatusReport: 'on_reader_status_report_reply_received',
+		ReplyType.FormattedReaderData: 'on_formatted_reader_data_reply_received',
+		ReplyType.RawReaderData: 'on_raw_card_data_reply_received',
+		ReplyType.KeypadData: 'on_keypad_data_reply_received'
+	}
+	EventReplyTypes = tuple(ReplyHandlers)
+
+	def __init__(self, master_key: bytes = None, metrics: MetricsSink = None):
 		self._buses = {}
-		self._reply_handlers = []
+		self._polling_threads = []
+		self._pending_replies = {}
+		self._pending_replies_lock = Lock()
+		self._event_streams = ()
+		self._event_streams_lock = Lock()
 		self._reply_timeout = 5.0
 		self._master_key = master_key
-
-	def start_connection(self, connection: OsdpConnection) -> UUID:
-		bus = Bus(connection, self.on_reply_received)
+		self._metrics = metrics
+
+	def start_connection(
+		self, connection: OsdpConnection, poll_scheduler: PollScheduler = None, reconnect_policy: ReconnectPolicy = None
+	) -> UUID:
+		bus = Bus(
+			connection, self.on_reply_received, poll_scheduler, self._metrics, self._device_status_changed,
+			reconnect_policy, self._connection_status_changed
+		)
 		self._buses[bus.id] = bus
 		thread = Thread(target=bus.run_polling_loop)
 		thread.start()
+		self._polling_threads.append(thread)
 		return bus.id
 
 	def send_custom_command(self, connection_id: UUID, command: Command):
@@ -76,32 +130,164 @@ class ControlPanel:
 		else:
 			return bus.is_online(address)
 
-	def send_command(self, connection_id: UUID, command: Command) -> Reply:
-		event = DataEvent()
+	def is_connected(self, connection_id: UUID) -> bool:
+		bus = self._buses.get(connection_id)
+		return bus is not None and bus.is_connected
 
-		def reply_fetcher(reply: Reply):
-			if reply.match_issuing_command(command):
-				self._reply_handlers.remove(reply_fetcher)
-				event.set_data(reply)
+	def command_queue_depth(self, connection_id: UUID, address: int) -> int:
+		bus = self._buses.get(connection_id)
+		if bus is None:
+			return 0
+		else:
+			return bus.command_queue_depth(address)
+
+	def command_queue_statistics(self, connection_id: UUID, address: int) -> CommandQueueStatistics:
+		bus = self._buses.get(connection_id)
+		if bus is None:
+			return None
+		else:
+			return bus.command_queue_statistics(address)
+
+	def secure_channel_establishment_times(self, connection_id: UUID) -> dict:
+		bus = self._buses.get(connection_id)
+		if bus is None:
+			return {}
+		else:
+			return bus.secure_channel_establishment_times()
 
-		self._reply_handlers.append(reply_fetcher)
+	def poll_statistics(self, connection_id: UUID) -> PollStatistics:
+		bus = self._buses.get(connection_id)
+		if bus is None:
+			return None
+		else:
+			return bus.poll_statistics
+
+	def discover_devices(
+		self, connection_id: UUID, addresses=range(0x7F), reply_timeout: timedelta = timedelta(milliseconds=50),
+		timeout: float = 30.0
+	) -> list:
+		'''
+		Probe addresses that are not configured on the bus, in between polling the configured devices,
+		and return a DiscoveredDevice for each one that replies. The scan is stopped when it times out,
+		and returns the devices discovered so far when the bus is closed.
+		'''
+		scan = AddressScan(addresses, reply_timeout)
 		bus = self._buses[connection_id]
-		bus.send_command(command)
-		result = event.wait_data(self._reply_timeout)
+		bus.start_scan(scan)
+		if not scan.wait(timeout):
+			bus.cancel_scan(scan)
+			raise TimeoutError()
+		return scan.discovered
+
+	def send_command(
+		self, connection_id: UUID, command: Command, timeout: float = None, priority: CommandPriority = None
+	) -> Reply:
+		event = DataEvent()
+		key = self._add_pending_reply(connection_id, command, event.set_data)
+		try:
+			self._queue_command(connection_id, command, priority)
+			result = event.wait_data(self._reply_timeout if timeout is None else timeout)
+		finally:
+			self._remove_pending_reply(key)
 		if event.is_set():
 			return result
 		else:
-			self._reply_handlers.remove(reply_fetcher)
 			raise TimeoutError()
 
+	def send_commands(self, requests, timeout: float = None):
+		'''
+		Send (connection_id, address, command) requests to all buses at once and
+		yield a BatchResult for each one as its reply arrives or it times out.
+		The command may be a Command, or a command type created with the address.
+		Each request times out on its own, the timeout after it was queued.
+		'''
+		if timeout is None:
+			timeout = self._reply_timeout
+		completed = queue.Queue()
+		pending = {}
+		failed = []
+		for connection_id, address, command in self._batch_requests(requests):
+			result = BatchResult(connection_id, address, command)
+			key = self._pending_reply_key(connection_id, command)
+			self._add_pending_reply(connection_id, command, lambda reply, key=key: completed.put((key, reply)))
+			try:
+				self._queue_command(connection_id, command)
+			except KeyError as error:
+				self._remove_pending_reply(key)
+				result.error = error
+				failed.append(result)
+				continue
+			pending[key] = (result, time.monotonic() + timeout)
+
+		return self._collect_batch_results(completed, pending, failed)
+
+	@staticmethod
+	def _batch_requests(requests) -> list:
+		batch = []
+		commands = set()
+		for connection_id, address, command in requests:
+			if not isinstance(command, Command):
+				command = command(address)
+			# Replies are matched to the command instance, one instance can only wait for one reply
+			if id(command) in commands:
+				raise ValueError("{0} to {1} is sent more than once in the batch".format(type(command).__name__, address))
+			commands.add(id(command))
+			batch.append((connection_id, address, command))
+		return batch
+
+	def _collect_batch_results(self, completed: queue.Queue, pending: dict, failed: list):
+		yield from failed
+		try:
+			while pending:
+				# Requests are pending in the order of their deadlines
+				key, (result, deadline) = next(iter(pending.items()))
+				try:
+					# Replies already received are taken first, even when the consumer is late
+					key, reply = completed.get(timeout=max(deadline - time.monotonic(), 0))
+				except queue.Empty:
+					del pending[key]
+					self._remove_pending_reply(key)
+					result.error = TimeoutError()
+					yield result
+					continue
+				answered = pending.pop(key, None)
+				if answered is not None:
+					answered[0].reply = reply
+					yield answered[0]
+		finally:
+			for key in pending:
+				self._remove_pending_reply(key)
+
+	def _queue_command(self, connection_id: UUID, command: Command, priority: CommandPriority = None):
+		bus = self._buses[connection_id]
+		bus.send_command(command, priority)
+
+	@staticmethod
+	def _pending_reply_key(connection_id: UUID, command: Command):
+		return (connection_id, command.address, command)
+
+	def _add_pending_reply(self, connection_id: UUID, command: Command, on_reply):
+		key = self._pending_reply_key(connection_id, command)
+		with self._pending_replies_lock:
+			self._pending_replies[key] = on_reply
+		return key
+
+	def _remove_pending_reply(self, key):
+		with self._pending_replies_lock:
+			self._pending_replies.pop(key, None)
+
 	def shutdown(self):
 		for bus in list(self._buses.values()):
 			bus.close()
+		self._close_event_streams()
 
-	def add_device(self, connection_id: UUID, address: int, use_crc: bool, use_secure_channel: bool):
+	def add_device(
+		self, connection_id: UUID, address: int, use_crc: bool, use_secure_channel: bool,
+		coalesce_commands: bool = False, timeout_policy: ReplyTimeoutPolicy = None
+	):
 		bus = self._buses.get(connection_id)
 		if bus is not None:
-			bus.add_device(address, use_crc, use_secure_channel, self._master_key)
+			bus.add_device(address, use_crc, use_secure_channel, self._master_key, coalesce_commands, timeout_policy)
 
 	def remove_device(self, connection_id: UUID, address: int):
 		bus = self._buses.get(connection_id)
@@ -109,32 +295,86 @@ class ControlPanel:
 			bus.remove_device(address)
 
 	def on_reply_received(self, reply: Reply):
-		for reply_hander in self._reply_handlers:
-			reply_hander(reply)
-
-		if reply.type == ReplyType.Nak:
-			self.on_nak_reply_received(reply.address, Nak.parse_data(reply))
-
-		elif reply.type == ReplyType.LocalStatusReport:
-			self.on_local_status_report_reply_received(reply.address, LocalStatus.parse_data(reply))
-
-		elif reply.type == ReplyType.InputStatusReport:
-			self.on_input_status_report_reply_received(reply.address, InputStatus.parse_data(reply))
-
-		elif reply.type == ReplyType.OutputStatusReport:
-			self.on_output_status_report_reply_received(reply.address, OutputStatus.parse_data(reply))
-
-		elif reply.type == ReplyType.ReaderStatusReport:
-			self.on_reader_status_report_reply_received(reply.address, ReaderStatus.parse_data(reply))
-
-		elif reply.type == ReplyType.FormattedReaderData:
-			self.on_formatted_reader_data_reply_received(reply.address, reply.extract_reply_data)
-
-		elif reply.type == ReplyType.RawReaderData:
-			self.on_raw_card_data_reply_received(reply.address, RawCardData.parse_data(reply))
-
-		elif reply.type == ReplyType.KeypadData:
-			self.on_keypad_data_reply_received(reply.address, KeypadData.parse_data(reply))
+		command = reply.issuing_command
+		self._complete_pending_replies(reply, (command,) + command.coalesced_commands)
+		self._dispatch_reply(reply)
+
+	def _complete_pending_replies(self, reply: Reply, issued_commands):
+		for issued_command in issued_commands:
+			with self._pending_replies_lock:
+				on_reply = self._pending_replies.pop(self._pending_reply_key(reply.connection_id, issued_command), None)
+			if on_reply is not None:
+				on_reply(reply)
+
+	def _dispatch_reply(self, reply: Reply):
+		handler_name = self.ReplyHandlers.get(reply.type)
+		if handler_name is None:
+			return
+
+		# Reply data is only decoded for an overridden handler, debug logging or a subscribed stream
+		if self._has_reply_handler(handler_name) or log.isEnabledFor(logging.DEBUG):
+			getattr(self, handler_name)(reply.address, reply.decoded_data)
+		self._publish_event(reply)
+
+	def _has_reply_handler(self, handler_name: str) -> bool:
+		# Handlers may be overridden in a subclass or assigned on the instance
+		handler = getattr(self, handler_name)
+		return getattr(handler, '__func__', handler) is not getattr(ControlPanel, handler_name)
+
+	def events(
+		self,
+		max_size: int = 1024,
+		overflow_policy: OverflowPolicy = OverflowPolicy.DropOldest,
+		event_types=None,
+		block_timeout: float = None
+	) -> EventStream:
+		'''
+		Subscribe to reply, device status and connection status events of every bus, optionally only
+		those of the given ReplyType, DeviceStatus and ConnectionStatus values. Closing the stream unsubscribes it.
+		'''
+		stream = EventStream(max_size, overflow_policy, event_types, block_timeout, self._remove_event_stream)
+		with self._event_streams_lock:
+			self._event_streams = self._event_streams + (stream,)
+		return stream
+
+	def _remove_event_stream(self, stream: EventStream):
+		with self._event_streams_lock:
+			self._event_streams = tuple(subscribed for subscribed in self._event_streams if subscribed is not stream)
+
+	def _close_event_streams(self):
+		for stream in self._event_streams:
+			stream.close()
+
+	def _publish_event(self, reply: Reply):
+		event = None
+		for stream in self._event_streams:
+			if stream.accepts(reply.type):
+				event = event or ReplyEvent(reply.connection_id, reply.address, reply.type, reply=reply)
+				stream.put(event)
+
+	def _device_status_changed(self, connection_id: UUID, address: int, is_online: bool):
+		status = DeviceStatus.Online if is_online else DeviceStatus.Offline
+		self.on_device_status_changed(connection_id, address, status)
+
+		event = DeviceStatusEvent(connection_id, address, status)
+		for stream in self._event_streams:
+			if stream.accepts(status):
+				stream.put(event)
+
+	def on_device_status_changed(self, connection_id: UUID, address: int, status: DeviceStatus):
+		log.debug("%s < Device is %s", address, status.name)
+
+	def _connection_status_changed(self, connection_id: UUID, is_connected: bool):
+		status = ConnectionStatus.Connected if is_connected else ConnectionStatus.Disconnected
+		self.on_connection_status_changed(connection_id, status)
+
+		event = ConnectionStatusEvent(connection_id, status)
+		for stream in self._event_streams:
+			if stream.accepts(status):
+				stream.put(event)
+
+	def on_connection_status_changed(self, connection_id: UUID, status: ConnectionStatus):
+		log.debug("Connection %s is %s", connection_id, status.name)
 
 	def on_nak_reply_received(self, address: int, nak: Nak):
 		log.debug("%s < Nak received %s", address, nak)
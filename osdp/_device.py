@@ -1,26 +1,88 @@
+import heapq
 import logging
-import queue
 import datetime
+from itertools import count
+from threading import Lock
 
-from ._types import Control, SecurityBlockType
+from ._types import Control, SecurityBlockType, CommandPriority
 from ._command import (
 	PollCommand, SecurityInitializationRequestCommand, ServerCryptogramCommand, KeySetCommand
 )
 from ._secure_channel import SecureChannel
+from ._timeout_policy import ReplyTimeoutPolicy
 
 log = logging.getLogger('osdp')
 
 
+class CommandQueueStatistics:
+	'''
+	Time commands of each priority waited in a device queue before being sent
+	'''
+
+	def __init__(self):
+		self._lock = Lock()
+		self.sent = {}
+		self.last_wait_time = {}
+		self.max_wait_time = {}
+		self.total_wait_time = {}
+
+	def record(self, priority: CommandPriority, wait_time: datetime.timedelta):
+		with self._lock:
+			self.sent[priority] = self.sent.get(priority, 0) + 1
+			self.last_wait_time[priority] = wait_time
+			self.max_wait_time[priority] = max(self.max_wait_time.get(priority, wait_time), wait_time)
+			self.total_wait_time[priority] = self.total_wait_time.get(priority, datetime.timedelta(0)) + wait_time
+
+	def average_wait_time(self, priority: CommandPriority) -> datetime.timedelta:
+		if not self.sent.get(priority):
+			return None
+		return self.total_wait_time[priority] / self.sent[priority]
+
+	def __getstate__(self):
+		# Snapshots are sent between processes without the lock
+		state = self.__dict__.copy()
+		del state['_lock']
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self._lock = Lock()
+
+	def __repr__(self):
+		return '\n'.join([
+			"{0}: Sent: {1} Last: {2} Average: {3} Max: {4}".format(
+				priority.name,
+				self.sent[priority],
+				self.last_wait_time[priority],
+				self.average_wait_time(priority),
+				self.max_wait_time[priority]
+			) for priority in sorted(self.sent)
+		])
+
+
 class Device(object):
 
-	def __init__(self, address: int, use_crc: bool, use_secure_channel: bool, master_key: bytes = None):
+	def __init__(
+		self, address: int, use_crc: bool, use_secure_channel: bool, master_key: bytes = None,
+		coalesce_commands: bool = False, timeout_policy: ReplyTimeoutPolicy = None
+	):
 		self._use_secure_channel = use_secure_channel
+		self.coalesce_commands = coalesce_commands
+		self.timeout_policy = timeout_policy or ReplyTimeoutPolicy()
 		self.address = address
 		self.message_control = Control(0, use_crc, use_secure_channel)
 
-		self._commands = queue.Queue()
+		# Heap of [priority, order, queued time, command] entries, guarded by the lock
+		self._commands = []
+		self._commands_lock = Lock()
+		self._command_order = count()
+		self._coalescable_commands = {}
+		self.command_queue_statistics = CommandQueueStatistics()
 		self._secure_channel = SecureChannel(master_key)
 		self._last_valid_reply = datetime.datetime.utcfromtimestamp(0)
+		self._was_online = False
+		self._secure_channel_started = None
+		self.secure_channel_establishment_time = None
 		self.reset_security_after_reply = False
 
 	@property
@@ -31,11 +93,41 @@ class Device(object):
 	def is_online(self) -> bool:
 		return self._last_valid_reply + datetime.timedelta(seconds=5) >= datetime.datetime.now()
 
+	def update_online_status(self) -> bool:
+		'''
+		Whether the device went online or offline since the last call
+		'''
+		is_online = self.is_online
+		changed = is_online != self._was_online
+		self._was_online = is_online
+		return changed
+
+	@property
+	def is_establishing_secure_channel(self) -> bool:
+		return self._use_secure_channel and not self._secure_channel.is_established
+
+	@property
+	def has_pending_commands(self) -> bool:
+		return len(self._commands) > 0
+
+	@property
+	def command_queue_depth(self) -> int:
+		return len(self._commands)
+
+	@property
+	def pending_priority(self) -> CommandPriority:
+		with self._commands_lock:
+			if not self._commands:
+				return None
+			return CommandPriority(self._commands[0][0])
+
 	def get_next_command_data(self):
 		if self.message_control.sequence == 0:
 			return PollCommand(self.address)
 
 		if self._use_secure_channel and not self._secure_channel.is_initialized:
+			if self._secure_channel_started is None:
+				self._secure_channel_started = datetime.datetime.now()
 			return SecurityInitializationRequestCommand(self.address, self._secure_channel.server_random_number)
 
 		if self._use_secure_channel and not self._secure_channel.is_established:
@@ -45,14 +137,43 @@ class Device(object):
 			self.reset_security_after_reply = True
 			return KeySetCommand(self.address, self._secure_channel.calculate_scbk())
 
-		if self._commands.empty():
-			return PollCommand(self.address)
-		else:
-			command = self._commands.get(False)
-			return command
-
-	def send_command(self, command):
-		self._commands.put(command)
+		with self._commands_lock:
+			if not self._commands:
+				return PollCommand(self.address)
+			entry = heapq.heappop(self._commands)
+			priority, _, queued_time, command = entry
+			key = command.coalescing_key()
+			if key is not None and self._coalescable_commands.get(key) is entry:
+				del self._coalescable_commands[key]
+		self.command_queue_statistics.record(CommandPriority(priority), datetime.datetime.now() - queued_time)
+		return command
+
+	def send_command(self, command, priority: CommandPriority = None):
+		priority = command.priority if priority is None else priority
+		key = command.coalescing_key() if self.coalesce_commands else None
+		with self._commands_lock:
+			entry = self._coalescable_commands.get(key) if key is not None else None
+			if entry is not None:
+				# Still waiting to be sent, fold the newer command into it
+				entry[3] = self.coalesce(entry[3], command)
+				if priority < entry[0]:
+					# Sent at the most urgent priority of the merged commands, keeping the place of the first
+					entry[0] = int(priority)
+					heapq.heapify(self._commands)
+				return
+
+			entry = [int(priority), next(self._command_order), datetime.datetime.now(), command]
+			if key is not None:
+				self._coalescable_commands[key] = entry
+			heapq.heappush(self._commands, entry)
+
+	def coalesce(self, pending, command):
+		coalesced = pending.coalesce(command)
+		coalesced.coalesced_commands = tuple(
+			superseded for superseded in pending.coalesced_commands + (pending, command) + command.coalesced_commands
+			if superseded is not coalesced
+		)
+		return coalesced
 
 	def valid_reply_has_been_received(self):
 		self.message_control.increment_sequence()
@@ -71,6 +192,9 @@ class Device(object):
 			return False
 
 		self._secure_channel.establish(reply.extract_reply_data)
+		if self._secure_channel_started is not None:
+			self.secure_channel_establishment_time = datetime.datetime.now() - self._secure_channel_started
+			self._secure_channel_started = None
 		return True
 
 	def generate_mac(self, message: bytes, is_command: bool):
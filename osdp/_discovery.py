@@ -0,0 +1,82 @@
+from collections import deque
+from datetime import timedelta
+from threading import Event
+
+from ._types import DeviceIdentification, DeviceCapabilities, CapabilityFunction
+
+
+class DiscoveredDevice:
+
+	def __init__(
+		self, address: int, use_crc: bool, identification: DeviceIdentification = None,
+		capabilities: DeviceCapabilities = None
+	):
+		self.address = address
+		self.use_crc = use_crc
+		self.identification = identification
+		self.capabilities = capabilities
+
+	@property
+	def supports_secure_channel(self) -> bool:
+		if self.capabilities is None:
+			return False
+		return any(
+			capability.function == CapabilityFunction.CommunicationSecurity and capability.compliance > 0
+			for capability in self.capabilities.capabilities
+		)
+
+	def __repr__(self):
+		return "Address: {0} CRC: {1} Secure Channel: {2}\n{3}".format(
+			self.address, self.use_crc, self.supports_secure_channel, self.identification
+		)
+
+
+class AddressScan:
+	'''
+	Sweep of bus addresses, probed a few at a time between poll passes so that
+	configured devices keep being polled while it runs
+	'''
+
+	def __init__(
+		self,
+		addresses=range(0x7F),
+		reply_timeout: timedelta = timedelta(milliseconds=50),
+		addresses_per_pass: int = 8,
+		on_complete=None
+	):
+		self.reply_timeout = reply_timeout
+		self.addresses_per_pass = addresses_per_pass
+		self.discovered = []
+		self._addresses = deque(addresses)
+		self._on_complete = on_complete
+		self._completed = Event()
+
+	@property
+	def is_complete(self) -> bool:
+		return self._completed.is_set()
+
+	@property
+	def remaining(self) -> int:
+		return len(self._addresses)
+
+	def next_addresses(self, configured_addresses) -> list:
+		addresses = []
+		while self._addresses and len(addresses) < self.addresses_per_pass:
+			address = self._addresses.popleft()
+			if address not in configured_addresses:
+				addresses.append(address)
+		return addresses
+
+	def complete(self):
+		self.discovered.sort(key=lambda discovered: discovered.address)
+		self._completed.set()
+		if self._on_complete is not None:
+			self._on_complete(self)
+
+	def cancel(self):
+		# Completed with the devices discovered so far
+		self._addresses.clear()
+		self.complete()
+
+	def wait(self, timeout: float = None) -> bool:
+		return self._completed.wait(timeout)
@@ -0,0 +1,186 @@
+import asyncio
+from collections import deque
+from datetime import datetime
+from threading import Condition
+from uuid import UUID
+
+from ._types import ReplyType, DeviceStatus, ConnectionStatus, OverflowPolicy
+
+
+class ReplyEvent:
+
+	def __init__(self, connection_id: UUID, address: int, reply_type: ReplyType, data=None, reply=None):
+		self.connection_id = connection_id
+		self.address = address
+		self.type = reply_type
+		self.received_time = datetime.now()
+		self._data = data
+		self._reply = reply
+
+	@property
+	def data(self):
+		# Decoded by the consumer on first access rather than on the polling thread
+		if self._reply is not None:
+			return self._reply.decoded_data
+		return self._data
+
+	def __repr__(self):
+		return "Connection ID: {0} Address: {1} Type: {2} Data: {3}".format(
+			self.connection_id, self.address, self.type, self.data
+		)
+
+
+class DeviceStatusEvent:
+
+	def __init__(self, connection_id: UUID, address: int, status: DeviceStatus):
+		self.connection_id = connection_id
+		self.address = address
+		self.type = status
+		self.received_time = datetime.now()
+
+	def __repr__(self):
+		return "Connection ID: {0} Address: {1} Status: {2}".format(self.connection_id, self.address, self.type.name)
+
+
+class ConnectionStatusEvent:
+
+	def __init__(self, connection_id: UUID, status: ConnectionStatus):
+		self.connection_id = connection_id
+		self.address = None
+		self.type = status
+		self.received_time = datetime.now()
+
+	def __repr__(self):
+		return "Connection ID: {0} Status: {1}".format(self.connection_id, self.type.name)
+
+
+class EventStream:
+	'''
+	Bounded queue of reply, device status and connection status events, consumed as a blocking
+	iterator or an async iterator away from the bus polling thread. When full, the overflow policy
+	either blocks the publisher until there is room or drops the newest or oldest event.
+	'''
+
+	def __init__(
+		self,
+		max_size: int = 1024,
+		overflow_policy: OverflowPolicy = OverflowPolicy.DropOldest,
+		event_types=None,
+		block_timeout: float = None,
+		on_close=None
+	):
+		self.max_size = max_size
+		self.overflow_policy = overflow_policy
+		self.event_types = frozenset(event_types) if event_types is not None else None
+		self.block_timeout = block_timeout
+		self._on_close = on_close
+		self._events = deque()
+		self._condition = Condition()
+		self._async_waiters = []
+		self._is_closed = False
+		self.published_count = 0
+		self.dropped_count = 0
+		self.high_water_mark = 0
+
+	def __len__(self):
+		return len(self._events)
+
+	@property
+	def is_closed(self) -> bool:
+		return self._is_closed
+
+	def accepts(self, event_type) -> bool:
+		return not self._is_closed and (self.event_types is None or event_type in self.event_types)
+
+	def put(self, event) -> bool:
+		with self._condition:
+			if self._is_closed:
+				return False
+
+			if len(self._events) >= self.max_size:
+				if self.overflow_policy == OverflowPolicy.Block:
+					has_room = self._condition.wait_for(
+						lambda: self._is_closed or len(self._events) < self.max_size, self.block_timeout
+					)
+					if not has_room or self._is_closed:
+						self.dropped_count += 1
+						return False
+				elif self.overflow_policy == OverflowPolicy.DropNewest:
+					self.dropped_count += 1
+					return False
+				else:
+					self._events.popleft()
+					self.dropped_count += 1
+
+			self._events.append(event)
+			self.published_count += 1
+			self.high_water_mark = max(self.high_water_mark, len(self._events))
+			self._condition.notify_all()
+			self._wake_async_waiters()
+		return True
+
+	def get(self, timeout: float = None) -> ReplyEvent:
+		'''
+		Next event, or None once the stream is closed and empty or the timeout expires
+		'''
+		with self._condition:
+			self._condition.wait_for(lambda: self._events or self._is_closed, timeout)
+			return self._take()
+
+	def close(self):
+		with self._condition:
+			if self._is_closed:
+				return
+			self._is_closed = True
+			self._condition.notify_all()
+			self._wake_async_waiters()
+		if self._on_close is not None:
+			self._on_close(self)
+
+	def __iter__(self):
+		return self
+
+	def __next__(self) -> ReplyEvent:
+		event = self.get()
+		if event is None:
+			raise StopIteration
+		return event
+
+	def __aiter__(self):
+		return self
+
+	async def __anext__(self) -> ReplyEvent:
+		loop = asyncio.get_event_loop()
+		while True:
+			with self._condition:
+				if self._events:
+					return self._take()
+				if self._is_closed:
+					raise StopAsyncIteration
+				waiter = loop.create_future()
+				self._async_waiters.append((loop, waiter))
+			await waiter
+
+	def _take(self) -> ReplyEvent:
+		if not self._events:
+			return None
+		event = self._events.popleft()
+		# Room for a publisher waiting under the block policy
+		self._condition.notify_all()
+		return event
+
+	def _wake_async_waiters(self):
+		waiters, self._async_waiters = self._async_waiters, []
+		for loop, waiter in waiters:
+			if not loop.is_closed():
+				loop.call_soon_threadsafe(_set_waiter_result, waiter)
+
+	def __repr__(self):
+		return "Queued: {0} Published: {1} Dropped: {2} High water mark: {3}".format(
+			len(self._events), self.published_count, self.dropped_count, self.high_water_mark
+		)
+
+
+def _set_waiter_result(waiter: asyncio.Future):
+	if not waiter.done():
+		waiter.set_result(None)
@@ -0,0 +1,75 @@
+from ._message import Message
+
+
+class FrameReader:
+	'''
+	Splits bytes received from a connection into OSDP frames, keeping any bytes
+	read past the end of a frame for the next one. Those bytes belong to the exchange
+	they were read in, so the bus clears the reader before sending each command, and
+	given the address of the device it waits for, frames from other addresses are dropped.
+	'''
+
+	HEADER_SIZE = 4
+	MIN_FRAME_SIZE = 7
+
+	def __init__(self, chunk_size: int = 1024):
+		self.chunk_size = chunk_size
+		self._buffer = bytearray()
+
+	@property
+	def buffered(self) -> int:
+		return len(self._buffer)
+
+	@property
+	def bytes_needed(self) -> int:
+		if len(self._buffer) < self.HEADER_SIZE:
+			return self.HEADER_SIZE - len(self._buffer)
+		return max(self._frame_length() - len(self._buffer), 1)
+
+	@property
+	def timeout_message(self) -> str:
+		if len(self._buffer) == 0:
+			return "Timeout waiting for reply message"
+		if len(self._buffer) < self.HEADER_SIZE:
+			return "Timeout waiting for reply message length"
+		return "Timeout waiting for rest of reply message"
+
+	def feed(self, data: bytes):
+		self._buffer.extend(data)
+
+	def clear(self):
+		self._buffer.clear()
+
+	def next_frame(self, address: int = None) -> bytes:
+		while True:
+			start = self._buffer.find(Message.SOM)
+			if start < 0:
+				self._buffer.clear()
+				return None
+			if start > 0:
+				del self._buffer[:start]
+
+			if len(self._buffer) < self.HEADER_SIZE:
+				return None
+
+			frame_length = self._frame_length()
+			if frame_length < self.MIN_FRAME_SIZE:
+				# Not a real start of message, resynchronize on the next SOM
+				del self._buffer[:1]
+				continue
+
+			if len(self._buffer) < frame_length:
+				return None
+
+			if address is not None and self._buffer[1] != (address | 0x80):
+				# A late reply to an earlier command, not the one waited for
+				del self._buffer[:frame_length]
+				continue
+
+			with memoryview(self._buffer) as view:
+				frame = bytes(view[:frame_length])
+			del self._buffer[:frame_length]
+			return frame
+
+	def _frame_length(self) -> int:
+		return self._buffer[2] | (self._buffer[3] << 8)
@@ -1,8 +1,16 @@
 from abc import ABC, abstractmethod
 
+try:
+	# CRC-CCITT with the same polynomial as OSDP, implemented in C
+	from binascii import crc_hqx
+except ImportError:
+	crc_hqx = None
+
 
 class Message(ABC):
 
+	__slots__ = ('_address',)
+
 	SOM = 0x53
 
 	crc_table = [
@@ -44,6 +52,11 @@ class Message(ABC):
 		pass
 
 	def calculate_crc(self, data: bytes) -> int:
+		if crc_hqx is not None:
+			return crc_hqx(data, 0x1D0F)
+		return self.calculate_crc_with_table(data)
+
+	def calculate_crc_with_table(self, data: bytes) -> int:
 		crc = 0x1D0F
 		for t in data:
 			crc = ((crc << 8) ^ self.crc_table[((crc >> 8) ^ t) & 0xFF]) & 0xFFFF
@@ -58,13 +71,15 @@ class Message(ABC):
 		packet[3] = packet_length[1]
 
 	def add_crc(self, packet: bytearray):
-		crc = self.calculate_crc(bytes(packet[:-2]))
+		with memoryview(packet) as view:
+			crc = self.calculate_crc(view[:-2])
 		crc_bytes = crc.to_bytes(2, byteorder='little')
 		packet[-2] = crc_bytes[0]
 		packet[-1] = crc_bytes[1]
 
 	def add_checksum(self, packet: bytearray):
-		checksum = self.calculate_checksum(bytes(packet[:-1]))
+		with memoryview(packet) as view:
+			checksum = self.calculate_checksum(view[:-1])
 		packet[-1] = checksum & 0xFF
 
 	def encrypted_data(self, device) -> bytes:
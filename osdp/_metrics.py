@@ -0,0 +1,104 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from threading import Lock
+
+
+class MetricsSink(ABC):
+	'''
+	Receives timings and counters recorded by buses, labels are tuples of (name, value) pairs
+	'''
+
+	@abstractmethod
+	def observe(self, name: str, value: float, labels: tuple):
+		pass
+
+	@abstractmethod
+	def increment(self, name: str, labels: tuple, amount: int = 1):
+		pass
+
+
+class Histogram:
+
+	DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+	def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+		self.buckets = tuple(buckets)
+		self.bucket_counts = [0] * (len(self.buckets) + 1)
+		self.sum = 0.0
+		self.count = 0
+
+	def observe(self, value: float):
+		self.bucket_counts[bisect_left(self.buckets, value)] += 1
+		self.sum += value
+		self.count += 1
+
+	def cumulative_counts(self) -> list:
+		counts = []
+		total = 0
+		for bucket_count in self.bucket_counts:
+			total += bucket_count
+			counts.append(total)
+		return counts
+
+	def __repr__(self):
+		return "Count: {0} Sum: {1}".format(self.count, self.sum)
+
+
+class MetricsRegistry(MetricsSink):
+	'''
+	Keeps bus metrics in memory as histograms and counters, exported as Prometheus text
+	'''
+
+	def __init__(self, buckets: tuple = Histogram.DEFAULT_BUCKETS):
+		self.buckets = buckets
+		self.histograms = {}
+		self.counters = {}
+		self._lock = Lock()
+
+	def observe(self, name: str, value: float, labels: tuple):
+		with self._lock:
+			histogram = self.histograms.get((name, labels))
+			if histogram is None:
+				histogram = Histogram(self.buckets)
+				self.histograms[(name, labels)] = histogram
+			histogram.observe(value)
+
+	def increment(self, name: str, labels: tuple, amount: int = 1):
+		with self._lock:
+			self.counters[(name, labels)] = self.counters.get((name, labels), 0) + amount
+
+	def histogram(self, name: str, labels: tuple) -> Histogram:
+		return self.histograms.get((name, labels))
+
+	def counter(self, name: str, labels: tuple) -> int:
+		return self.counters.get((name, labels), 0)
+
+	def prometheus_text(self) -> str:
+		lines = []
+		with self._lock:
+			typed = set()
+			for (name, labels), histogram in sorted(self.histograms.items()):
+				if name not in typed:
+					lines.append("# TYPE {0} histogram".format(name))
+					typed.add(name)
+				for bound, count in zip(histogram.buckets + (float('inf'),), histogram.cumulative_counts()):
+					bucket_labels = labels + (('le', '+Inf' if bound == float('inf') else repr(bound)),)
+					lines.append("{0}_bucket{1} {2}".format(name, _format_labels(bucket_labels), count))
+				lines.append("{0}_sum{1} {2!r}".format(name, _format_labels(labels), histogram.sum))
+				lines.append("{0}_count{1} {2}".format(name, _format_labels(labels), histogram.count))
+
+			for (name, labels), value in sorted(self.counters.items()):
+				if name not in typed:
+					lines.append("# TYPE {0} counter".format(name))
+					typed.add(name)
+				lines.append("{0}{1} {2}".format(name, _format_labels(labels), value))
+		return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels: tuple) -> str:
+	if not labels:
+		return ''
+	return '{' + ','.join(
+		'{0}="{1}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+		for name, value in labels
+	) + '}'
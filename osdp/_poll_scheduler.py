@@ -0,0 +1,177 @@
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from threading import Lock
+
+from ._types import ReplyType
+
+
+class PollStatistics:
+	'''
+	Poll cycle timings achieved by a bus
+	'''
+
+	SMOOTHING_FACTOR = 0.1
+
+	def __init__(self):
+		self._lock = Lock()
+		self._last_cycle_start = None
+		self.cycle_count = 0
+		self.last_cycle_time = None
+		self.average_cycle_time = None
+		self.min_cycle_time = None
+		self.max_cycle_time = None
+
+	def cycle_started(self, now: datetime = None):
+		now = now or datetime.now()
+		with self._lock:
+			if self._last_cycle_start is not None:
+				self._record(now - self._last_cycle_start)
+			self._last_cycle_start = now
+
+	def _record(self, cycle_time: timedelta):
+		self.cycle_count += 1
+		self.last_cycle_time = cycle_time
+		if self.average_cycle_time is None:
+			self.average_cycle_time = cycle_time
+			self.min_cycle_time = cycle_time
+			self.max_cycle_time = cycle_time
+		else:
+			self.average_cycle_time += (cycle_time - self.average_cycle_time) * self.SMOOTHING_FACTOR
+			self.min_cycle_time = min(self.min_cycle_time, cycle_time)
+			self.max_cycle_time = max(self.max_cycle_time, cycle_time)
+
+	def __getstate__(self):
+		# Snapshots are sent between processes without the lock
+		state = self.__dict__.copy()
+		del state['_lock']
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self._lock = Lock()
+
+	def __repr__(self):
+		return "Cycles: {0} Last: {1} Average: {2} Min: {3} Max: {4}".format(
+			self.cycle_count,
+			self.last_cycle_time,
+			self.average_cycle_time,
+			self.min_cycle_time,
+			self.max_cycle_time
+		)
+
+
+class PollScheduler(ABC):
+	'''
+	Decides when a bus polls its devices
+	'''
+
+	@abstractmethod
+	def delay_before_cycle(self, last_message_sent_time: datetime) -> timedelta:
+		pass
+
+	def poll_order(self, devices: list) -> list:
+		return devices
+
+	@abstractmethod
+	def should_poll(self, device) -> bool:
+		pass
+
+	@abstractmethod
+	def delay_after_reply(self, device, reply, idle_line_delay: timedelta) -> timedelta:
+		pass
+
+
+class FixedPollScheduler(PollScheduler):
+	'''
+	Polls every device on every pass, at most once per poll interval, with an idle line delay after each reply
+	'''
+
+	def __init__(self, poll_interval: timedelta = timedelta(milliseconds=100)):
+		self.poll_interval = poll_interval
+
+	def delay_before_cycle(self, last_message_sent_time: datetime) -> timedelta:
+		time_difference = self.poll_interval - (datetime.now() - last_message_sent_time)
+		return max(time_difference, timedelta(seconds=0))
+
+	def should_poll(self, device) -> bool:
+		return True
+
+	def delay_after_reply(self, device, reply, idle_line_delay: timedelta) -> timedelta:
+		return idle_line_delay
+
+
+class AdaptivePollScheduler(PollScheduler):
+	'''
+	Polls again at once while devices have data, queued commands or a secure channel
+	handshake in progress, otherwise paces the bus to the target cycle time. Offline
+	devices back off exponentially and share a single rediscovery slot per pass, so
+	unplugged readers cost at most one timeout per cycle.
+	'''
+
+	QuietReplyTypes = (ReplyType.Ack, ReplyType.Nak, ReplyType.Busy)
+
+	def __init__(
+		self,
+		target_cycle_time: timedelta = timedelta(milliseconds=100),
+		offline_poll_interval: timedelta = timedelta(seconds=1),
+		prioritize_secure_channel_establishment: bool = True,
+		max_offline_poll_interval: timedelta = timedelta(seconds=30)
+	):
+		self.target_cycle_time = target_cycle_time
+		self.offline_poll_interval = offline_poll_interval
+		self.max_offline_poll_interval = max_offline_poll_interval
+		self.prioritize_secure_channel_establishment = prioritize_secure_channel_establishment
+		self._cycle_start = datetime.min
+		self._is_busy = False
+		self._is_rediscovery_slot_taken = False
+		self._offline_backoff = {}
+
+	def delay_before_cycle(self, last_message_sent_time: datetime) -> timedelta:
+		now = datetime.now()
+		if self._is_busy:
+			delay = timedelta(seconds=0)
+		else:
+			delay = max(self.target_cycle_time - (now - self._cycle_start), timedelta(seconds=0))
+		self._cycle_start = now + delay
+		self._is_busy = False
+		self._is_rediscovery_slot_taken = False
+		return delay
+
+	def poll_order(self, devices: list) -> list:
+		if not self.prioritize_secure_channel_establishment:
+			return devices
+		# Each pass takes every pending handshake one step further before polling established devices
+		return sorted(devices, key=lambda device: not device.is_establishing_secure_channel)
+
+	def should_poll(self, device) -> bool:
+		if device.is_online or device.has_pending_commands:
+			self._offline_backoff.pop(device.address, None)
+			return True
+
+		now = datetime.now()
+		backoff = self._offline_backoff.get(device.address)
+		if backoff is None:
+			# First poll since the device went offline, or since it was added
+			self._offline_backoff[device.address] = (now + self.offline_poll_interval, self.offline_poll_interval)
+			return True
+
+		next_poll, interval = backoff
+		if now < next_poll or self._is_rediscovery_slot_taken:
+			return False
+		self._is_rediscovery_slot_taken = True
+		interval = min(interval * 2, self.max_offline_poll_interval)
+		self._offline_backoff[device.address] = (now + interval, interval)
+		return True
+
+	def offline_poll_interval_for(self, device) -> timedelta:
+		backoff = self._offline_backoff.get(device.address)
+		return backoff[1] if backoff is not None else None
+
+	def delay_after_reply(self, device, reply, idle_line_delay: timedelta) -> timedelta:
+		if device.has_pending_commands or (reply is not None and reply.type not in self.QuietReplyTypes):
+			self._is_busy = True
+			return timedelta(seconds=0)
+		if self.prioritize_secure_channel_establishment and device.is_establishing_secure_channel:
+			self._is_busy = True
+			return timedelta(seconds=0)
+		return idle_line_delay
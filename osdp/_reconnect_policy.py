@@ -0,0 +1,36 @@
+import random
+from datetime import timedelta
+
+
+class ReconnectPolicy:
+	'''
+	How long a bus waits before opening its connection again, after opening it failed or the
+	connection was lost. The delay is multiplied with each failure up to the maximum, less a
+	random part of up to the jitter fraction so that buses of the same serial server do not
+	retry in step. Failures are counted until a device replies over the connection again.
+	Connection errors are logged at most once per log interval.
+	'''
+
+	def __init__(
+		self, initial_delay: timedelta = timedelta(milliseconds=500), maximum_delay: timedelta = timedelta(seconds=30),
+		multiplier: float = 2.0, jitter: float = 0.5, log_interval: timedelta = timedelta(seconds=60)
+	):
+		self.initial_delay = initial_delay
+		self.maximum_delay = maximum_delay
+		self.multiplier = multiplier
+		self.jitter = jitter
+		self.log_interval = log_interval
+
+	def delay_for(self, failures: int) -> timedelta:
+		if failures <= 0:
+			return timedelta(0)
+		delay = min(
+			self.initial_delay.total_seconds() * self.multiplier ** min(failures - 1, 64),
+			self.maximum_delay.total_seconds()
+		)
+		return timedelta(seconds=delay * (1.0 - self.jitter * random.random()))
+
+	def __repr__(self):
+		return "Initial delay: {0} Maximum delay: {1} Multiplier: {2} Jitter: {3} Log interval: {4}".format(
+			self.initial_delay, self.maximum_delay, self.multiplier, self.jitter, self.log_interval
+		)
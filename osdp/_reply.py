@@ -2,7 +2,10 @@ from abc import abstractmethod
 import logging
 from uuid import UUID
 
-from ._types import SecurityBlockType, ReplyType, Control
+from ._types import (
+	SecurityBlockType, ReplyType, Control, Nak, DeviceIdentification, DeviceCapabilities, LocalStatus, InputStatus,
+	OutputStatus, ReaderStatus, RawCardData, KeypadData
+)
 from ._message import Message
 from ._command import Command
 from ._device import Device
@@ -12,6 +15,12 @@ log = logging.getLogger('osdp')
 
 class Reply(Message):
 
+	__slots__ = (
+		'_sequence', '_security_block_type', '_secure_block_data', '_mac', '_type', '_reply_data',
+		'_extract_reply_data', '_decoded_data', '_is_using_crc', '_is_data_correct', '_message_for_mac_generation',
+		'_connection_id', '_issuing_command'
+	)
+
 	ADDRESS_MASK = 0x7F
 	REPLY_MESSAGE_HEADER_SIZE = 5
 	REPLY_TYPE_INDEX = 5
@@ -22,12 +31,26 @@ class Reply(Message):
 		SecurityBlockType.CommandMessageWithDataSecurity.value,
 		SecurityBlockType.ReplyMessageWithDataSecurity.value
 	]
+	DataParsers = {
+		ReplyType.Nak: Nak.parse_data,
+		ReplyType.PdIdReport: DeviceIdentification.parse_data,
+		ReplyType.PdCapabilitiesReport: DeviceCapabilities.parse_data,
+		ReplyType.LocalStatusReport: LocalStatus.parse_data,
+		ReplyType.InputStatusReport: InputStatus.parse_data,
+		ReplyType.OutputStatusReport: OutputStatus.parse_data,
+		ReplyType.ReaderStatusReport: ReaderStatus.parse_data,
+		ReplyType.RawReaderData: RawCardData.parse_data,
+		ReplyType.KeypadData: KeypadData.parse_data
+	}
 
 	def __init__(self, data: bytes, connection_id: UUID, issuing_command: Command, device: Device):
+		# Fields are kept as views over the received frame, bytes are only created when asked for
+		data = memoryview(data)
 		self._address = data[1] & self.ADDRESS_MASK
 		self._sequence = data[4] & 0x03
 
 		is_using_crc = (data[4] & 0x04) != 0
+		self._is_using_crc = is_using_crc
 		reply_message_footer_size = 2 if is_using_crc else 1
 
 		is_secure_control_block_present = (data[4] & 0x08) != 0
@@ -36,7 +59,7 @@ class Reply(Message):
 		if is_secure_control_block_present:
 			self._secure_block_data = data[(self.REPLY_MESSAGE_HEADER_SIZE + 2):][:(secure_block_size - 2)]
 		else:
-			self._secure_block_data = b''
+			self._secure_block_data = data[0:0]
 
 		mac_size = self.MAC_SIZE if self.is_secure_message else 0
 		message_length = len(data) - (reply_message_footer_size + mac_size)
@@ -46,10 +69,12 @@ class Reply(Message):
 
 		data_start = self.REPLY_MESSAGE_HEADER_SIZE + secure_block_size + 1
 		data_end = - reply_message_footer_size - mac_size
-		self._extract_reply_data = data[data_start:data_end]
+		self._reply_data = data[data_start:data_end]
+		self._extract_reply_data = None
+		self._decoded_data = None
 
 		if self.security_block_type == SecurityBlockType.ReplyMessageWithDataSecurity.value:
-			self._extract_reply_data = self.decrypt_data(device)
+			self._reply_data = memoryview(self.decrypt_data(device))
 
 		if is_using_crc:
 			self._is_data_correct = self.calculate_crc(data[:-2]) == int.from_bytes(data[-2:], byteorder='little')
@@ -61,17 +86,29 @@ class Reply(Message):
 		self._connection_id = connection_id
 		self._issuing_command = issuing_command
 
+	@property
+	def connection_id(self) -> UUID:
+		return self._connection_id
+
+	@property
+	def issuing_command(self) -> Command:
+		return self._issuing_command
+
 	@property
 	def security_block_type(self) -> int:
 		return self._security_block_type
 
 	@property
 	def secure_block_data(self) -> bytes:
-		return self._secure_block_data
+		return bytes(self._secure_block_data)
 
 	@property
 	def mac(self) -> bytes:
-		return self._mac
+		return bytes(self._mac)
+
+	@property
+	def is_using_crc(self) -> bool:
+		return self._is_using_crc
 
 	@property
 	def is_data_correct(self) -> bool:
@@ -91,10 +128,30 @@ class Reply(Message):
 
 	@property
 	def extract_reply_data(self) -> bytes:
+		if self._extract_reply_data is None:
+			self._extract_reply_data = bytes(self._reply_data)
 		return self._extract_reply_data
 
+	@property
+	def decoded_data(self):
+		'''
+		Typed view of the reply data, decoded on first access
+		'''
+		if self._decoded_data is None:
+			parse_data = self.DataParsers.get(self._type)
+			self._decoded_data = parse_data(self) if parse_data is not None else self.extract_reply_data
+		return self._decoded_data
+
+	@property
+	def reply_data_view(self) -> memoryview:
+		return self._reply_data
+
 	@property
 	def message_for_mac_generation(self) -> bytes:
+		return bytes(self._message_for_mac_generation)
+
+	@property
+	def message_for_mac_generation_view(self) -> memoryview:
 		return self._message_for_mac_generation
 
 	@property
@@ -115,16 +172,20 @@ class Reply(Message):
 		return reply
 
 	def secure_cryptogram_has_been_accepted(self) -> bool:
-		log.debug("Secure block data: %s", self.secure_block_data[0])
-		return self.secure_block_data[0] != 0
+		log.debug("Secure block data: %s", self._secure_block_data[0])
+		return self._secure_block_data[0] != 0
 
 	def match_issuing_command(self, command: Command) -> bool:
 		return command == self._issuing_command
 
 	def is_valid_mac(self, mac: bytes) -> bool:
-		return mac[:self.MAC_SIZE] == self.mac
+		return mac[:self.MAC_SIZE] == self._mac
 
-	def build_reply(self, address: int, control: Control) -> bytes:
+	def build_reply(self, address: int, control: Control, secure_channel=None) -> bytes:
+		'''
+		Frame of the reply as sent by a PD, data is encrypted and a MAC added when
+		the given secure channel is established
+		'''
 		command_buffer = bytearray([
 			self.SOM,
 			(self.address | 0x80),
@@ -137,7 +198,16 @@ class Reply(Message):
 			command_buffer.extend(self.security_control_block())
 
 		command_buffer.append(self.reply_code)
-		command_buffer.extend(self.data())
+
+		if secure_channel is not None and secure_channel.is_established:
+			command_buffer.extend(self.encrypted_data(secure_channel))
+
+			additional_length = 4 + (2 if control.use_crc else 1)
+			self.add_packet_length(command_buffer, additional_length)
+
+			command_buffer.extend(secure_channel.generate_mac(bytes(command_buffer), False)[0:4])
+		else:
+			command_buffer.extend(self.data())
 
 		command_buffer.append(0x00)
 		if control.use_crc:
@@ -159,12 +229,14 @@ class Reply(Message):
 		return "Connection ID: {0} Address: {1} Type: {2}".format(self._connection_id, self.address, self.type)
 
 	def decrypt_data(self, device: Device) -> bytes:
-		log.debug("Extract reply data: %s", self.extract_reply_data.hex())
-		return device.decrypt_data(self.extract_reply_data)
+		log.debug("Extract reply data: %s", self._reply_data.hex())
+		return device.decrypt_data(self._reply_data)
 
 
 class AckReply(Reply):
 
+	__slots__ = ()
+
 	@property
 	def reply_code(self) -> int:
 		return 0x40
@@ -178,6 +250,8 @@ class AckReply(Reply):
 
 class UnknownReply(Reply):
 
+	__slots__ = ()
+
 	def __init__(self, data: bytes, connection_id: UUID, issuing_command: Command, device: Device):
 		super().__init__(data, connection_id, issuing_command, device)
 
@@ -3,6 +3,10 @@ from Crypto import Random
 from Crypto.Cipher import AES
 
 
+def xor_bytes(first: bytes, second: bytes) -> bytes:
+	return (int.from_bytes(first, 'big') ^ int.from_bytes(second, 'big')).to_bytes(len(first), 'big')
+
+
 class SecureChannel:
 
 	default_secure_channel_key = bytes([
@@ -17,6 +21,11 @@ class SecureChannel:
 		self._smac1 = None
 		self._smac2 = None
 
+		# Key schedules are expanded once per session, CBC chaining is done on top of ECB
+		self._enc_cipher = None
+		self._smac1_cipher = None
+		self._smac2_cipher = None
+
 		self.server_random_number = None
 		self.server_cryptogram = None
 		self.is_initialized = False
@@ -43,7 +52,9 @@ class SecureChannel:
 			self.scbk
 		)
 
-		if client_cryptogram != self.generate_key(self.server_random_number, client_random_number, self._enc):
+		self._enc_cipher = AES.new(self._enc, AES.MODE_ECB)
+
+		if client_cryptogram != self._enc_cipher.encrypt(bytes(self.server_random_number) + client_random_number):
 			raise Exception("Invalid client cryptogram")
 
 		self._smac1 = self.generate_key(
@@ -65,11 +76,9 @@ class SecureChannel:
 			bytes([0x00] * 8),
 			self.scbk
 		)
-		self.server_cryptogram = self.generate_key(
-			client_random_number,
-			self.server_random_number,
-			self._enc
-		)
+		self._smac1_cipher = AES.new(self._smac1, AES.MODE_ECB)
+		self._smac2_cipher = AES.new(self._smac2, AES.MODE_ECB)
+		self.server_cryptogram = self._enc_cipher.encrypt(bytes(client_random_number) + self.server_random_number)
 		self.is_initialized = True
 
 	def establish(self, rmac: bytes):
@@ -81,25 +90,20 @@ class SecureChannel:
 		padding_start = 0x80
 
 		mac = b'\x00' * crypto_length
-		current_location = 0
-		key = self._smac1
-		iv = self._rmac if is_command else self._cmac
-
-		while current_location < len(message):
-			input_buffer = bytearray(message[current_location:(current_location + crypto_length)])
-			if len(input_buffer) < crypto_length:
-				input_buffer.extend(b'\x00' * (crypto_length - len(input_buffer)))
-
-			current_location += crypto_length
-			if current_location > len(message):
-				key = self._smac2
-				if len(message) % crypto_length != 0:
-					input_buffer[len(message) % crypto_length] = padding_start
-
-			cipher = AES.new(key, AES.MODE_CBC, iv)
-			mac = cipher.encrypt(bytes(input_buffer))
+		iv = (self._rmac if is_command else self._cmac) or mac
+
+		# Full blocks are chained with S-MAC1, a trailing partial block is padded and uses S-MAC2
+		full_length = len(message) - len(message) % crypto_length
+		for current_location in range(0, full_length, crypto_length):
+			mac = self._smac1_cipher.encrypt(xor_bytes(message[current_location:(current_location + crypto_length)], iv))
 			iv = mac
 
+		if full_length < len(message):
+			input_buffer = bytearray(message[full_length:])
+			input_buffer.append(padding_start)
+			input_buffer.extend(b'\x00' * (crypto_length - len(input_buffer)))
+			mac = self._smac2_cipher.encrypt(xor_bytes(input_buffer, iv))
+
 		if is_command:
 			self._cmac = mac
 		else:
@@ -107,12 +111,13 @@ class SecureChannel:
 		return mac
 
 	def decrypt_data(self, data: bytes) -> bytes:
+		crypto_length = 16
 		padding_start = 0x80
 
-		key = self._enc
+		# CBC decryption of every block only depends on the ciphertext, so it is done in one pass
 		iv = bytes([(~b) & 0xFF for b in self._cmac])
-		cipher = AES.new(key, AES.MODE_CBC, iv)
-		padded_data = cipher.decrypt(data)
+		chained = (iv + data)[:len(data)]
+		padded_data = xor_bytes(self._enc_cipher.decrypt(data), chained) if len(data) >= crypto_length else b''
 		decrypted_data = bytearray(padded_data)
 		while len(decrypted_data) > 0 and decrypted_data[-1] != padding_start:
 			decrypted_data.pop()
@@ -128,10 +133,12 @@ class SecureChannel:
 		while len(padded_data) % crypto_length != 0:
 			padded_data.append(0x00)
 
-		key = self._enc
-		iv = bytes([(~b) & 0xFF for b in self._rmac])
-		cipher = AES.new(key, AES.MODE_CBC, iv)
-		return cipher.encrypt(padded_data)
+		encrypted_data = bytearray()
+		block = bytes([(~b) & 0xFF for b in self._rmac])
+		for current_location in range(0, len(padded_data), crypto_length):
+			block = self._enc_cipher.encrypt(xor_bytes(padded_data[current_location:(current_location + crypto_length)], block))
+			encrypted_data.extend(block)
+		return bytes(encrypted_data)
 
 	def reset(self):
 		self.server_random_number = Random.new().read(8)
@@ -0,0 +1,383 @@
+import logging
+import multiprocessing
+import os
+from enum import IntEnum
+from datetime import timedelta
+from itertools import count
+from threading import Thread, Lock
+from uuid import UUID
+
+from ._types import DataEvent, CommandPriority
+from ._connection import OsdpConnection
+from ._command import Command
+from ._message import Message
+from ._reply import Reply
+from ._device import CommandQueueStatistics
+from ._poll_scheduler import PollScheduler, PollStatistics
+from ._timeout_policy import ReplyTimeoutPolicy
+from ._reconnect_policy import ReconnectPolicy
+from ._discovery import AddressScan
+from ._control_panel import ControlPanel
+
+log = logging.getLogger('osdp')
+
+
+class _Op(IntEnum):
+	StartConnection = 0
+	AddDevice = 1
+	RemoveDevice = 2
+	SendCommand = 3
+	Query = 4
+	Shutdown = 5
+	Result = 6
+	Reply = 7
+	DeviceStatus = 8
+	Discover = 9
+	ConnectionStatus = 10
+	Cancel = 11
+	CancelScan = 12
+
+
+class _Shard:
+
+	def __init__(self, context, master_key: bytes):
+		self.pipe, worker_pipe = context.Pipe()
+		self.process = context.Process(target=_run_shard, args=(worker_pipe, master_key), daemon=True)
+		self.process.start()
+		worker_pipe.close()
+		self.connection_count = 0
+		self._lock = Lock()
+
+	def send(self, *message):
+		with self._lock:
+			self.pipe.send(message)
+
+
+class ShardedControlPanel(ControlPanel):
+	'''
+	Control panel spreading its buses over a pool of worker processes, so that the
+	polling, CRC, MAC and reply parsing of each bus do not compete for one interpreter lock.
+	Connections are sent to the worker that runs them and must be picklable, or a
+	callable creating the connection inside the worker.
+	'''
+
+	def __init__(self, master_key: bytes = None, processes: int = None, mp_context=None):
+		super().__init__(master_key)
+		context = mp_context or multiprocessing.get_context()
+		self._tokens = count()
+		self._issued = {}
+		self._issued_tokens = {}
+		self._issued_lock = Lock()
+		self._calls = {}
+		self._shard_of = {}
+		self._shards = [_Shard(context, master_key) for _ in range(processes or os.cpu_count() or 1)]
+		# Threads are only started once every worker has been created
+		for shard in self._shards:
+			Thread(target=self._receive_events, args=(shard,), daemon=True).start()
+
+	def start_connection(
+		self, connection: OsdpConnection, poll_scheduler: PollScheduler = None, reconnect_policy: ReconnectPolicy = None
+	) -> UUID:
+		shard = min(self._shards, key=lambda shard: shard.connection_count)
+		connection_id = self._call(shard, _Op.StartConnection, connection, poll_scheduler, reconnect_policy)
+		shard.connection_count += 1
+		self._shard_of[connection_id] = shard
+		return connection_id
+
+	def is_online(self, connection_id: UUID, address: int) -> bool:
+		return self._query(connection_id, False, 'is_online', address)
+
+	def is_connected(self, connection_id: UUID) -> bool:
+		return self._query(connection_id, False, 'is_connected')
+
+	def command_queue_depth(self, connection_id: UUID, address: int) -> int:
+		return self._query(connection_id, 0, 'command_queue_depth', address)
+
+	def command_queue_statistics(self, connection_id: UUID, address: int) -> CommandQueueStatistics:
+		return self._query(connection_id, None, 'command_queue_statistics', address)
+
+	def secure_channel_establishment_times(self, connection_id: UUID) -> dict:
+		return self._query(connection_id, {}, 'secure_channel_establishment_times')
+
+	def poll_statistics(self, connection_id: UUID) -> PollStatistics:
+		return self._query(connection_id, None, 'poll_statistics')
+
+	def issued_command_count(self, connection_id: UUID) -> int:
+		'''
+		Number of commands sent on the connection that are still waiting for a reply,
+		counted both in the control panel and in the worker running the bus
+		'''
+		with self._issued_lock:
+			issued_count = sum(1 for key in self._issued_tokens if key[0] == connection_id)
+		return issued_count + self._query(connection_id, 0, 'issued_command_count')
+
+	def discover_devices(
+		self, connection_id: UUID, addresses=range(0x7F), reply_timeout: timedelta = timedelta(milliseconds=50),
+		timeout: float = 30.0
+	) -> list:
+		shard = self._shard_of[connection_id]
+		try:
+			return self._call_with_timeout(shard, timeout, _Op.Discover, connection_id, list(addresses), reply_timeout)
+		except TimeoutError:
+			# Sent before any later scan of the connection, so only this one is stopped
+			shard.send(_Op.CancelScan, connection_id)
+			raise
+
+	def add_device(
+		self, connection_id: UUID, address: int, use_crc: bool, use_secure_channel: bool,
+		coalesce_commands: bool = False, timeout_policy: ReplyTimeoutPolicy = None
+	):
+		shard = self._shard_of.get(connection_id)
+		if shard is not None:
+			shard.send(
+				_Op.AddDevice, connection_id, address, use_crc, use_secure_channel, coalesce_commands, timeout_policy
+			)
+
+	def remove_device(self, connection_id: UUID, address: int):
+		shard = self._shard_of.get(connection_id)
+		if shard is not None:
+			shard.send(_Op.RemoveDevice, connection_id, address)
+
+	def shutdown(self):
+		for shard in self._shards:
+			try:
+				shard.send(_Op.Shutdown)
+			except OSError:
+				pass
+		for shard in self._shards:
+			shard.process.join(self._reply_timeout)
+			if shard.process.is_alive():
+				shard.process.terminate()
+			shard.pipe.close()
+		self._close_event_streams()
+
+	def _queue_command(self, connection_id: UUID, command: Command, priority: CommandPriority = None):
+		shard = self._shard_of[connection_id]
+		token = next(self._tokens)
+		with self._issued_lock:
+			self._issued[token] = command
+			self._issued_tokens[self._pending_reply_key(connection_id, command)] = token
+		shard.send(_Op.SendCommand, token, connection_id, command, priority)
+
+	def _remove_pending_reply(self, key):
+		super()._remove_pending_reply(key)
+		with self._issued_lock:
+			token = self._issued_tokens.pop(key, None)
+			is_unanswered = self._issued.pop(token, None) is not None
+		shard = self._shard_of.get(key[0])
+		if is_unanswered and shard is not None:
+			# Timed out or never answered, the worker forgets the command too
+			try:
+				shard.send(_Op.Cancel, token)
+			except OSError:
+				pass
+
+	def _query(self, connection_id: UUID, default, name: str, *args):
+		shard = self._shard_of.get(connection_id)
+		if shard is None:
+			return default
+		return self._call(shard, _Op.Query, name, connection_id, *args)
+
+	def _call(self, shard: _Shard, op: _Op, *args):
+		return self._call_with_timeout(shard, self._reply_timeout, op, *args)
+
+	def _call_with_timeout(self, shard: _Shard, timeout: float, op: _Op, *args):
+		token = next(self._tokens)
+		event = DataEvent()
+		self._calls[token] = event
+		try:
+			shard.send(op, token, *args)
+			result = event.wait_data(timeout)
+		finally:
+			self._calls.pop(token, None)
+		if not event.is_set():
+			raise TimeoutError()
+
+		value, error = result
+		if error is not None:
+			raise error
+		return value
+
+	def _receive_events(self, shard: _Shard):
+		while True:
+			try:
+				message = shard.pipe.recv()
+			except (EOFError, OSError):
+				break
+
+			try:
+				if message[0] == _Op.Result:
+					event = self._calls.get(message[1])
+					if event is not None:
+						event.set_data(message[2:])
+				elif message[0] == _Op.Reply:
+					self._on_shard_reply(*message[1:])
+				elif message[0] == _Op.DeviceStatus:
+					self._device_status_changed(*message[1:])
+				elif message[0] == _Op.ConnectionStatus:
+					self._connection_status_changed(*message[1:])
+			except:
+				log.exception("Error while processing event %s from worker", message[0])
+
+	def _on_shard_reply(self, connection_id: UUID, tokens: tuple, frame: bytes, command: Command):
+		with self._issued_lock:
+			issued_commands = [self._issued.pop(token) for token in tokens if token in self._issued]
+		if issued_commands:
+			command = issued_commands[0]
+
+		reply = Reply.parse(frame, connection_id, command, None)
+		self._complete_pending_replies(reply, issued_commands)
+		self._dispatch_reply(reply)
+
+
+class _ShardWorker(ControlPanel):
+	'''
+	Runs the buses of one worker process, forwarding replies to the sharded control panel
+	'''
+
+	Queries = (
+		'is_online', 'is_connected', 'issued_command_count', 'command_queue_depth', 'command_queue_statistics',
+		'secure_channel_establishment_times', 'poll_statistics'
+	)
+
+	def __init__(self, pipe, master_key: bytes):
+		super().__init__(master_key)
+		self._pipe = pipe
+		self._pipe_lock = Lock()
+		self._is_pipe_closed = False
+		self._tokens = {}
+		self._commands = {}
+		self._tokens_lock = Lock()
+
+	def serve(self):
+		try:
+			while True:
+				try:
+					message = self._pipe.recv()
+				except EOFError:
+					break
+				if message[0] == _Op.Shutdown:
+					break
+
+				try:
+					self._handle(message)
+				except:
+					log.exception("Error while handling request %s", message[0])
+		finally:
+			self.shutdown()
+			# Polling threads report status changes over the pipe until they have stopped
+			for thread in self._polling_threads:
+				thread.join(self._reply_timeout)
+			with self._pipe_lock:
+				self._is_pipe_closed = True
+				self._pipe.close()
+
+	def _handle(self, message: tuple):
+		op = message[0]
+		if op == _Op.SendCommand:
+			_, token, connection_id, command, priority = message
+			with self._tokens_lock:
+				self._tokens[command] = token
+				self._commands[token] = command
+			try:
+				self._queue_command(connection_id, command, priority)
+			except KeyError:
+				self._cancel(token)
+				log.warning("Connection not found with ID %s", connection_id)
+
+		elif op == _Op.Cancel:
+			self._cancel(message[1])
+
+		elif op == _Op.StartConnection:
+			_, token, connection, poll_scheduler, reconnect_policy = message
+			self._respond(token, self._start_connection, connection, poll_scheduler, reconnect_policy)
+
+		elif op == _Op.Query:
+			_, token, name, *args = message
+			if name not in self.Queries:
+				raise ValueError(name)
+			self._respond(token, getattr(self, name), *args)
+
+		elif op == _Op.Discover:
+			_, token, connection_id, addresses, reply_timeout = message
+			scan = AddressScan(
+				addresses, reply_timeout, on_complete=lambda scan: self._send(_Op.Result, token, scan.discovered, None)
+			)
+			try:
+				self._buses[connection_id].start_scan(scan)
+			except Exception as error:
+				self._send(_Op.Result, token, None, error)
+
+		elif op == _Op.CancelScan:
+			bus = self._buses.get(message[1])
+			if bus is not None:
+				bus.cancel_scan()
+
+		elif op == _Op.AddDevice:
+			self.add_device(*message[1:])
+
+		elif op == _Op.RemoveDevice:
+			self.remove_device(*message[1:])
+
+	def _cancel(self, token: int):
+		with self._tokens_lock:
+			command = self._commands.pop(token, None)
+			if command is not None:
+				self._tokens.pop(command, None)
+
+	def issued_command_count(self, connection_id: UUID) -> int:
+		with self._tokens_lock:
+			return len(self._tokens)
+
+	def _start_connection(self, connection, poll_scheduler: PollScheduler, reconnect_policy: ReconnectPolicy) -> UUID:
+		if not isinstance(connection, OsdpConnection):
+			connection = connection()
+		return self.start_connection(connection, poll_scheduler, reconnect_policy)
+
+	def _respond(self, token: int, method, *args):
+		try:
+			value, error = method(*args), None
+		except Exception as exception:
+			value, error = None, exception
+		self._send(_Op.Result, token, value, error)
+
+	def _send(self, *message):
+		with self._pipe_lock:
+			if self._is_pipe_closed:
+				log.debug("Dropping message %s sent after the worker stopped", message[0])
+				return
+			try:
+				self._pipe.send(message)
+			except OSError:
+				# The panel went away, nothing is left to report to
+				log.debug("Unable to send message %s to the control panel", message[0])
+
+	def _device_status_changed(self, connection_id: UUID, address: int, is_online: bool):
+		self._send(_Op.DeviceStatus, connection_id, address, is_online)
+
+	def _connection_status_changed(self, connection_id: UUID, is_connected: bool):
+		self._send(_Op.ConnectionStatus, connection_id, is_connected)
+
+	def on_reply_received(self, reply: Reply):
+		command = reply.issuing_command
+		with self._tokens_lock:
+			tokens = tuple(
+				self._tokens.pop(issued_command) for issued_command in (command,) + command.coalesced_commands
+				if issued_command in self._tokens
+			)
+			for token in tokens:
+				self._commands.pop(token, None)
+		if not tokens and reply.type not in self.EventReplyTypes:
+			return
+
+		# Replies cross the pipe as a plain frame, already checked and decrypted
+		frame = bytearray([Message.SOM, reply.address | 0x80, 0x00, 0x00, reply.sequence, reply.type.value])
+		frame.extend(reply.reply_data_view)
+		frame.append(0x00)
+		reply.add_packet_length(frame)
+		reply.add_checksum(frame)
+		self._send(_Op.Reply, reply.connection_id, tokens, bytes(frame), None if tokens else command)
+
+
+def _run_shard(pipe, master_key: bytes):
+	_ShardWorker(pipe, master_key).serve()
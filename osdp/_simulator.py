@@ -0,0 +1,533 @@
+import logging
+import os
+import random
+import socket
+import time
+from collections import deque
+from threading import Thread, Lock
+
+from Crypto import Random
+
+from ._types import (
+	ReplyType, SecurityBlockType, Control, ErrorCode, DeviceIdentification, CapabilityFunction, DeviceCapability,
+	DeviceCapabilities, InputStatus, OutputStatus, LocalStatus, ReaderTamperStatus, ReaderStatus, OutputControlCode,
+	FormatCode, RawCardData, KeypadData
+)
+from ._connection import OsdpConnection
+from ._message import Message
+from ._reply import Reply
+from ._secure_channel import SecureChannel
+from ._frame_reader import FrameReader
+
+log = logging.getLogger('osdp')
+
+
+class _PeripheralSecureChannel(SecureChannel):
+	'''
+	The PD side of a secure channel, MACs are chained the same way on both sides
+	but each side encrypts with the IV derived from the other side's last MAC
+	'''
+
+	def __init__(self, scbk: bytes = None):
+		super().__init__(None)
+		self.installed_key = scbk
+
+	def challenge(self, cuid: bytes, server_random_number: bytes, client_random_number: bytes) -> bytes:
+		self.server_random_number = server_random_number
+		self.cuid = cuid
+		self.select_scbk(0x01 if self.installed_key is not None else 0x00)
+		scbk = self.default_secure_channel_key if self.is_scbkd else self.installed_key
+		enc = self.generate_key(bytes([0x01, 0x82]) + server_random_number[:6], bytes([0x00] * 8), scbk)
+		client_cryptogram = self.generate_key(server_random_number, client_random_number, enc)
+		self.initialize(cuid, client_random_number, client_cryptogram)
+		return client_cryptogram
+
+	def initial_rmac(self) -> bytes:
+		return self._smac2_cipher.encrypt(self._smac1_cipher.encrypt(self.server_cryptogram))
+
+	def calculate_scbk(self):
+		return self.installed_key
+
+	def encrypt_data(self, data: bytes) -> bytes:
+		self._cmac, self._rmac = self._rmac, self._cmac
+		try:
+			return super().encrypt_data(data)
+		finally:
+			self._cmac, self._rmac = self._rmac, self._cmac
+
+	def decrypt_data(self, data: bytes) -> bytes:
+		self._cmac, self._rmac = self._rmac, self._cmac
+		try:
+			return super().decrypt_data(data)
+		finally:
+			self._cmac, self._rmac = self._rmac, self._cmac
+
+
+class _ReceivedCommand(Message):
+	'''
+	A command frame as received by a PD
+	'''
+
+	__slots__ = (
+		'control', 'security_block_type', 'secure_block_data', 'code', 'mac', 'message_for_mac_generation',
+		'is_data_correct', '_data'
+	)
+
+	SecureSessionMessages = (
+		SecurityBlockType.CommandMessageWithNoDataSecurity.value,
+		SecurityBlockType.CommandMessageWithDataSecurity.value
+	)
+
+	def __init__(self, frame: bytes, is_security_established: bool):
+		self._address = frame[1] & 0x7F
+		use_crc = (frame[4] & 0x04) != 0
+		has_security_control_block = (frame[4] & 0x08) != 0
+		self.control = Control(frame[4] & 0x03, use_crc, has_security_control_block)
+
+		footer_size = 2 if use_crc else 1
+		secure_block_size = frame[5] if has_security_control_block else 0
+		self.security_block_type = frame[6] if has_security_control_block else 0
+		self.secure_block_data = frame[7:(5 + secure_block_size)]
+		self.code = frame[5 + secure_block_size]
+
+		is_secure_message = is_security_established and self.security_block_type in self.SecureSessionMessages
+		message_length = len(frame) - footer_size - (4 if is_secure_message else 0)
+		self.mac = frame[message_length:(len(frame) - footer_size)]
+		self.message_for_mac_generation = frame[:message_length]
+		self._data = frame[(6 + secure_block_size):message_length]
+
+		if use_crc:
+			self.is_data_correct = self.calculate_crc(frame[:-2]) == int.from_bytes(frame[-2:], byteorder='little')
+		else:
+			self.is_data_correct = self.calculate_checksum(frame[:-1]) == frame[-1]
+
+	@property
+	def is_secure_message(self) -> bool:
+		return len(self.mac) > 0
+
+	def data(self) -> bytes:
+		return self._data
+
+
+class _SimulatedReply(Reply):
+	'''
+	A reply built from its fields instead of parsed from a frame
+	'''
+
+	__slots__ = ()
+
+	def __init__(
+		self, address: int, reply_type: ReplyType, data: bytes = b'', security_block_type: int = None,
+		secure_block_data: bytes = b''
+	):
+		self._address = address
+		self._sequence = 0
+		self._type = reply_type
+		self._reply_data = memoryview(data)
+		self._extract_reply_data = None
+		self._decoded_data = None
+		self._security_block_type = security_block_type
+		self._secure_block_data = secure_block_data
+		self._mac = b''
+		self._is_data_correct = True
+		self._message_for_mac_generation = b''
+		self._connection_id = None
+		self._issuing_command = None
+
+	@property
+	def reply_code(self) -> int:
+		return self._type.value
+
+	@property
+	def has_security_control_block(self) -> bool:
+		return self._security_block_type is not None
+
+	def security_control_block(self) -> bytes:
+		return bytes([len(self._secure_block_data) + 2, self._security_block_type]) + self._secure_block_data
+
+	def data(self) -> bytes:
+		return bytes(self._reply_data)
+
+
+class SimulatedDevice:
+	'''
+	A PD answering commands in process, for testing and load testing control panels
+	without hardware. Card reads and key presses are generated at the given rates
+	and reported in reply to polls. A device without CRC support NAKs CRC commands.
+	'''
+
+	CommandHandlers = {
+		0x60: 'on_poll',
+		0x61: 'on_id_report',
+		0x62: 'on_device_capabilities',
+		0x64: 'on_local_status_report',
+		0x65: 'on_input_status_report',
+		0x66: 'on_output_status_report',
+		0x67: 'on_reader_status_report',
+		0x68: 'on_output_control',
+		0x69: 'on_reader_led_control',
+		0x6A: 'on_acknowledged_command',
+		0x6B: 'on_acknowledged_command',
+		0x6D: 'on_acknowledged_command',
+		0x75: 'on_key_set',
+		0x76: 'on_security_initialization_request',
+		0x77: 'on_server_cryptogram',
+		0x80: 'on_acknowledged_command'
+	}
+
+	OutputsOn = (
+		OutputControlCode.PermanentStateOnAbortTimedOperation,
+		OutputControlCode.PermanentStateOnAllowTimedOperation,
+		OutputControlCode.TemporaryStateOnResumePermanentState
+	)
+
+	def __init__(
+		self, address: int, identification: DeviceIdentification = None, capabilities: DeviceCapabilities = None,
+		input_count: int = 4, output_count: int = 4, reader_count: int = 1, scbk: bytes = None,
+		card_reads_per_second: float = 0.0, key_presses_per_second: float = 0.0, supports_crc: bool = True
+	):
+		self.address = address
+		self.supports_crc = supports_crc
+		self.identification = identification or DeviceIdentification(
+			bytes([0x5C, 0x26, 0x23]), 0x01, 0x01, address, 0x01, 0x00, 0x00
+		)
+		self.capabilities = capabilities or DeviceCapabilities([
+			DeviceCapability(CapabilityFunction.ContactStatusMonitoring, 0x01, input_count),
+			DeviceCapability(CapabilityFunction.OutputControl, 0x01, output_count),
+			DeviceCapability(CapabilityFunction.CardDataFormat, 0x01, 0x00),
+			DeviceCapability(CapabilityFunction.ReaderLEDControl, 0x01, reader_count),
+			DeviceCapability(CapabilityFunction.CheckCharacterSupport, 0x01 if supports_crc else 0x00, 0x00),
+			DeviceCapability(CapabilityFunction.CommunicationSecurity, 0x01, 0x01),
+			DeviceCapability(CapabilityFunction.Readers, 0x00, reader_count)
+		])
+		self.local_status = LocalStatus(False, False)
+		self.inputs = [False] * input_count
+		self.outputs = [False] * output_count
+		self.readers = [ReaderTamperStatus.Normal] * reader_count
+		self.reader_led_control_data = None
+		self.card_reads_per_second = card_reads_per_second
+		self.key_presses_per_second = key_presses_per_second
+		self.command_count = 0
+
+		self._secure_channel = _PeripheralSecureChannel(scbk)
+		self._input = deque()
+		self._next_card_read = None
+		self._next_key_press = None
+		self._last_sequence = None
+		self._last_reply = None
+
+	@property
+	def is_security_established(self) -> bool:
+		return self._secure_channel.is_established
+
+	@property
+	def scbk(self) -> bytes:
+		return self._secure_channel.installed_key
+
+	def present_card(self, data: bytes, bit_count: int, reader_number: int = 0):
+		self._input.append((ReplyType.RawReaderData, RawCardData(reader_number, FormatCode.NotSpecified, bit_count, data)))
+
+	def press_keys(self, keys: str, reader_number: int = 0):
+		data = keys.encode('ascii')
+		self._input.append((ReplyType.KeypadData, KeypadData(reader_number, len(data), data)))
+
+	def handle_frame(self, frame: bytes) -> bytes:
+		command = _ReceivedCommand(frame, self.is_security_established)
+		if command.address != self.address:
+			return None
+		self.command_count += 1
+
+		sequence = command.control.sequence
+		if sequence == 0:
+			self._secure_channel.reset()
+		elif sequence == self._last_sequence and self._last_reply is not None and command.is_data_correct:
+			# The ACU did not get the last reply, it is sent again unchanged
+			return self._last_reply
+
+		reply = self.reply_to(command)
+		if self.is_security_established and not reply.has_security_control_block:
+			reply = _SimulatedReply(
+				reply.address, reply.type, reply.data(),
+				SecurityBlockType.ReplyMessageWithDataSecurity.value if reply.data() else
+				SecurityBlockType.ReplyMessageWithNoDataSecurity.value
+			)
+
+		control = Control(sequence, command.control.use_crc and self.supports_crc, reply.has_security_control_block)
+		secure_channel = self._secure_channel if reply.security_block_type in Reply.SecureSessionMessages else None
+		self._last_sequence = sequence
+		self._last_reply = reply.build_reply(self.address, control, secure_channel)
+		return self._last_reply
+
+	def reply_to(self, command: _ReceivedCommand) -> _SimulatedReply:
+		if not command.is_data_correct or (command.control.use_crc and not self.supports_crc):
+			return self.nak(ErrorCode.BadChecksumOrCrc)
+
+		data = command.data()
+		if command.is_secure_message:
+			if self._secure_channel.generate_mac(command.message_for_mac_generation, True)[0:4] != command.mac:
+				self._secure_channel.reset()
+				return self.nak(ErrorCode.CommunicationSecurityNotMet)
+			if command.security_block_type == SecurityBlockType.CommandMessageWithDataSecurity.value and data:
+				data = self._secure_channel.decrypt_data(data)
+
+		handler = self.CommandHandlers.get(command.code)
+		if handler is None:
+			return self.nak(ErrorCode.UnknownCommandCode)
+		try:
+			return getattr(self, handler)(command, data)
+		except (IndexError, ValueError):
+			return self.nak(ErrorCode.InvalidCommandLength)
+
+	def reply(self, reply_type: ReplyType, data: bytes = b'', security_block_type=None, secure_block_data=b''):
+		return _SimulatedReply(self.address, reply_type, data, security_block_type, secure_block_data)
+
+	def nak(self, error_code: ErrorCode) -> _SimulatedReply:
+		return self.reply(ReplyType.Nak, bytes([error_code.value]))
+
+	def on_poll(self, command: _ReceivedCommand, data: bytes) -> _SimulatedReply:
+		self.generate_input(time.monotonic())
+		if not self._input:
+			return self.reply(ReplyType.Ack)
+		reply_type, input_data = self._input.popleft()
+		return self.reply(reply_type, input_data.build_data())
+
+	def generate_input(self, now: float):
+		if self.card_reads_per_second > 0:
+			if self._next_card_read is None:
+				self._next_card_read = now
+			if now >= self._next_card_read:
+				self._next_card_read = now + 1 / self.card_reads_per_second
+				self.present_card((random.getrandbits(26) << 6).to_bytes(4, byteorder='big'), 26)
+		if self.key_presses_per_second > 0:
+			if self._next_key_press is None:
+				self._next_key_press = now
+			if now >= self._next_key_press:
+				self._next_key_press = now + 1 / self.key_presses_per_second
+				self.press_keys(random.choice('0123456789*#'))
+
+	def on_id_report(self, command: _ReceivedCommand, data: bytes) -> _SimulatedReply:
+		return self.reply(ReplyType.PdIdReport, self.identification.build_data())
+
+	def on_device_capabilities(self, command: _ReceivedCommand, data: bytes) -> _SimulatedReply:
+		return self.reply(ReplyType.PdCapabilitiesReport, self.capabilities.build_data())
+
+	def on_local_status_report(self, command: _ReceivedCommand, data: bytes) -> _SimulatedReply:
+		return self.reply(ReplyType.LocalStatusReport, self.local_status.build_data())
+
+	def on_input_status_report(self, command: _ReceivedCommand, data: bytes) -> _SimulatedReply:
+		return self.reply(ReplyType.InputStatusReport, InputStatus(self.inputs).build_data())
+
+	def on_output_status_report(self, command: _ReceivedCommand, data: bytes) -> _SimulatedReply:
+		return self.reply(ReplyType.OutputStatusReport, OutputStatus(self.outputs).build_data())
+
+	def on_reader_status_report(self, command: _ReceivedCommand, data: bytes) -> _SimulatedReply:
+		return self.reply(ReplyType.ReaderStatusReport, ReaderStatus(self.readers).build_data())
+
+	def on_output_control(self, command: _ReceivedCommand, data: bytes) -> _SimulatedReply:
+		if len(data) == 0 or len(data) % 4 != 0:
+			return self.nak(ErrorCode.InvalidCommandLength)
+		for i in range(0, len(data), 4):
+			output_control_code = OutputControlCode(data[i + 1])
+			if output_control_code != OutputControlCode.Nop:
+				self.outputs[data[i]] = output_control_code in self.OutputsOn
+		return self.on_output_status_report(command, data)
+
+	def on_reader_led_control(self, command: _ReceivedCommand, data: bytes) -> _SimulatedReply:
+		self.reader_led_control_data = bytes(data)
+		return self.reply(ReplyType.Ack)
+
+	def on_acknowledged_command(self, command: _ReceivedCommand, data: bytes) -> _SimulatedReply:
+		return self.reply(ReplyType.Ack)
+
+	def on_key_set(self, command: _ReceivedCommand, data: bytes) -> _SimulatedReply:
+		if not command.is_secure_message or len(data) < 2 or data[0] != 0x01 or len(data) != data[1] + 2:
+			return self.nak(ErrorCode.CommunicationSecurityNotMet)
+		self._secure_channel.installed_key = bytes(data[2:])
+		return self.reply(ReplyType.Ack)
+
+	def on_security_initialization_request(self, command: _ReceivedCommand, data: bytes) -> _SimulatedReply:
+		if len(data) != 8:
+			return self.nak(ErrorCode.InvalidCommandLength)
+		self._secure_channel.reset()
+		cuid = self.identification.vendor_code + bytes([self.identification.model_number]) + \
+			self.identification.serial_number.to_bytes(4, byteorder='little')
+		client_random_number = Random.new().read(8)
+		client_cryptogram = self._secure_channel.challenge(cuid, bytes(data), client_random_number)
+		return self.reply(
+			ReplyType.CrypticData, cuid + client_random_number + client_cryptogram,
+			SecurityBlockType.SecureConnectionSequenceStep2.value,
+			bytes([0x00 if self._secure_channel.is_scbkd else 0x01])
+		)
+
+	def on_server_cryptogram(self, command: _ReceivedCommand, data: bytes) -> _SimulatedReply:
+		if not self._secure_channel.is_initialized or bytes(data) != self._secure_channel.server_cryptogram:
+			self._secure_channel.reset()
+			return self.reply(
+				ReplyType.InitialRMac, b'', SecurityBlockType.SecureConnectionSequenceStep4.value, bytes([0xFF])
+			)
+		initial_rmac = self._secure_channel.initial_rmac()
+		self._secure_channel.establish(initial_rmac)
+		return self.reply(
+			ReplyType.InitialRMac, initial_rmac, SecurityBlockType.SecureConnectionSequenceStep4.value, bytes([0x01])
+		)
+
+	def __repr__(self):
+		return "Simulated device at address {0}".format(self.address)
+
+
+class DeviceSimulator:
+	'''
+	Simulated PDs sharing a bus. Frames from the ACU are answered by the device at
+	their address, either in process or behind a local TCP port or pseudo terminal.
+	'''
+
+	def __init__(self, devices=()):
+		self.devices = {device.address: device for device in devices}
+		self._lock = Lock()
+		self._resources = []
+		self._is_closed = False
+
+	def add_device(self, device: SimulatedDevice):
+		with self._lock:
+			self.devices[device.address] = device
+
+	def handle_frame(self, frame: bytes) -> bytes:
+		device = self.devices.get(frame[1] & 0x7F)
+		if device is None:
+			return None
+		with self._lock:
+			try:
+				return device.handle_frame(frame)
+			except Exception:
+				log.exception("Error while simulating reply of %s", device)
+				return None
+
+	def process(self, frame_reader: FrameReader, data: bytes) -> bytes:
+		frame_reader.feed(data)
+		replies = bytearray()
+		while True:
+			frame = frame_reader.next_frame()
+			if frame is None:
+				return bytes(replies)
+			reply = self.handle_frame(frame)
+			if reply is not None:
+				replies.extend(reply)
+
+	def serve_socket(self, sock: socket.socket):
+		frame_reader = FrameReader()
+		try:
+			while not self._is_closed:
+				data = sock.recv(1024)
+				if not data:
+					break
+				replies = self.process(frame_reader, data)
+				if replies:
+					sock.sendall(replies)
+		except OSError:
+			pass
+		finally:
+			sock.close()
+
+	def serve_tcp(self, host: str = '127.0.0.1', port: int = 0) -> int:
+		'''
+		Accept ACU connections on a local port, each served from its own thread
+		'''
+		server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		server.bind((host, port))
+		server.listen()
+		self._resources.append(server)
+		Thread(target=self._accept, args=(server,), daemon=True).start()
+		return server.getsockname()[1]
+
+	def _accept(self, server: socket.socket):
+		while not self._is_closed:
+			try:
+				client, _ = server.accept()
+			except OSError:
+				break
+			client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+			self._resources.append(client)
+			Thread(target=self.serve_socket, args=(client,), daemon=True).start()
+
+	def serve_pty(self) -> str:
+		'''
+		Serve the ACU side of a pseudo terminal and return its name, to be opened as a serial port
+		'''
+		import tty
+		master, slave = os.openpty()
+		tty.setraw(slave)
+		self._resources.extend((master, slave))
+		Thread(target=self._serve_pty, args=(master,), daemon=True).start()
+		return os.ttyname(slave)
+
+	def _serve_pty(self, master: int):
+		frame_reader = FrameReader()
+		while not self._is_closed:
+			try:
+				data = os.read(master, 1024)
+			except OSError:
+				break
+			replies = self.process(frame_reader, data)
+			if replies:
+				os.write(master, replies)
+
+	def close(self):
+		self._is_closed = True
+		for resource in self._resources:
+			try:
+				if isinstance(resource, int):
+					os.close(resource)
+				else:
+					resource.close()
+			except OSError:
+				pass
+		self._resources.clear()
+
+
+class SimulatedOsdpConnection(OsdpConnection):
+	'''
+	In process connection to a DeviceSimulator, replies are ready as soon as a command is written
+	'''
+
+	def __init__(self, simulator: DeviceSimulator, baud_rate: int = 115200):
+		self._simulator = simulator
+		self._baud_rate = baud_rate
+		self._frame_reader = FrameReader()
+		self._pending = bytearray()
+		self._is_open = False
+
+	@property
+	def baud_rate(self) -> int:
+		return self._baud_rate
+
+	@property
+	def is_open(self) -> bool:
+		return self._is_open
+
+	def open(self):
+		self._is_open = True
+
+	def close(self):
+		self._is_open = False
+		self._frame_reader.clear()
+		self._pending.clear()
+
+	def write(self, buf: bytes):
+		if not self._is_open:
+			raise ConnectionError("Simulated connection is closed")
+		self._pending.extend(self._simulator.process(self._frame_reader, buf))
+
+	def read(self, size: int = 1) -> bytes:
+		taken = bytes(self._pending[:size])
+		del self._pending[:size]
+		return taken
+
+	def read_available(self, minimum: int, maximum: int) -> bytes:
+		return self.read(maximum)
+
+	def discard_input(self):
+		self._pending.clear()
+
+	def __repr__(self):
+		return "Simulated connection to {0} devices".format(len(self._simulator.devices))
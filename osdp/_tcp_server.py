@@ -0,0 +1,412 @@
+import asyncio
+import logging
+import selectors
+import socket
+from threading import Condition, Lock, Thread
+
+from ._connection import OsdpConnection
+from ._async_connection import AsyncOsdpConnection, discard_stream_input
+
+log = logging.getLogger('osdp')
+
+
+# Bytes kept for a peer its bus is not reading, the oldest are dropped beyond it
+MAXIMUM_BUFFERED = 65536
+
+
+def _waiting_connection(connections: list, host: str):
+	# A connection waiting for the peer's own host comes first, then one waiting for any host
+	waiting = [connection for connection in connections if not connection.is_open]
+	for connection in waiting:
+		if connection.peer_host == host:
+			return connection
+	for connection in waiting:
+		if connection.peer_host is None:
+			return connection
+	return None
+
+
+class TcpPeerOsdpConnection(OsdpConnection):
+	'''
+	A peer accepted by a TcpServer, started as the connection of a bus. Its bytes are
+	received by the server thread and buffered here until the bus reads them.
+	'''
+
+	def __init__(self, server: 'TcpServer', peer_host: str, read_timeout: float):
+		self.server = server
+		self.peer_host = peer_host
+		self.peer_address = None
+		self._read_timeout = read_timeout
+		self._sock = None
+		self._buffer = bytearray()
+		self._condition = Condition()
+		self._closes = 0
+
+	@property
+	def baud_rate(self) -> int:
+		return 9600
+
+	@property
+	def is_open(self) -> bool:
+		return self._sock is not None
+
+	def open(self):
+		# Waits for the server to hand over a peer, or for the bus to close the connection
+		with self._condition:
+			closes = self._closes
+			self._condition.wait_for(lambda: self._sock is not None or self._closes != closes)
+
+	def close(self):
+		with self._condition:
+			sock, self._sock = self._sock, None
+			self._buffer.clear()
+			self._closes += 1
+			self._condition.notify_all()
+		if sock is not None:
+			self.server._drop(sock)
+
+	def write(self, buf: bytes):
+		sock = self._sock
+		if sock is None:
+			raise ConnectionError("No peer connected to {0}".format(self))
+		sock.sendall(buf)
+
+	def read(self, size: int = 1) -> bytes:
+		return self.read_available(1, size)
+
+	def read_available(self, minimum: int, maximum: int) -> bytes:
+		with self._condition:
+			self._condition.wait_for(lambda: len(self._buffer) >= minimum or self._sock is None, self._read_timeout)
+			data = bytes(self._buffer[:maximum])
+			del self._buffer[:maximum]
+		return data
+
+	def discard_input(self):
+		with self._condition:
+			self._buffer.clear()
+
+	def set_read_timeout(self, timeout: float):
+		self._read_timeout = timeout
+
+	def _attach(self, sock: socket.socket, peer_address: tuple):
+		with self._condition:
+			self._sock = sock
+			self.peer_address = peer_address
+			self._buffer.clear()
+			self._condition.notify_all()
+
+	def _detach(self, sock: socket.socket):
+		with self._condition:
+			if self._sock is sock:
+				self._sock = None
+				self._condition.notify_all()
+
+	def _received(self, sock: socket.socket, data: bytes):
+		with self._condition:
+			if self._sock is not sock:
+				return
+			self._buffer.extend(data)
+			if len(self._buffer) > MAXIMUM_BUFFERED:
+				del self._buffer[:-MAXIMUM_BUFFERED]
+			self._condition.notify_all()
+
+	def __repr__(self):
+		return "TCP peer {0} of port {1}".format(self.peer_host or 'from any host', self.server.port_number)
+
+
+class TcpServer:
+	'''
+	Accepts OSDP over IP devices and serial servers on one port, receiving from all of them
+	in a single selector thread. A peer is handed to the connection waiting for its host,
+	else to one waiting for any host, else to on_client_connected with a new connection for
+	its host, to start a bus and add its devices. Other peers are refused.
+	'''
+
+	def __init__(
+		self, port_number: int, host: str = '0.0.0.0', on_client_connected=None, read_timeout: float = 2.0,
+		backlog: int = 128
+	):
+		self._host = host
+		self._port_number = port_number
+		self._on_client_connected = on_client_connected
+		self._read_timeout = read_timeout
+		self._backlog = backlog
+		self._connections = []
+		self._lock = Lock()
+		self._listener = None
+		self._selector = None
+		self._thread = None
+		self._is_shutting_down = False
+
+	@property
+	def port_number(self) -> int:
+		return self._port_number
+
+	@property
+	def connections(self) -> list:
+		with self._lock:
+			return list(self._connections)
+
+	def connection(self, peer_host: str = None) -> TcpPeerOsdpConnection:
+		'''
+		A connection for the peer connecting from peer_host, or from any host when not given
+		'''
+		connection = TcpPeerOsdpConnection(self, peer_host, self._read_timeout)
+		with self._lock:
+			self._connections.append(connection)
+		return connection
+
+	def start(self) -> int:
+		'''
+		Listens and returns the port, chosen by the system when the port number is 0
+		'''
+		self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self._listener.bind((self._host, self._port_number))
+		self._listener.listen(self._backlog)
+		self._listener.setblocking(False)
+		self._port_number = self._listener.getsockname()[1]
+
+		self._selector = selectors.DefaultSelector()
+		self._selector.register(self._listener, selectors.EVENT_READ)
+		self._is_shutting_down = False
+		self._thread = Thread(target=self._run, name="OSDP TCP server {0}".format(self._port_number), daemon=True)
+		self._thread.start()
+		return self._port_number
+
+	def shutdown(self):
+		self._is_shutting_down = True
+		if self._thread is not None:
+			self._thread.join()
+			self._thread = None
+		for connection in self.connections:
+			connection.close()
+		if self._selector is not None:
+			self._selector.close()
+			self._selector = None
+		if self._listener is not None:
+			self._listener.close()
+			self._listener = None
+
+	def _run(self):
+		while not self._is_shutting_down:
+			for key, _ in self._selector.select(0.5):
+				try:
+					if key.data is None:
+						self._accept()
+					else:
+						self._receive(key.fileobj, key.data)
+				except Exception:
+					log.exception("Error in TCP server of port %d", self._port_number)
+
+	def _accept(self):
+		try:
+			sock, peer_address = self._listener.accept()
+		except BlockingIOError:
+			return
+		sock.settimeout(self._read_timeout)
+		sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+		with self._lock:
+			connection = _waiting_connection(self._connections, peer_address[0])
+		is_new = connection is None and self._on_client_connected is not None
+		if is_new:
+			connection = self.connection(peer_address[0])
+		if connection is None:
+			log.warning(
+				"Refused peer %s:%d on port %d, no connection is waiting for it",
+				peer_address[0], peer_address[1], self._port_number
+			)
+			sock.close()
+			return
+
+		with self._lock:
+			self._selector.register(sock, selectors.EVENT_READ, connection)
+		connection._attach(sock, peer_address)
+		log.info("Accepted peer %s:%d on port %d", peer_address[0], peer_address[1], self._port_number)
+
+		if is_new:
+			try:
+				self._on_client_connected(connection)
+			except Exception:
+				log.exception("Error while handing over peer %s:%d", peer_address[0], peer_address[1])
+				connection.close()
+
+	def _receive(self, sock: socket.socket, connection: TcpPeerOsdpConnection):
+		try:
+			data = sock.recv(4096)
+		except (BlockingIOError, socket.timeout):
+			return
+		except OSError:
+			data = b''
+		if data:
+			connection._received(sock, data)
+			return
+
+		log.info("Peer %s disconnected from port %d", connection.peer_address, self._port_number)
+		connection._detach(sock)
+		self._drop(sock)
+
+	def _drop(self, sock: socket.socket):
+		with self._lock:
+			if self._selector is not None:
+				try:
+					self._selector.unregister(sock)
+				except (KeyError, ValueError):
+					pass
+		sock.close()
+
+
+class AsyncTcpPeerOsdpConnection(AsyncOsdpConnection):
+	'''
+	A peer accepted by an AsyncTcpServer, started as the connection of an asyncio bus
+	'''
+
+	def __init__(self, server: 'AsyncTcpServer', peer_host: str, read_timeout: float):
+		self.server = server
+		self.peer_host = peer_host
+		self.peer_address = None
+		self._read_timeout = read_timeout
+		self._reader = None
+		self._writer = None
+		self._waiting = None
+
+	@property
+	def baud_rate(self) -> int:
+		return 9600
+
+	@property
+	def is_open(self) -> bool:
+		return self._writer is not None
+
+	async def open(self):
+		if self._writer is not None:
+			return
+		self._waiting = asyncio.get_event_loop().create_future()
+		try:
+			await self._waiting
+		finally:
+			self._waiting = None
+
+	async def close(self):
+		self._detach()
+		self._stop_waiting()
+
+	async def write(self, buf: bytes):
+		if self._writer is None:
+			raise ConnectionError("No peer connected to {0}".format(self))
+		self._writer.write(buf)
+		await self._writer.drain()
+
+	async def read(self, size: int = 1) -> bytes:
+		if self._reader is None:
+			return b''
+		try:
+			data = await asyncio.wait_for(self._reader.read(size), self._read_timeout)
+		except asyncio.TimeoutError:
+			return b''
+		if len(data) == 0:
+			# Peer closed the connection
+			await self.close()
+		return data
+
+	async def read_available(self, minimum: int, maximum: int) -> bytes:
+		return await self.read(maximum)
+
+	async def discard_input(self):
+		if self._reader is not None:
+			await discard_stream_input(self._reader)
+
+	def set_read_timeout(self, timeout: float):
+		self._read_timeout = timeout
+
+	def _attach(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+		self._reader = reader
+		self._writer = writer
+		self.peer_address = writer.get_extra_info('peername')
+		self._stop_waiting()
+
+	def _detach(self):
+		if self._writer is not None:
+			self._writer.close()
+		self._reader = None
+		self._writer = None
+
+	def _stop_waiting(self):
+		if self._waiting is not None and not self._waiting.done():
+			self._waiting.set_result(None)
+
+	def __repr__(self):
+		return "TCP peer {0} of port {1}".format(self.peer_host or 'from any host', self.server.port_number)
+
+
+class AsyncTcpServer:
+	'''
+	Accepts OSDP over IP devices and serial servers on one port from an asyncio event loop,
+	handing peers over to connections as TcpServer does
+	'''
+
+	def __init__(
+		self, port_number: int, host: str = '0.0.0.0', on_client_connected=None, read_timeout: float = 2.0,
+		backlog: int = 128
+	):
+		self._host = host
+		self._port_number = port_number
+		self._on_client_connected = on_client_connected
+		self._read_timeout = read_timeout
+		self._backlog = backlog
+		self._connections = []
+		self._server = None
+
+	@property
+	def port_number(self) -> int:
+		return self._port_number
+
+	@property
+	def connections(self) -> list:
+		return list(self._connections)
+
+	def connection(self, peer_host: str = None) -> AsyncTcpPeerOsdpConnection:
+		connection = AsyncTcpPeerOsdpConnection(self, peer_host, self._read_timeout)
+		self._connections.append(connection)
+		return connection
+
+	async def start(self) -> int:
+		self._server = await asyncio.start_server(self._accept, self._host, self._port_number, backlog=self._backlog)
+		self._port_number = self._server.sockets[0].getsockname()[1]
+		return self._port_number
+
+	async def shutdown(self):
+		for connection in self.connections:
+			await connection.close()
+		if self._server is not None:
+			self._server.close()
+			await self._server.wait_closed()
+			self._server = None
+
+	def _accept(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+		peer_address = writer.get_extra_info('peername')
+		connection = _waiting_connection(self._connections, peer_address[0])
+		is_new = connection is None and self._on_client_connected is not None
+		if is_new:
+			connection = self.connection(peer_address[0])
+		if connection is None:
+			log.warning(
+				"Refused peer %s:%d on port %d, no connection is waiting for it",
+				peer_address[0], peer_address[1], self._port_number
+			)
+			writer.close()
+			return
+
+		sock = writer.get_extra_info('socket')
+		if sock is not None:
+			sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		connection._attach(reader, writer)
+		log.info("Accepted peer %s:%d on port %d", peer_address[0], peer_address[1], self._port_number)
+
+		if is_new:
+			try:
+				self._on_client_connected(connection)
+			except Exception:
+				log.exception("Error while handing over peer %s:%d", peer_address[0], peer_address[1])
+				connection._detach()
@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+
+class ReplyTimeoutPolicy:
+	'''
+	How long a bus waits for a device to reply, and how many times a command is sent again
+	when it does not. Without a fixed timeout, the 200 ms reply window a PD has under OSDP
+	is extended by the time a maximum size reply takes on the wire at the bus baud rate.
+	'''
+
+	REPLY_WINDOW = timedelta(milliseconds=200)
+	MAX_REPLY_SIZE = 128
+	BITS_PER_BYTE = 10
+
+	def __init__(self, reply_timeout: timedelta = None, retries: int = 1, offline_retries: int = 0):
+		self.reply_timeout = reply_timeout
+		self.retries = retries
+		self.offline_retries = offline_retries
+
+	def reply_timeout_for(self, baud_rate: int) -> timedelta:
+		if self.reply_timeout is not None:
+			return self.reply_timeout
+		return self.REPLY_WINDOW + timedelta(seconds=self.MAX_REPLY_SIZE * self.BITS_PER_BYTE / baud_rate)
+
+	def retries_for(self, device) -> int:
+		# Addresses that do not answer are not retried, so they hold the bus for a single timeout
+		return self.retries if device.is_online else self.offline_retries
+
+	def __repr__(self):
+		return "Reply timeout: {0} Retries: {1} Offline retries: {2}".format(
+			self.reply_timeout, self.retries, self.offline_retries
+		)
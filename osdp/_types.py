@@ -1,4 +1,4 @@
-from enum import Enum
+from enum import Enum, IntEnum
 from threading import Event
 
 
@@ -34,8 +34,38 @@ class SecurityBlockType(Enum):
 	ReplyMessageWithDataSecurity = 0x18
 
 
+class CommandPriority(IntEnum):
+	Actuation = 0
+	Feedback = 1
+	Normal = 2
+	Diagnostics = 3
+
+
+class DeviceStatus(Enum):
+	Online = 0
+	Offline = 1
+
+
+class ConnectionStatus(Enum):
+	Connected = 0
+	Disconnected = 1
+
+
+class FrameDirection(IntEnum):
+	Transmit = 0
+	Receive = 1
+
+
+class OverflowPolicy(Enum):
+	Block = 0
+	DropNewest = 1
+	DropOldest = 2
+
+
 class Control:
 
+	__slots__ = ('sequence', 'use_crc', 'has_security_control_block')
+
 	def __init__(self, sequence: int, use_crc: bool, has_security_control_block: bool):
 		self.sequence = sequence
 		self.use_crc = use_crc
@@ -68,18 +98,20 @@ class ErrorCode(Enum):
 
 class Nak:
 
+	__slots__ = ('error_code', 'extra_data')
+
 	def __init__(self, error_code: ErrorCode, extra_data: bytes):
 		self.error_code = error_code
 		self.extra_data = extra_data
 
 	@staticmethod
 	def parse_data(reply):
-		data = reply.extract_reply_data
+		data = reply.reply_data_view
 		if len(data) < 1:
 			raise ValueError("Invalid size for the data")
 
 		error_code = ErrorCode(data[0])
-		extra_data = data[1:]
+		extra_data = bytes(data[1:])
 		return Nak(error_code, extra_data)
 
 	def __repr__(self):
@@ -102,11 +134,11 @@ class DeviceIdentification:
 
 	@staticmethod
 	def parse_data(reply):
-		data = reply.extract_reply_data
+		data = reply.reply_data_view
 		if len(data) != 12:
 			raise ValueError("Invalid size for the data")
 
-		vendor_code = data[0:3]
+		vendor_code = bytes(data[0:3])
 		model_number = data[3]
 		version = data[4]
 		serial_number = int.from_bytes(data[5:9], byteorder='little')
@@ -123,6 +155,11 @@ class DeviceIdentification:
 			firmware_build
 		)
 
+	def build_data(self) -> bytes:
+		return self.vendor_code + bytes([self.model_number, self.version]) + \
+			self.serial_number.to_bytes(4, byteorder='little') + \
+			bytes([self.firmware_major, self.firmware_minor, self.firmware_build])
+
 	def __repr__(self):
 		return \
 			"     Vendor Code: {0}\n"\
@@ -161,6 +198,8 @@ class CapabilityFunction(Enum):
 
 class DeviceCapability:
 
+	__slots__ = ('function', 'compliance', 'number_of')
+
 	def __init__(self, function: CapabilityFunction, compliance: int, number_of: int):
 		self.function = function
 		self.compliance = compliance
@@ -173,6 +212,9 @@ class DeviceCapability:
 		number_of = data[2]
 		return DeviceCapability(function, compliance, number_of)
 
+	def build_data(self) -> bytes:
+		return bytes([self.function.value, self.compliance, self.number_of])
+
 	def __repr__(self):
 		if self.function == CapabilityFunction.ReceiveBufferSize or \
 			self.function == CapabilityFunction.LargestCombinedMessageSize:
@@ -200,7 +242,7 @@ class DeviceCapabilities:
 
 	@staticmethod
 	def parse_data(reply):
-		data = reply.extract_reply_data
+		data = reply.reply_data_view
 		if len(data) % 3 != 0:
 			raise ValueError("Invalid size for the data")
 
@@ -209,49 +251,64 @@ class DeviceCapabilities:
 			capabilities.append(DeviceCapability.parse_data(data[i:(i + 3)]))
 		return DeviceCapabilities(capabilities)
 
+	def build_data(self) -> bytes:
+		return b''.join(capability.build_data() for capability in self.capabilities)
+
 	def __repr__(self):
 		return '\n\n'.join([str(capability) for capability in self.capabilities])
 
 
 class InputStatus:
 
+	__slots__ = ('statuses',)
+
 	def __init__(self, statuses):
 		self.statuses = statuses
 
 	@staticmethod
 	def parse_data(reply):
-		data = reply.extract_reply_data
-		statuses = map(lambda b: b != 0, data)
+		data = reply.reply_data_view
+		statuses = [b != 0 for b in data]
 		return InputStatus(statuses)
 
+	def build_data(self) -> bytes:
+		return bytes([0x01 if status else 0x00 for status in self.statuses])
+
 	def __repr__(self):
 		return 'Input: [' + ', '.join([str(status) for status in self.statuses]) + ']'
 
 
 class OutputStatus:
 
+	__slots__ = ('statuses',)
+
 	def __init__(self, statuses):
 		self.statuses = statuses
 
 	@staticmethod
 	def parse_data(reply):
-		data = reply.extract_reply_data
-		statuses = map(lambda b: b != 0, data)
+		data = reply.reply_data_view
+		statuses = [b != 0 for b in data]
 		return OutputStatus(statuses)
 
+	def build_data(self) -> bytes:
+		return bytes([0x01 if status else 0x00 for status in self.statuses])
+
 	def __repr__(self):
 		return 'Output: [' + ', '.join([str(status) for status in self.statuses]) + ']'
 
 
 class LocalStatus:
 
+	__slots__ = ('tamper', 'power_failure')
+
 	def __init__(self, tamper: bool, power_failure: bool):
 		self.tamper = tamper
 		self.power_failure = power_failure
 
 	@staticmethod
 	def parse_data(reply):
-		data = reply.extract_reply_data
+		data = reply.reply_data_view
 		if len(data) < 2:
 			raise ValueError("Invalid size for the data")
 
@@ -259,6 +316,9 @@ class LocalStatus:
 		power_failure = data[1] != 0
 		return LocalStatus(tamper, power_failure)
 
+	def build_data(self) -> bytes:
+		return bytes([0x01 if self.tamper else 0x00, 0x01 if self.power_failure else 0x00])
+
 	def __repr__(self):
 		return "        Tamper: {0}\nCPower Failure: {1}".format(self.tamper, self.power_failure)
 
@@ -271,15 +331,20 @@ class ReaderTamperStatus(Enum):
 
 class ReaderStatus:
 
+	__slots__ = ('statuses',)
+
 	def __init__(self, statuses):
 		self.statuses = statuses
 
 	@staticmethod
 	def parse_data(reply):
-		data = reply.extract_reply_data
-		statuses = map(lambda b: ReaderTamperStatus(b), data)
+		data = reply.reply_data_view
+		statuses = [ReaderTamperStatus(b) for b in data]
 		return ReaderStatus(statuses)
 
+	def build_data(self) -> bytes:
+		return bytes([status.value for status in self.statuses])
+
 	def __repr__(self):
 		return 'Reader Status: [' + ', '.join([str(status) for status in self.statuses]) + ']'
 
@@ -475,6 +540,8 @@ class FormatCode(Enum):
 
 class RawCardData:
 
+	__slots__ = ('reader_number', 'format_code', 'bit_count', 'data')
+
 	def __init__(self, reader_number: int, format_code: FormatCode, bit_count: int, data: bytes):
 		self.reader_number = reader_number
 		self.format_code = format_code
@@ -483,16 +550,20 @@ class RawCardData:
 
 	@staticmethod
 	def parse_data(reply):
-		data = reply.extract_reply_data
+		data = reply.reply_data_view
 		if len(data) < 4:
 			raise ValueError("Invalid size for the data")
 
 		reader_number = data[0]
 		format_code = FormatCode(data[1])
 		bit_count = int.from_bytes(data[2:4], byteorder='little')
-		data = data[4:]
+		data = bytes(data[4:])
 		return RawCardData(reader_number, format_code, bit_count, data)
 
+	def build_data(self) -> bytes:
+		return bytes([self.reader_number, self.format_code.value]) + \
+			self.bit_count.to_bytes(2, byteorder='little') + self.data
+
 	def __repr__(self):
 		return \
 			"Reader Number: {0}\n"\
@@ -508,6 +579,8 @@ class RawCardData:
 
 class KeypadData:
 
+	__slots__ = ('reader_number', 'bit_count', 'data')
+
 	def __init__(self, reader_number: int, bit_count: int, data: bytes):
 		self.reader_number = reader_number
 		self.bit_count = bit_count
@@ -515,15 +588,18 @@ class KeypadData:
 
 	@staticmethod
 	def parse_data(reply):
-		data = reply.extract_reply_data
+		data = reply.reply_data_view
 		if len(data) < 2:
 			raise ValueError("Invalid size for the data")
 
 		reader_number = data[0]
 		bit_count = int.from_bytes(data[1:2], byteorder='little')
-		data = data[2:]
+		data = bytes(data[2:])
 		return KeypadData(reader_number, bit_count, data)
 
+	def build_data(self) -> bytes:
+		return bytes([self.reader_number, self.bit_count]) + self.data
+
 	def __repr__(self):
 		return \
 			"Reader Number: {0}\n"\
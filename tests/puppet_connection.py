@@ -4,16 +4,18 @@ import sys
 import time
 import logging
 import random
+import asyncio
 
-from context import OsdpConnection
+from context import OsdpConnection, AsyncOsdpConnection
 
 log = logging.getLogger('osdp')
 
 
 class PuppetOsdpConnection(OsdpConnection):
 	
-	def __init__(self):
+	def __init__(self, reply: bytes = b''):
 		self._open = False
+		self.reply = reply
 		self.should_reply = b''
 
 	@property
@@ -33,6 +35,8 @@ class PuppetOsdpConnection(OsdpConnection):
 	def write(self, buf: bytes):
 		if self._open:
 			log.debug("Written: %s", buf)
+			if self.reply:
+				self.should_reply = self.reply
 		else:
 			raise Exception("Connection is closed while writing")
 
@@ -42,3 +46,40 @@ class PuppetOsdpConnection(OsdpConnection):
 		remain = self.should_reply[size:]
 		self.should_reply = remain
 		return taken
+
+
+class AsyncPuppetOsdpConnection(AsyncOsdpConnection):
+
+	def __init__(self, reply: bytes = b''):
+		self._open = False
+		self.reply = reply
+		self.should_reply = b''
+
+	@property
+	def baud_rate(self) -> int:
+		return 9600
+
+	@property
+	def is_open(self) -> bool:
+		return self._open
+
+	async def open(self):
+		self._open = True
+
+	async def close(self):
+		self._open = False
+
+	async def write(self, buf: bytes):
+		if self._open:
+			log.debug("Written: %s", buf)
+			if self.reply:
+				self.should_reply = self.reply
+		else:
+			raise Exception("Connection is closed while writing")
+
+	async def read(self, size: int=1) -> bytes:
+		await asyncio.sleep(0)
+		taken = self.should_reply[:size]
+		remain = self.should_reply[size:]
+		self.should_reply = remain
+		return taken
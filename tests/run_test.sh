@@ -1,5 +1,19 @@
 python3 -m unittest -v test_all.py
 python3 -m unittest -v test_bus.py
+python3 -m unittest -v test_async_bus.py
 python3 -m unittest -v test_command.py
 #python3 -m unittest -v test_control_panel.py
 python3 -m unittest -v test_reply.py
+python3 -m unittest -v test_poll_scheduler.py
+python3 -m unittest -v test_control_panel_requests.py
+python3 -m unittest -v test_frame_reader.py
+python3 -m unittest -v test_secure_channel.py
+python3 -m unittest -v test_device.py
+python3 -m unittest -v test_sharded_control_panel.py
+python3 -m unittest -v test_event_stream.py
+python3 -m unittest -v test_metrics.py
+python3 -m unittest -v test_discovery.py
+python3 -m unittest -v test_simulator.py
+python3 -m unittest -v test_capture.py
+python3 -m unittest -v test_tcp_server.py
+python3 -m unittest -v test_reconnect.py
@@ -3,6 +3,20 @@ import unittest
 from test_command import CommandTestCase
 from test_reply import ReplyTestCase
 from test_bus import BusTestCase
+from test_async_bus import AsyncBusTestCase
+from test_poll_scheduler import PollSchedulerTestCase
+from test_control_panel_requests import ControlPanelRequestsTestCase
+from test_frame_reader import FrameReaderTestCase
+from test_secure_channel import SecureChannelTestCase
+from test_device import DeviceTestCase
+from test_sharded_control_panel import ShardedControlPanelTestCase
+from test_event_stream import EventStreamTestCase
+from test_metrics import MetricsTestCase
+from test_discovery import DiscoveryTestCase
+from test_simulator import SimulatorTestCase
+from test_capture import CaptureTestCase
+from test_tcp_server import TcpServerTestCase
+from test_reconnect import ReconnectTestCase
 
 
 def create_suite():
@@ -10,6 +24,20 @@ def create_suite():
     test_suite.addTest(CommandTestCase())
     test_suite.addTest(ReplyTestCase())
     test_suite.addTest(BusTestCase())
+    test_suite.addTest(AsyncBusTestCase())
+    test_suite.addTest(PollSchedulerTestCase())
+    test_suite.addTest(ControlPanelRequestsTestCase())
+    test_suite.addTest(FrameReaderTestCase())
+    test_suite.addTest(SecureChannelTestCase())
+    test_suite.addTest(DeviceTestCase())
+    test_suite.addTest(ShardedControlPanelTestCase())
+    test_suite.addTest(EventStreamTestCase())
+    test_suite.addTest(MetricsTestCase())
+    test_suite.addTest(DiscoveryTestCase())
+    test_suite.addTest(SimulatorTestCase())
+    test_suite.addTest(CaptureTestCase())
+    test_suite.addTest(TcpServerTestCase())
+    test_suite.addTest(ReconnectTestCase())
     return test_suite
 
 
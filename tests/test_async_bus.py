@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for OSDP AsyncBus and AsyncControlPanel"""
+
+import asyncio
+import logging
+import os
+import sys
+import unittest
+
+from puppet_connection import AsyncPuppetOsdpConnection
+from context import *
+
+log = logging.getLogger('osdp')
+
+
+class AsyncBusTestCase(unittest.TestCase):
+
+	"""Test AsyncBus for OSDP Python Module."""
+
+	def setUp(self):
+		"""Setup."""
+		self.loop = asyncio.new_event_loop()
+
+	def tearDown(self):
+		"""Teardown."""
+		self.loop.close()
+
+	def test_id_report_checksum(self):
+		connection = AsyncPuppetOsdpConnection()
+		self.loop.run_until_complete(connection.open())
+
+		bus = AsyncBus(connection=connection, on_reply_received=None)
+		device = bus.add_device(address=0x7F, use_crc=False, use_secure_channel=False)
+
+		device.message_control.increment_sequence()
+		device.message_control.increment_sequence()
+		device.message_control.increment_sequence()
+		self.assertEqual(device.message_control.sequence, 3)
+
+		connection.should_reply = bytes.fromhex('53 FF 13 00 03 45 A4 D9 A4 03 FF 33 00 01 70 03 00 02 87')
+
+		data = bytearray([Bus.DRIVER_BYTE])
+		command = IdReportCommand(address=0x7F)
+
+		reply = self.loop.run_until_complete(bus.send_command_and_receive_reply(data, command, device))
+		self.assertIsNotNone(reply)
+		self.assertEqual(reply.type, ReplyType.PdIdReport)
+		self.assertEqual(reply.extract_reply_data.hex().upper(), 'A4D9A403FF33000170030002')
+
+	def test_poll_timeout(self):
+		connection = AsyncPuppetOsdpConnection()
+		self.loop.run_until_complete(connection.open())
+
+		bus = AsyncBus(connection=connection, on_reply_received=None)
+		device = bus.add_device(address=0x7F, use_crc=False, use_secure_channel=False)
+
+		data = bytearray([Bus.DRIVER_BYTE])
+		command = PollCommand(address=0x7F)
+
+		with self.assertRaises(TimeoutError):
+			self.loop.run_until_complete(bus.send_command_and_receive_reply(data, command, device))
+
+	def test_late_reply_discarded(self):
+		id_report_reply = bytes.fromhex('53 FF 13 00 03 45 A4 D9 A4 03 FF 33 00 01 70 03 00 02 87')
+
+		handlers = []
+
+		async def on_client_connected(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+			handlers.append(asyncio.current_task())
+			# A reply to an earlier command arrives before the next command is sent
+			writer.write(bytes.fromhex('53 FF 07 00 01 40 66'))
+			while await reader.read(4096):
+				writer.write(id_report_reply)
+			writer.close()
+
+		async def exchange():
+			server = await asyncio.start_server(on_client_connected, '127.0.0.1', 0)
+			connection = AsyncTcpClientOsdpConnection('127.0.0.1', server.sockets[0].getsockname()[1])
+			try:
+				await connection.open()
+				await asyncio.sleep(0.1)
+
+				bus = AsyncBus(connection=connection, on_reply_received=None)
+				device = bus.add_device(address=0x7F, use_crc=False, use_secure_channel=False)
+				for _ in range(3):
+					device.message_control.increment_sequence()
+				data = bytearray([Bus.DRIVER_BYTE])
+				return await bus.send_command_and_receive_reply(data, IdReportCommand(address=0x7F), device)
+			finally:
+				await connection.close()
+				server.close()
+				await server.wait_closed()
+				await asyncio.gather(*handlers)
+
+		reply = self.loop.run_until_complete(exchange())
+		self.assertEqual(reply.type, ReplyType.PdIdReport)
+
+	def test_control_panel_id_report(self):
+		id_report_reply = bytes.fromhex('53 FF 13 00 03 45 A4 D9 A4 03 FF 33 00 01 70 03 00 02 87')
+
+		async def run():
+			cp = AsyncControlPanel()
+			connections = [AsyncPuppetOsdpConnection(id_report_reply) for _ in range(3)]
+			bus_ids = [cp.start_connection(connection) for connection in connections]
+			for bus_id in bus_ids:
+				cp.add_device(connection_id=bus_id, address=0x7F, use_crc=False, use_secure_channel=False)
+
+			results = await asyncio.gather(*[cp.id_report(connection_id=bus_id, address=0x7F) for bus_id in bus_ids])
+			await cp.shutdown()
+			return results
+
+		results = self.loop.run_until_complete(run())
+		self.assertEqual([device_id.serial_number for device_id in results], [1879113779] * 3)
+
+	def test_control_panel_send_commands(self):
+		id_report_reply = bytes.fromhex('53 FF 13 00 03 45 A4 D9 A4 03 FF 33 00 01 70 03 00 02 87')
+
+		async def run():
+			cp = AsyncControlPanel()
+			bus_ids = [cp.start_connection(AsyncPuppetOsdpConnection(id_report_reply)) for _ in range(2)]
+			bus_ids.append(cp.start_connection(AsyncPuppetOsdpConnection()))
+			for bus_id in bus_ids:
+				cp.add_device(connection_id=bus_id, address=0x7F, use_crc=False, use_secure_channel=False)
+
+			requests = [(bus_id, 0x7F, IdReportCommand) for bus_id in bus_ids]
+			results = [result async for result in cp.send_commands(requests, timeout=0.5)]
+			await cp.shutdown()
+			return bus_ids, results
+
+		bus_ids, results = self.loop.run_until_complete(run())
+		self.assertEqual(len(results), 3)
+		self.assertEqual([result.is_success for result in results], [True, True, False])
+		self.assertEqual(results[2].connection_id, bus_ids[2])
+		self.assertIsInstance(results[2].error, TimeoutError)
+		self.assertEqual(DeviceIdentification.parse_data(results[0].reply).serial_number, 1879113779)
+
+
+	def test_control_panel_coalesced_replies(self):
+		ack_reply = bytes.fromhex('53 FF 07 00 01 40 66')
+
+		def led_controls(color: LedColor):
+			return ReaderLedControls([ReaderLedControl(
+				0x0, 0x0, TemporaryReaderControlCode.SetTemporaryAndStartTimer, 0x02, 0x01, color, LedColor.Black,
+				0x000A, PermanentReaderControlCode.Nop, 0x00, 0x00, LedColor.Black, LedColor.Black
+			)])
+
+		async def run():
+			cp = AsyncControlPanel()
+			connection = AsyncPuppetOsdpConnection(ack_reply)
+			bus_id = cp.start_connection(connection)
+			cp.add_device(connection_id=bus_id, address=0x7F, use_crc=False, use_secure_channel=False, coalesce_commands=True)
+
+			results = await asyncio.gather(*[
+				cp.reader_led_control(connection_id=bus_id, address=0x7F, reader_led_controls=led_controls(color))
+				for color in (LedColor.Red, LedColor.Green, LedColor.Amber)
+			])
+			statistics = cp.command_queue_statistics(connection_id=bus_id, address=0x7F)
+			await cp.shutdown()
+			return results, statistics
+
+		results, statistics = self.loop.run_until_complete(run())
+		self.assertEqual(results, [True, True, True])
+		self.assertEqual(statistics.sent, {CommandPriority.Feedback: 1})
+
+	def test_control_panel_refuses_blocking_events(self):
+		raw_card_data_reply = bytes.fromhex('53 FF 0F 00 02 50 FF 01 1A 00 CD 22 C7 16 67')
+
+		async def run():
+			cp = AsyncControlPanel()
+			with self.assertRaises(ValueError):
+				cp.events(max_size=1, overflow_policy=OverflowPolicy.Block)
+
+			# A full stream drops events instead of stalling the loop that drains it
+			stream = cp.events(max_size=1, overflow_policy=OverflowPolicy.DropNewest, event_types=(ReplyType.RawReaderData,))
+			bus_id = cp.start_connection(AsyncPuppetOsdpConnection(raw_card_data_reply))
+			cp.add_device(connection_id=bus_id, address=0x7F, use_crc=False, use_secure_channel=False)
+			while stream.dropped_count == 0:
+				await asyncio.sleep(0.01)
+			event = await asyncio.wait_for(stream.__anext__(), 5.0)
+			await cp.shutdown()
+			return event
+
+		event = self.loop.run_until_complete(asyncio.wait_for(run(), 10.0))
+		self.assertEqual(event.type, ReplyType.RawReaderData)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -7,6 +7,7 @@ import logging
 import os
 import sys
 import unittest
+from datetime import timedelta
 
 from puppet_connection import PuppetOsdpConnection
 from context import *
@@ -14,6 +15,72 @@ from context import *
 log = logging.getLogger('osdp')
 
 
+class CountingOsdpConnection(PuppetOsdpConnection):
+
+	def __init__(self):
+		super().__init__()
+		self.writes = 0
+		self.reply_on_write = None
+		self.delayed_reply = b''
+		self.read_timeout = None
+
+	def write(self, buf: bytes):
+		super().write(buf)
+		self.writes += 1
+		if self.writes == self.reply_on_write:
+			self.should_reply = self.delayed_reply
+
+	def read(self, size: int = 1) -> bytes:
+		taken = self.should_reply[:size]
+		self.should_reply = self.should_reply[size:]
+		return taken
+
+	def set_read_timeout(self, timeout: float):
+		self.read_timeout = timeout
+
+
+class LateReplyOsdpConnection(OsdpConnection):
+
+	def __init__(self, simulator: DeviceSimulator, late_address: int):
+		self._simulator = simulator
+		self._late_address = late_address
+		self._late_reply = b''
+		self._input = bytearray()
+		self._open = False
+
+	@property
+	def baud_rate(self) -> int:
+		return 115200
+
+	@property
+	def is_open(self) -> bool:
+		return self._open
+
+	def open(self):
+		self._open = True
+
+	def close(self):
+		self._open = False
+
+	def write(self, buf: bytes):
+		# Replies of the late address only arrive once the next command has been written
+		reply = self._simulator.handle_frame(bytes(buf[1:])) or b''
+		self._input.extend(self._late_reply)
+		self._late_reply = b''
+		if buf[2] & 0x7F == self._late_address:
+			self._late_reply = reply
+		else:
+			self._input.extend(reply)
+
+	def read(self, size: int = 1) -> bytes:
+		taken = bytes(self._input[:size])
+		del self._input[:size]
+		return taken
+
+	def discard_input(self):
+		self._input.clear()
+
+
 class BusTestCase(unittest.TestCase):
 
 	"""Test Bus for OSDP Python Module."""
@@ -202,5 +269,72 @@ class BusTestCase(unittest.TestCase):
 		device.message_control.increment_sequence()
 		self.assertEqual(device.message_control.sequence, 2)
 
+	def test_output_control_expedited(self):
+		connection = PuppetOsdpConnection()
+		bus = Bus(connection=connection, on_reply_received=None)
+		bus.add_device(address=0x01, use_crc=False, use_secure_channel=False)
+		bus.add_device(address=0x02, use_crc=False, use_secure_channel=False)
+
+		bus.send_command(IdReportCommand(address=0x01))
+		self.assertIsNone(bus.next_expedited_device())
+
+		output_controls = OutputControls([OutputControl(0, OutputControlCode.TemporaryStateOnResumePermanentState, 50)])
+		bus.send_command(OutputControlCommand(address=0x02, output_controls=output_controls))
+		self.assertEqual(bus.command_queue_depth(0x02), 1)
+		self.assertEqual(bus.next_expedited_device().address, 0x02)
+		self.assertIsNone(bus.next_expedited_device())
+
+	def test_reply_timeout_policy(self):
+		policy = ReplyTimeoutPolicy()
+		self.assertEqual(policy.reply_timeout_for(9600), timedelta(microseconds=333333))
+		self.assertEqual(policy.reply_timeout_for(115200), timedelta(microseconds=211111))
+		policy = ReplyTimeoutPolicy(reply_timeout=timedelta(milliseconds=50))
+		self.assertEqual(policy.reply_timeout_for(9600), timedelta(milliseconds=50))
+
+	def test_retries_online_devices_only(self):
+		connection = CountingOsdpConnection()
+		connection.open()
+		bus = Bus(connection=connection, on_reply_received=None)
+		policy = ReplyTimeoutPolicy(retries=2)
+		device = bus.add_device(address=0x7F, use_crc=False, use_secure_channel=False, timeout_policy=policy)
+
+		bus.poll_device(device)
+		self.assertEqual(connection.writes, 1)
+		self.assertEqual(connection.read_timeout, 0.333333)
+		self.assertTrue(connection.is_open)
+
+		device.valid_reply_has_been_received()
+		connection.writes = 0
+		bus.poll_device(device)
+		self.assertEqual(connection.writes, 3)
+		self.assertTrue(connection.is_open)
+
+		connection.writes = 0
+		connection.reply_on_write = 2
+		connection.delayed_reply = bytes.fromhex('53 FF 07 00 02 40 65')
+		bus.poll_device(device)
+		self.assertEqual(connection.writes, 2)
+		self.assertEqual(device.message_control.sequence, 2)
+
+
+	def test_late_reply_is_not_taken_by_next_device(self):
+		simulator = DeviceSimulator([SimulatedDevice(0x01), SimulatedDevice(0x02)])
+		connection = LateReplyOsdpConnection(simulator, late_address=0x01)
+		connection.open()
+		replies = []
+		bus = Bus(connection=connection, on_reply_received=lambda reply: replies.append(reply.address))
+		policy = ReplyTimeoutPolicy(retries=1, offline_retries=1)
+		devices = [bus.add_device(address, True, False, timeout_policy=policy) for address in (0x01, 0x02)]
+
+		for _ in range(6):
+			for device in devices:
+				bus.poll_device(device)
+
+		# The late device answers each retry, its reply to the retry arrives during the next exchange
+		self.assertEqual(replies.count(0x01), 6)
+		self.assertEqual(replies.count(0x02), 6)
+		self.assertTrue(connection.is_open)
+
+
 if __name__ == '__main__':
 	unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for OSDP wire captures"""
+
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from context import *
+
+log = logging.getLogger('osdp')
+
+
+class CaptureTestCase(unittest.TestCase):
+
+	"""Test wire captures for OSDP Python Module."""
+
+	def setUp(self):
+		"""Setup."""
+		self.directory = tempfile.mkdtemp()
+		self.path = os.path.join(self.directory, 'bus.osdpcap')
+
+	def tearDown(self):
+		"""Teardown."""
+		shutil.rmtree(self.directory)
+
+	def capture_exchanges(self, exchanges: int):
+		simulator = DeviceSimulator([SimulatedDevice(0x01), SimulatedDevice(0x02)])
+		with CaptureWriter(self.path) as writer:
+			connection = CaptureOsdpConnection(SimulatedOsdpConnection(simulator), writer)
+			connection.open()
+			bus = Bus(connection=connection, on_reply_received=None)
+			devices = [bus.add_device(address, True, False) for address in (0x01, 0x02)]
+			for i in range(exchanges):
+				device = devices[i % 2]
+				bus.send_command_and_receive_reply(bytearray([Bus.DRIVER_BYTE]), IdReportCommand(device.address), device)
+				device.valid_reply_has_been_received()
+
+	def test_record_and_read(self):
+		self.capture_exchanges(6)
+
+		with CaptureReader(self.path) as reader:
+			self.assertEqual(len(reader), 12)
+			frames = [(frame.direction, frame.address, bytes(frame.frame)) for frame in reader.frames()]
+			self.assertEqual([direction for direction, _, _ in frames], [FrameDirection.Transmit, FrameDirection.Receive] * 6)
+			self.assertEqual(frames[0][2][0], Message.SOM)
+			self.assertEqual(frames[1][2][5], ReplyType.PdIdReport.value)
+
+			received = list(reader.frames(address=0x02, direction=FrameDirection.Receive))
+			self.assertEqual(len(received), 3)
+			self.assertTrue(all(frame.address == 0x02 for frame in received))
+
+	def test_time_index(self):
+		frame = PollCommand(0x03).build_command(Device(0x03, True, False))
+		with CaptureWriter(self.path) as writer:
+			for timestamp in range(0, 100, 10):
+				writer.record(FrameDirection.Transmit, frame, timestamp)
+
+		with CaptureReader(self.path) as reader:
+			self.assertEqual([frame.timestamp for frame in reader.frames(start=25, end=60)], [30, 40, 50])
+
+		# Without its index, after a crash, the index is rebuilt from the capture
+		os.remove(self.path + '.idx')
+		with open(self.path, 'ab') as capture_file:
+			capture_file.write(bytes([0x01, 0x02, 0x03]))
+		with CaptureReader(self.path) as reader:
+			self.assertEqual(len(reader), 10)
+			self.assertEqual([frame.timestamp for frame in reader.frames(start=85)], [90])
+
+	def test_address_index(self):
+		with CaptureWriter(self.path) as writer:
+			for timestamp in range(0, 100, 10):
+				address = 0x04 if timestamp % 30 == 0 else 0x05
+				writer.record(FrameDirection.Transmit, PollCommand(address).build_command(Device(address, True, False)), timestamp)
+
+		with CaptureReader(self.path) as reader:
+			self.assertEqual([frame.timestamp for frame in reader.frames(address=0x04)], [0, 30, 60, 90])
+			self.assertEqual([frame.timestamp for frame in reader.frames(start=25, end=70, address=0x04)], [30, 60])
+			self.assertEqual([frame.timestamp for frame in reader.frames(start=65, address=0x05)], [70, 80])
+			self.assertEqual(list(reader.frames(address=0x06)), [])
+
+	def test_replay(self):
+		self.capture_exchanges(10)
+
+		with CaptureReader(self.path) as reader:
+			statistics = reader.replay(decode=True)
+			self.assertEqual(statistics.commands, 10)
+			self.assertEqual(statistics.replies, 10)
+			self.assertEqual(statistics.invalid_replies, 0)
+			self.assertEqual(reader.replay(address=0x01).replies, 5)
+
+		with self.assertRaises(ValueError):
+			CaptureReader(self.path + '.idx')
+
+
+if __name__ == '__main__':
+	unittest.main()
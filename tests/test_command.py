@@ -487,5 +487,30 @@ class CommandTestCase(unittest.TestCase):
 		content = command.build_command(device)
 		self.assertEqual(content.hex().upper(), '537F0C0007800B0E0E0FEDCC')
 
+	def test_cached_poll_command_frame(self):
+		device = Device(address=0x7F, use_crc=True, use_secure_channel=False)
+		device.message_control.increment_sequence()
+
+		content = PollCommand(address=0x7F).build_command(device)
+		self.assertIs(PollCommand(address=0x7F).build_command(device), content)
+
+		device.message_control.increment_sequence()
+		self.assertIsNot(PollCommand(address=0x7F).build_command(device), content)
+		self.assertNotEqual(PollCommand(address=0x7E).build_command(device), content)
+
+		secure_device = Device(address=0x7F, use_crc=True, use_secure_channel=True)
+		secure_device.message_control.increment_sequence()
+		self.assertIsNot(
+			PollCommand(address=0x7F).build_command(secure_device),
+			PollCommand(address=0x7F).build_command(secure_device)
+		)
+
+	def test_crc_matches_table(self):
+		command = PollCommand(address=0x7F)
+		for size in (0, 1, 8, 33, 128):
+			data = bytes(range(size))
+			self.assertEqual(command.calculate_crc(data), command.calculate_crc_with_table(data))
+
+
 if __name__ == '__main__':
 	unittest.main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for requests sent through OSDP ControlPanel"""
+
+import binascii
+import logging
+import os
+import sys
+import time
+import unittest
+from threading import Thread
+
+from context import *
+
+log = logging.getLogger('osdp')
+
+
+class AnsweringOsdpConnection(OsdpConnection):
+
+	def __init__(self, addresses):
+		self.addresses = set(addresses)
+		self.written = []
+		self._open = False
+		self._replies = b''
+
+	@property
+	def baud_rate(self) -> int:
+		return 9600
+
+	@property
+	def is_open(self) -> bool:
+		return self._open
+
+	def open(self):
+		self._open = True
+
+	def close(self):
+		self._open = False
+
+	def write(self, buf: bytes):
+		frame = buf[1:]
+		address, control, code = frame[1], frame[4], frame[5]
+		self.written.append((address, code))
+		if address not in self.addresses:
+			return
+
+		if code == 0x61:
+			# ID report with the address as serial number
+			reply_type, data = 0x45, bytes([0x5C, 0x26, 0x23, 0x01, 0x01]) + address.to_bytes(4, 'little') + bytes(3)
+		else:
+			reply_type, data = 0x40, b''
+		self._replies += self.reply_frame(address, control & 0x07, reply_type, data)
+
+	def read(self, size: int = 1) -> bytes:
+		if not self._replies:
+			time.sleep(0.005)
+		taken, self._replies = self._replies[:size], self._replies[size:]
+		return taken
+
+	def discard_input(self):
+		self._replies = b''
+
+	@staticmethod
+	def reply_frame(address: int, control: int, reply_type: int, data: bytes) -> bytes:
+		use_crc = (control & 0x04) != 0
+		length = 8 + len(data) if use_crc else 7 + len(data)
+		frame = bytearray([0x53, address | 0x80]) + length.to_bytes(2, byteorder='little')
+		frame += bytes([control, reply_type]) + data
+		if use_crc:
+			frame += binascii.crc_hqx(bytes(frame), 0x1D0F).to_bytes(2, byteorder='little')
+		else:
+			frame.append((-sum(frame)) & 0xFF)
+		return bytes(frame)
+
+
+class ControlPanelRequestsTestCase(unittest.TestCase):
+
+	"""Test requests of ControlPanel for OSDP Python Module."""
+
+	def setUp(self):
+		"""Setup."""
+		self.control_panel = ControlPanel()
+
+	def tearDown(self):
+		"""Teardown."""
+		self.control_panel.shutdown()
+
+	def start(self, connection: AnsweringOsdpConnection, addresses):
+		connection_id = self.control_panel.start_connection(connection)
+		for address in addresses:
+			self.control_panel.add_device(connection_id=connection_id, address=address, use_crc=True, use_secure_channel=False)
+		return connection_id
+
+	def test_concurrent_requests_to_different_addresses(self):
+		connection_id = self.start(AnsweringOsdpConnection([0x01, 0x02]), [0x01, 0x02])
+
+		serial_numbers = {}
+
+		def id_report(address: int):
+			serial_numbers[address] = self.control_panel.id_report(connection_id, address).serial_number
+
+		threads = [Thread(target=id_report, args=(address,)) for address in (0x01, 0x02)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join(10.0)
+		self.assertEqual(serial_numbers, {0x01: 0x01, 0x02: 0x02})
+
+	def test_reply_does_not_complete_other_address(self):
+		connection = AnsweringOsdpConnection([0x01])
+		connection_id = self.start(connection, [0x01, 0x02])
+
+		errors = []
+		command = IdReportCommand(0x02)
+
+		def unanswered():
+			try:
+				self.control_panel.send_command(connection_id, command)
+			except TimeoutError as error:
+				errors.append(error)
+
+		thread = Thread(target=unanswered)
+		thread.start()
+		# Replies of 0x01 arrive while the request to 0x02 is waiting
+		for _ in range(3):
+			self.assertEqual(self.control_panel.id_report(connection_id, 0x01).serial_number, 0x01)
+		thread.join(10.0)
+		self.assertEqual(len(errors), 1)
+
+		# Once timed out, the same request waits for its own reply again
+		connection.addresses.add(0x02)
+		reply = self.control_panel.send_command(connection_id, command)
+		self.assertEqual((reply.address, DeviceIdentification.parse_data(reply).serial_number), (0x02, 0x02))
+
+	def test_batch_requests_time_out_on_their_own(self):
+		connection = AnsweringOsdpConnection([0x01, 0x03])
+		connection_id = self.start(connection, [0x01, 0x02, 0x03])
+
+		requests = [(connection_id, address, IdReportCommand) for address in (0x01, 0x02, 0x03)]
+		results = {}
+		for result in self.control_panel.send_commands(requests, timeout=0.5):
+			if not results:
+				# Consumed after the deadline, replies received meanwhile are still taken
+				time.sleep(0.6)
+			results[result.address] = result
+
+		self.assertEqual(sorted(results), [0x01, 0x02, 0x03])
+		self.assertEqual([results[address].is_success for address in (0x01, 0x02, 0x03)], [True, False, True])
+		self.assertIsInstance(results[0x02].error, TimeoutError)
+		self.assertEqual(DeviceIdentification.parse_data(results[0x03].reply).serial_number, 0x03)
+
+	def test_batch_rejects_repeated_command(self):
+		connection_id = self.start(AnsweringOsdpConnection([0x01]), [0x01])
+		command = IdReportCommand(0x01)
+
+		with self.assertRaises(ValueError):
+			self.control_panel.send_commands([(connection_id, 0x01, command), (connection_id, 0x01, command)])
+		# Equal commands of separate instances each get their reply
+		requests = [(connection_id, 0x01, IdReportCommand(0x01)) for _ in range(2)]
+		results = list(self.control_panel.send_commands(requests, timeout=5.0))
+		self.assertEqual([result.is_success for result in results], [True, True])
+
+
+if __name__ == '__main__':
+	unittest.main()
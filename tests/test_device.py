@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for OSDP Device"""
+
+import os
+import sys
+import unittest
+
+from context import *
+
+
+class DeviceTestCase(unittest.TestCase):
+
+	"""Test Device for OSDP Python Module."""
+
+	def setUp(self):
+		"""Setup."""
+		self.device = Device(address=0x7F, use_crc=False, use_secure_channel=False)
+		self.device.message_control.increment_sequence()
+
+	def tearDown(self):
+		"""Teardown."""
+
+	def output_control_command(self):
+		return OutputControlCommand(address=0x7F, output_controls=OutputControls([
+			OutputControl(output_number=0, output_control_code=OutputControlCode.TemporaryStateOnResumePermanentState, timer=50)
+		]))
+
+	def test_commands_sent_in_priority_order(self):
+		status = InputStatusReportCommand(address=0x7F)
+		led = ReaderLedControlCommand(address=0x7F, reader_led_controls=ReaderLedControls([]))
+		output = self.output_control_command()
+		custom = ManufacturerSpecificCommand(address=0x7F, manufacturer_data=b'')
+
+		for command in (status, led, custom, output):
+			self.device.send_command(command)
+		self.assertEqual(self.device.command_queue_depth, 4)
+		self.assertEqual(self.device.pending_priority, CommandPriority.Actuation)
+
+		self.assertIs(self.device.get_next_command_data(), output)
+		self.assertIs(self.device.get_next_command_data(), led)
+		self.assertIs(self.device.get_next_command_data(), custom)
+		self.assertIs(self.device.get_next_command_data(), status)
+		self.assertIsInstance(self.device.get_next_command_data(), PollCommand)
+		self.assertIsNone(self.device.pending_priority)
+
+	def test_priority_override_keeps_fifo_order(self):
+		first = IdReportCommand(address=0x7F)
+		second = LocalStatusReportCommand(address=0x7F)
+		self.device.send_command(first, CommandPriority.Actuation)
+		self.device.send_command(second, CommandPriority.Actuation)
+
+		self.assertIs(self.device.get_next_command_data(), first)
+		self.assertIs(self.device.get_next_command_data(), second)
+
+	def test_command_queue_statistics(self):
+		self.device.send_command(self.output_control_command())
+		self.device.send_command(IdReportCommand(address=0x7F))
+		self.device.get_next_command_data()
+		self.device.get_next_command_data()
+
+		statistics = self.device.command_queue_statistics
+		self.assertEqual(statistics.sent, {CommandPriority.Actuation: 1, CommandPriority.Diagnostics: 1})
+		self.assertIsNotNone(statistics.average_wait_time(CommandPriority.Actuation))
+		self.assertIsNone(statistics.average_wait_time(CommandPriority.Feedback))
+
+	def led_command(self, led_number: int, color: LedColor):
+		return ReaderLedControlCommand(address=0x7F, reader_led_controls=ReaderLedControls([ReaderLedControl(
+			reader_number=0x0,
+			led_number=led_number,
+			temporary_mode=TemporaryReaderControlCode.SetTemporaryAndStartTimer,
+			temporary_on_time=0x02,
+			temporary_off_time=0x01,
+			temporary_on_color=color,
+			temporary_off_color=LedColor.Black,
+			temporary_timer=0x000A,
+			permanent_mode=PermanentReaderControlCode.Nop,
+			permanent_on_time=0x00,
+			permanent_off_time=0x00,
+			permanent_on_color=LedColor.Black,
+			permanent_off_color=LedColor.Black
+		)]))
+
+	def test_led_commands_not_coalesced_by_default(self):
+		self.device.send_command(self.led_command(0, LedColor.Red))
+		self.device.send_command(self.led_command(0, LedColor.Green))
+		self.assertEqual(self.device.command_queue_depth, 2)
+
+	def test_led_commands_coalesced(self):
+		device = Device(address=0x7F, use_crc=False, use_secure_channel=False, coalesce_commands=True)
+		device.message_control.increment_sequence()
+		red = self.led_command(0, LedColor.Red)
+		green = self.led_command(0, LedColor.Green)
+		amber = self.led_command(1, LedColor.Amber)
+
+		device.send_command(red)
+		device.send_command(green)
+		device.send_command(amber)
+		self.assertEqual(device.command_queue_depth, 1)
+
+		command = device.get_next_command_data()
+		controls = command.reader_led_controls.controls
+		self.assertEqual([(control.led_number, control.temporary_on_color) for control in controls], [
+			(0, LedColor.Green), (1, LedColor.Amber)
+		])
+		self.assertTrue({red, green, amber}.issubset(command.coalesced_commands))
+
+		device.send_command(self.led_command(0, LedColor.Red))
+		self.assertEqual(device.command_queue_depth, 1)
+
+	def test_buzzer_command_replaced(self):
+		device = Device(address=0x7F, use_crc=False, use_secure_channel=False, coalesce_commands=True)
+		device.message_control.increment_sequence()
+		first = ReaderBuzzerControlCommand(address=0x7F, reader_buzzer_control=ReaderBuzzerControl(0, ToneCode.DefaultTone, 1, 1, 1))
+		second = ReaderBuzzerControlCommand(address=0x7F, reader_buzzer_control=ReaderBuzzerControl(0, ToneCode.Off, 0, 0, 0))
+		other_reader = ReaderBuzzerControlCommand(address=0x7F, reader_buzzer_control=ReaderBuzzerControl(1, ToneCode.Off, 0, 0, 0))
+
+		device.send_command(first)
+		device.send_command(other_reader)
+		device.send_command(second)
+		self.assertEqual(device.command_queue_depth, 2)
+		self.assertIs(device.get_next_command_data(), second)
+		self.assertEqual(second.coalesced_commands, (first,))
+		self.assertIs(device.get_next_command_data(), other_reader)
+
+	def test_coalesced_command_priority_raised(self):
+		device = Device(address=0x7F, use_crc=False, use_secure_channel=False, coalesce_commands=True)
+		device.message_control.increment_sequence()
+		first = ReaderBuzzerControlCommand(address=0x7F, reader_buzzer_control=ReaderBuzzerControl(0, ToneCode.DefaultTone, 1, 1, 1))
+		second = ReaderBuzzerControlCommand(address=0x7F, reader_buzzer_control=ReaderBuzzerControl(0, ToneCode.Off, 0, 0, 0))
+		feedback = self.led_command(0, LedColor.Red)
+		normal = IdReportCommand(address=0x7F)
+
+		device.send_command(normal, CommandPriority.Normal)
+		device.send_command(first, CommandPriority.Diagnostics)
+		device.send_command(feedback, CommandPriority.Feedback)
+		device.send_command(second, CommandPriority.Feedback)
+
+		# Raised to Feedback, and still ahead of the Feedback command queued after the first buzzer command
+		self.assertEqual(device.pending_priority, CommandPriority.Feedback)
+		self.assertEqual([device.get_next_command_data() for _ in range(3)], [second, feedback, normal])
+		self.assertEqual(device.command_queue_statistics.sent, {CommandPriority.Feedback: 2, CommandPriority.Normal: 1})
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for OSDP device discovery"""
+
+import binascii
+import logging
+import os
+import sys
+import unittest
+from datetime import timedelta
+
+from puppet_connection import PuppetOsdpConnection
+from context import *
+
+log = logging.getLogger('osdp')
+
+
+class ScannedOsdpConnection(PuppetOsdpConnection):
+
+	IDENTIFICATION = bytes.fromhex('5C 26 23 19 02 01 02 03 04 03 00 01')
+	CAPABILITIES = bytes.fromhex('09 01 01 0A 80 00')
+
+	def __init__(self, address: int, use_crc: bool, answers_any_mode: bool = False):
+		super().__init__()
+		self.address = address
+		self.use_crc = use_crc
+		self.answers_any_mode = answers_any_mode
+		self.probed = []
+
+	def write(self, buf: bytes):
+		super().write(buf)
+		frame = buf[1:]
+		address, use_crc, code = frame[1], (frame[4] & 0x04) != 0, frame[5]
+		if code == 0x60:
+			self.probed.append((address, use_crc))
+		if address != self.address or (use_crc != self.use_crc and not self.answers_any_mode):
+			return
+
+		reply_type, data = {
+			0x60: (0x40, b''),
+			0x61: (0x45, self.IDENTIFICATION),
+			0x62: (0x46, self.CAPABILITIES)
+		}[code]
+		self.should_reply = self.reply_frame((frame[4] & 0x03) | (0x04 if self.use_crc else 0x00), reply_type, data)
+
+	def read(self, size: int = 1) -> bytes:
+		taken = self.should_reply[:size]
+		self.should_reply = self.should_reply[size:]
+		return taken
+
+	def reply_frame(self, control: int, reply_type: int, data: bytes) -> bytes:
+		length = 8 + len(data) if self.use_crc else 7 + len(data)
+		frame = bytearray([0x53, self.address | 0x80]) + length.to_bytes(2, byteorder='little')
+		frame += bytes([control, reply_type]) + data
+		if self.use_crc:
+			frame += binascii.crc_hqx(bytes(frame), 0x1D0F).to_bytes(2, byteorder='little')
+		else:
+			frame.append((-sum(frame)) & 0xFF)
+		return bytes(frame)
+
+
+class LostOsdpConnection(ScannedOsdpConnection):
+
+	def write(self, buf: bytes):
+		raise ConnectionResetError("Connection reset by peer")
+
+
+class DiscoveryTestCase(unittest.TestCase):
+
+	"""Test device discovery for OSDP Python Module."""
+
+	def setUp(self):
+		"""Setup."""
+
+	def tearDown(self):
+		"""Teardown."""
+
+	def scan(self, connection: ScannedOsdpConnection, addresses) -> AddressScan:
+		connection.open()
+		bus = Bus(connection=connection, on_reply_received=None)
+		bus.add_device(address=0x01, use_crc=True, use_secure_channel=False)
+		scan = AddressScan(addresses, timedelta(milliseconds=10), addresses_per_pass=2)
+		bus.start_scan(scan)
+		with self.assertRaises(RuntimeError):
+			bus.start_scan(AddressScan())
+		while not scan.is_complete:
+			bus.scan_step()
+		return scan
+
+	def test_discover_crc_device(self):
+		connection = ScannedOsdpConnection(address=0x05, use_crc=True)
+		scan = self.scan(connection, range(0x08))
+
+		self.assertEqual(len(scan.discovered), 1)
+		discovered = scan.discovered[0]
+		self.assertEqual(discovered.address, 0x05)
+		self.assertTrue(discovered.use_crc)
+		self.assertTrue(discovered.supports_secure_channel)
+		self.assertEqual(discovered.identification.serial_number, 0x04030201)
+
+		# The configured address is skipped, others are tried with CRC then checksum
+		probed_addresses = [address for address, _ in connection.probed]
+		self.assertNotIn(0x01, probed_addresses)
+		self.assertEqual(connection.probed.count((0x05, True)), 1)
+		self.assertNotIn((0x05, False), connection.probed)
+		self.assertIn((0x06, False), connection.probed)
+
+	def test_discover_checksum_device(self):
+		connection = ScannedOsdpConnection(address=0x02, use_crc=False)
+		scan = self.scan(connection, range(0x04))
+
+		self.assertEqual([discovered.address for discovered in scan.discovered], [0x02])
+		self.assertFalse(scan.discovered[0].use_crc)
+		self.assertEqual(scan.discovered[0].capabilities.capabilities[0].function, CapabilityFunction.CommunicationSecurity)
+
+	def test_discover_mode_of_reply(self):
+		# Answers a CRC probe in checksum mode
+		connection = ScannedOsdpConnection(address=0x03, use_crc=False, answers_any_mode=True)
+		scan = self.scan(connection, range(0x02, 0x04))
+
+		self.assertEqual([discovered.address for discovered in scan.discovered], [0x03])
+		self.assertFalse(scan.discovered[0].use_crc)
+		self.assertEqual(scan.discovered[0].identification.serial_number, 0x04030201)
+		self.assertNotIn((0x03, False), connection.probed)
+
+	def test_discover_checksum_only_device(self):
+		simulator = DeviceSimulator([SimulatedDevice(address=0x02, supports_crc=False)])
+		connection = SimulatedOsdpConnection(simulator)
+		try:
+			scan = self.scan(connection, range(0x04))
+		finally:
+			simulator.close()
+
+		# The CRC probe is NAKed, the checksum one is answered
+		self.assertEqual([discovered.address for discovered in scan.discovered], [0x02])
+		self.assertFalse(scan.discovered[0].use_crc)
+		self.assertEqual(scan.discovered[0].identification.serial_number, 0x02)
+
+	def test_control_panel_discovery(self):
+		connection = ScannedOsdpConnection(address=0x7E, use_crc=True)
+		control_panel = ControlPanel()
+		connection_id = control_panel.start_connection(connection)
+		try:
+			discovered = control_panel.discover_devices(connection_id, range(0x7C, 0x7F), timeout=5.0)
+		finally:
+			control_panel.shutdown()
+
+		self.assertEqual([device.address for device in discovered], [0x7E])
+		self.assertEqual(discovered[0].identification.vendor_code, bytes.fromhex('5C 26 23'))
+
+	def test_discovery_after_timeout(self):
+		connection = ScannedOsdpConnection(address=0x7E, use_crc=True)
+		control_panel = ControlPanel()
+		connection_id = control_panel.start_connection(connection)
+		try:
+			with self.assertRaises(TimeoutError):
+				control_panel.discover_devices(connection_id, timeout=0.01)
+			# The expired scan is stopped, so another one can start
+			discovered = control_panel.discover_devices(connection_id, range(0x7C, 0x7F), timeout=5.0)
+		finally:
+			control_panel.shutdown()
+
+		self.assertEqual([device.address for device in discovered], [0x7E])
+
+	def test_scan_cancelled_on_close(self):
+		connection = ScannedOsdpConnection(address=0x05, use_crc=True)
+		connection.open()
+		bus = Bus(connection=connection, on_reply_received=None)
+		scan = AddressScan(range(0x08), timedelta(milliseconds=10), addresses_per_pass=2)
+		bus.start_scan(scan)
+		bus.scan_step()
+		bus.close()
+
+		self.assertTrue(scan.is_complete)
+		self.assertEqual(scan.remaining, 0)
+		bus.start_scan(AddressScan())
+
+	def test_probe_connection_error_logged_at_debug(self):
+		connection = LostOsdpConnection(address=0x05, use_crc=True)
+		connection.open()
+		bus = Bus(connection=connection, on_reply_received=None)
+		bus.start_scan(AddressScan(range(0x08), timedelta(milliseconds=10)))
+		level = log.level
+		log.setLevel(logging.DEBUG)
+		try:
+			with self.assertLogs('osdp', logging.DEBUG) as logs:
+				bus.scan_step()
+		finally:
+			log.setLevel(level)
+
+		self.assertTrue(logs.records)
+		self.assertTrue(all(record.levelno == logging.DEBUG for record in logs.records))
+
+
+if __name__ == '__main__':
+	unittest.main()
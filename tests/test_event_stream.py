@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for OSDP reply event streams"""
+
+import asyncio
+import logging
+import os
+import sys
+import unittest
+from datetime import datetime
+from threading import Thread
+from uuid import uuid4
+
+from context import *
+
+log = logging.getLogger('osdp')
+
+
+class EventStreamTestCase(unittest.TestCase):
+
+	"""Test reply event streams for OSDP Python Module."""
+
+	def setUp(self):
+		"""Setup."""
+		self.connection_id = uuid4()
+
+	def tearDown(self):
+		"""Teardown."""
+
+	def event(self, address: int) -> ReplyEvent:
+		return ReplyEvent(self.connection_id, address, ReplyType.KeypadData, None)
+
+	def test_drop_oldest(self):
+		stream = EventStream(max_size=2)
+		for address in range(4):
+			self.assertTrue(stream.put(self.event(address)))
+		stream.close()
+
+		self.assertEqual([event.address for event in stream], [2, 3])
+		self.assertEqual(stream.published_count, 4)
+		self.assertEqual(stream.dropped_count, 2)
+		self.assertEqual(stream.high_water_mark, 2)
+
+	def test_drop_newest(self):
+		stream = EventStream(max_size=2, overflow_policy=OverflowPolicy.DropNewest)
+		self.assertEqual([stream.put(self.event(address)) for address in range(3)], [True, True, False])
+		stream.close()
+
+		self.assertEqual([event.address for event in stream], [0, 1])
+		self.assertEqual(stream.dropped_count, 1)
+
+	def test_block_until_consumed(self):
+		stream = EventStream(max_size=1, overflow_policy=OverflowPolicy.Block)
+		stream.put(self.event(0))
+
+		publisher = Thread(target=stream.put, args=(self.event(1),))
+		publisher.start()
+		self.assertEqual(stream.get(timeout=1.0).address, 0)
+		publisher.join(1.0)
+		self.assertFalse(publisher.is_alive())
+		self.assertEqual(stream.get(timeout=1.0).address, 1)
+		self.assertEqual(stream.dropped_count, 0)
+
+		stream.put(self.event(2))
+		stream.block_timeout = 0.01
+		self.assertFalse(stream.put(self.event(3)))
+		self.assertEqual(stream.dropped_count, 1)
+
+	def test_async_iterator(self):
+		stream = EventStream()
+
+		async def consume():
+			return [event.address async for event in stream]
+
+		def publish():
+			for address in range(3):
+				stream.put(self.event(address))
+			stream.close()
+
+		async def run():
+			consumer = asyncio.ensure_future(consume())
+			await asyncio.sleep(0)
+			Thread(target=publish).start()
+			return await asyncio.wait_for(consumer, 1.0)
+
+		loop = asyncio.new_event_loop()
+		try:
+			self.assertEqual(loop.run_until_complete(run()), [0, 1, 2])
+		finally:
+			loop.close()
+
+	def test_control_panel_events(self):
+		cp = ControlPanel()
+		stream = cp.events(event_types=[ReplyType.RawReaderData])
+		device = Device(address=0x7F, use_crc=False, use_secure_channel=False)
+		for data in ('53 FF 0F 00 02 50 FF 01 1A 00 CD 22 C7 16 67', '53 FF 07 00 01 40 66'):
+			reply = Reply.parse(bytes.fromhex(data), self.connection_id, PollCommand(address=0x7F), device)
+			cp.on_reply_received(reply)
+
+		event = stream.get(timeout=1.0)
+		self.assertEqual(event.connection_id, self.connection_id)
+		self.assertEqual(event.address, 0x7F)
+		self.assertEqual(event.type, ReplyType.RawReaderData)
+		self.assertEqual(event.data.bit_count, 26)
+		self.assertEqual(len(stream), 0)
+
+		cp.shutdown()
+		self.assertTrue(stream.is_closed)
+		self.assertIsNone(stream.get(timeout=1.0))
+
+	def test_control_panel_skips_decoding_without_consumers(self):
+		cp = ControlPanel()
+		device = Device(address=0x7F, use_crc=False, use_secure_channel=False)
+		data = bytes.fromhex('53 FF 0F 00 02 50 FF 01 1A 00 CD 22 C7 16 67')
+		level = log.level
+		log.setLevel(logging.INFO)
+		try:
+			reply = Reply.parse(data, self.connection_id, PollCommand(address=0x7F), device)
+			cp.on_reply_received(reply)
+			self.assertIsNone(reply._decoded_data)
+
+			stream = cp.events(event_types=[ReplyType.KeypadData])
+			cp.on_reply_received(reply)
+			self.assertIsNone(reply._decoded_data)
+
+			stream = cp.events(event_types=[ReplyType.RawReaderData])
+			cp.on_reply_received(reply)
+			self.assertIsNone(reply._decoded_data)
+			self.assertEqual(stream.get(timeout=1.0).data.bit_count, 26)
+			self.assertIsNotNone(reply._decoded_data)
+		finally:
+			log.setLevel(level)
+
+	def test_control_panel_calls_instance_handler(self):
+		cp = ControlPanel()
+		device = Device(address=0x7F, use_crc=False, use_secure_channel=False)
+		data = bytes.fromhex('53 FF 0F 00 02 50 FF 01 1A 00 CD 22 C7 16 67')
+		received = []
+		cp.on_raw_card_data_reply_received = lambda address, raw_card_data: received.append((address, raw_card_data))
+		level = log.level
+		log.setLevel(logging.INFO)
+		try:
+			cp.on_reply_received(Reply.parse(data, self.connection_id, PollCommand(address=0x7F), device))
+		finally:
+			log.setLevel(level)
+
+		self.assertEqual(len(received), 1)
+		self.assertEqual(received[0][0], 0x7F)
+		self.assertEqual(received[0][1].bit_count, 26)
+
+	def test_device_status_events(self):
+		changes = []
+		bus = Bus(connection=None, on_reply_received=None, on_device_status_changed=lambda *change: changes.append(change))
+		device = bus.add_device(address=0x7F, use_crc=False, use_secure_channel=False)
+
+		bus.update_device_status(device)
+		self.assertEqual(changes, [])
+		device.valid_reply_has_been_received()
+		bus.update_device_status(device)
+		bus.update_device_status(device)
+		self.assertEqual(changes, [(bus.id, 0x7F, True)])
+		device._last_valid_reply = datetime.min
+		bus.update_device_status(device)
+		self.assertEqual(changes[1:], [(bus.id, 0x7F, False)])
+
+		cp = ControlPanel()
+		stream = cp.events(event_types=[DeviceStatus.Offline])
+		cp._device_status_changed(self.connection_id, 0x7F, True)
+		cp._device_status_changed(self.connection_id, 0x7F, False)
+		event = stream.get(timeout=1.0)
+		self.assertIsInstance(event, DeviceStatusEvent)
+		self.assertEqual((event.address, event.type), (0x7F, DeviceStatus.Offline))
+		self.assertEqual(len(stream), 0)
+
+
+if __name__ == '__main__':
+	unittest.main()
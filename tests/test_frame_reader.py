@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for OSDP frame reader"""
+
+import os
+import sys
+import unittest
+
+from puppet_connection import PuppetOsdpConnection
+from context import *
+
+
+class FrameReaderTestCase(unittest.TestCase):
+
+	"""Test frame reader for OSDP Python Module."""
+
+	def setUp(self):
+		"""Setup."""
+
+	def tearDown(self):
+		"""Teardown."""
+
+	def test_split_frames(self):
+		reader = FrameReader()
+		reader.feed(bytes.fromhex('00 FF 53 FF 07 00 01 40 66 53 FF 0D 00 02 53 FF 04'))
+
+		self.assertEqual(reader.next_frame().hex().upper(), '53FF0700014066')
+		self.assertIsNone(reader.next_frame())
+		self.assertEqual(reader.buffered, 8)
+		self.assertEqual(reader.bytes_needed, 5)
+
+		reader.feed(bytes.fromhex('31 32 33 34 7F'))
+		self.assertEqual(reader.next_frame().hex().upper(), '53FF0D000253FF04313233347F')
+		self.assertIsNone(reader.next_frame())
+		self.assertEqual(reader.buffered, 0)
+
+	def test_resynchronize_on_bad_length(self):
+		reader = FrameReader()
+		reader.feed(bytes.fromhex('53 00 01 00 53 FF 07 00 01 40 66'))
+
+		self.assertEqual(reader.next_frame().hex().upper(), '53FF0700014066')
+
+	def test_timeout_message(self):
+		reader = FrameReader()
+		self.assertEqual(reader.timeout_message, "Timeout waiting for reply message")
+
+		reader.feed(bytes.fromhex('53 FF'))
+		self.assertIsNone(reader.next_frame())
+		self.assertEqual(reader.timeout_message, "Timeout waiting for reply message length")
+
+		reader.feed(bytes.fromhex('07 00'))
+		self.assertIsNone(reader.next_frame())
+		self.assertEqual(reader.timeout_message, "Timeout waiting for rest of reply message")
+
+	def test_skip_other_addresses(self):
+		reader = FrameReader()
+		reader.feed(bytes.fromhex('53 81 07 00 01 40 66 53 FF 07 00 01 40 66 53 82 07'))
+
+		self.assertEqual(reader.next_frame(0x7F).hex().upper(), '53FF0700014066')
+		self.assertIsNone(reader.next_frame(0x7F))
+		self.assertEqual(reader.buffered, 3)
+
+	def test_bus_discards_leftover_frames(self):
+		connection = PuppetOsdpConnection()
+		connection.open()
+
+		bus = Bus(connection=connection, on_reply_received=None)
+		device = bus.add_device(address=0x7F, use_crc=False, use_secure_channel=False)
+		device.message_control.increment_sequence()
+
+		# A frame read past the end of the last reply is not taken as the reply to the next command
+		bus._frame_reader.feed(bytes.fromhex('53 FF 07 00 01 40 66'))
+		with self.assertRaises(TimeoutError):
+			bus.send_command_and_receive_reply(bytearray([Bus.DRIVER_BYTE]), PollCommand(address=0x7F), device)
+		self.assertEqual(bus._frame_reader.buffered, 0)
+
+		connection.reply = bytes.fromhex('53 FF 07 00 01 40 66')
+		reply = bus.send_command_and_receive_reply(bytearray([Bus.DRIVER_BYTE]), PollCommand(address=0x7F), device)
+		self.assertEqual(reply.type, ReplyType.Ack)
+
+
+if __name__ == '__main__':
+	unittest.main()
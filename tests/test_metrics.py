@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for OSDP bus metrics"""
+
+import logging
+import os
+import sys
+import unittest
+
+from puppet_connection import PuppetOsdpConnection
+from context import *
+
+log = logging.getLogger('osdp')
+
+
+class MetricsTestCase(unittest.TestCase):
+
+	"""Test bus metrics for OSDP Python Module."""
+
+	def setUp(self):
+		"""Setup."""
+		self.metrics = MetricsRegistry()
+		self.connection = PuppetOsdpConnection()
+		self.connection.open()
+		self.bus = Bus(connection=self.connection, on_reply_received=None, metrics=self.metrics)
+		self.device = self.bus.add_device(address=0x7F, use_crc=False, use_secure_channel=False)
+
+	def tearDown(self):
+		"""Teardown."""
+
+	def test_histogram(self):
+		histogram = Histogram(buckets=(0.1, 1.0))
+		for value in (0.05, 0.1, 0.5, 2.0):
+			histogram.observe(value)
+
+		self.assertEqual(histogram.bucket_counts, [2, 1, 1])
+		self.assertEqual(histogram.cumulative_counts(), [2, 3, 4])
+		self.assertEqual(histogram.count, 4)
+		self.assertAlmostEqual(histogram.sum, 2.65)
+
+	def test_prometheus_text(self):
+		metrics = MetricsRegistry(buckets=(0.5,))
+		metrics.observe('osdp_reply_seconds', 0.25, (('address', '1'),))
+		metrics.increment('osdp_reply_timeouts_total', (('address', '1'),))
+
+		self.assertEqual(metrics.prometheus_text(), '\n'.join([
+			'# TYPE osdp_reply_seconds histogram',
+			'osdp_reply_seconds_bucket{address="1",le="0.5"} 1',
+			'osdp_reply_seconds_bucket{address="1",le="+Inf"} 1',
+			'osdp_reply_seconds_sum{address="1"} 0.25',
+			'osdp_reply_seconds_count{address="1"} 1',
+			'# TYPE osdp_reply_timeouts_total counter',
+			'osdp_reply_timeouts_total{address="1"} 1',
+		]) + '\n')
+
+	def test_exchange_timings(self):
+		self.connection.should_reply = bytes.fromhex('53 FF 13 00 03 45 A4 D9 A4 03 FF 33 00 01 70 03 00 02 87')
+		command = IdReportCommand(address=0x7F)
+		self.bus.send_command_and_receive_reply(bytearray([Bus.DRIVER_BYTE]), command, self.device)
+
+		labels = self.bus.metric_labels(self.device)
+		command_labels = labels + (('command', 'IdReportCommand'),)
+		for name in ('osdp_command_build_seconds', 'osdp_reply_first_byte_seconds', 'osdp_reply_seconds'):
+			self.assertEqual(self.metrics.histogram(name, command_labels).count, 1)
+		for name in ('osdp_command_write_seconds', 'osdp_reply_parse_seconds'):
+			self.assertEqual(self.metrics.histogram(name, labels).count, 1)
+
+		reply_seconds = self.metrics.histogram('osdp_reply_seconds', command_labels).sum
+		first_byte_seconds = self.metrics.histogram('osdp_reply_first_byte_seconds', command_labels).sum
+		self.assertLessEqual(first_byte_seconds, reply_seconds)
+
+	def test_timeouts_and_security_resets(self):
+		with self.assertRaises(TimeoutError):
+			self.bus.send_command_and_receive_reply(bytearray([Bus.DRIVER_BYTE]), PollCommand(address=0x7F), self.device)
+
+		nak = Reply.parse(bytes.fromhex('53 FF 08 00 01 41 05 5F'), self.bus.id, PollCommand(address=0x7F), self.device)
+		self.bus.process_reply(nak, self.device)
+
+		labels = self.bus.metric_labels(self.device)
+		self.assertEqual(self.metrics.counter('osdp_reply_timeouts_total', labels), 1)
+		self.assertEqual(self.metrics.counter('osdp_security_resets_total', labels), 1)
+
+	def test_disabled_by_default(self):
+		bus = Bus(connection=self.connection, on_reply_received=None)
+		device = bus.add_device(address=0x7F, use_crc=False, use_secure_channel=False)
+		self.connection.should_reply = bytes.fromhex('53 FF 07 00 01 40 66')
+		bus.send_command_and_receive_reply(bytearray([Bus.DRIVER_BYTE]), PollCommand(address=0x7F), device)
+		self.assertIsNone(bus._first_byte_time)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for OSDP poll schedulers"""
+
+import logging
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from context import *
+
+log = logging.getLogger('osdp')
+
+
+class PollSchedulerTestCase(unittest.TestCase):
+
+	"""Test poll schedulers for OSDP Python Module."""
+
+	def setUp(self):
+		"""Setup."""
+		self.idle_line_delay = timedelta(milliseconds=166)
+
+	def tearDown(self):
+		"""Teardown."""
+
+	def parse_reply(self, device, data: str):
+		return Reply.parse(bytes.fromhex(data), uuid4(), PollCommand(address=0x7F), device)
+
+	def test_fixed_scheduler(self):
+		scheduler = FixedPollScheduler()
+		device = Device(address=0x7F, use_crc=False, use_secure_channel=False)
+
+		self.assertTrue(scheduler.should_poll(device))
+		self.assertEqual(scheduler.delay_before_cycle(datetime.min), timedelta(seconds=0))
+		self.assertGreater(scheduler.delay_before_cycle(datetime.now()), timedelta(milliseconds=90))
+
+		reply = self.parse_reply(device, '53 FF 0F 00 02 50 FF 01 1A 00 CD 22 C7 16 67')
+		self.assertEqual(scheduler.delay_after_reply(device, reply, self.idle_line_delay), self.idle_line_delay)
+
+	def test_adaptive_scheduler_polls_again_after_data(self):
+		scheduler = AdaptivePollScheduler(target_cycle_time=timedelta(seconds=1))
+		device = Device(address=0x7F, use_crc=False, use_secure_channel=False)
+		device.valid_reply_has_been_received()
+
+		self.assertEqual(scheduler.delay_before_cycle(datetime.min), timedelta(seconds=0))
+
+		reply = self.parse_reply(device, '53 FF 0F 00 02 50 FF 01 1A 00 CD 22 C7 16 67')
+		self.assertEqual(scheduler.delay_after_reply(device, reply, self.idle_line_delay), timedelta(seconds=0))
+		self.assertEqual(scheduler.delay_before_cycle(datetime.now()), timedelta(seconds=0))
+
+		reply = self.parse_reply(device, '53 FF 07 00 01 40 66')
+		self.assertEqual(scheduler.delay_after_reply(device, reply, self.idle_line_delay), self.idle_line_delay)
+		self.assertGreater(scheduler.delay_before_cycle(datetime.now()), timedelta(milliseconds=900))
+
+	def test_adaptive_scheduler_queued_command(self):
+		scheduler = AdaptivePollScheduler()
+		device = Device(address=0x7F, use_crc=False, use_secure_channel=False)
+		device.valid_reply_has_been_received()
+		device.send_command(IdReportCommand(address=0x7F))
+
+		reply = self.parse_reply(device, '53 FF 07 00 01 40 66')
+		self.assertEqual(scheduler.delay_after_reply(device, reply, self.idle_line_delay), timedelta(seconds=0))
+
+	def test_adaptive_scheduler_offline_device(self):
+		scheduler = AdaptivePollScheduler(offline_poll_interval=timedelta(seconds=10))
+		device = Device(address=0x7F, use_crc=False, use_secure_channel=False)
+
+		self.assertFalse(device.is_online)
+		self.assertTrue(scheduler.should_poll(device))
+		self.assertFalse(scheduler.should_poll(device))
+
+		device.valid_reply_has_been_received()
+		self.assertTrue(scheduler.should_poll(device))
+
+	def test_adaptive_scheduler_prioritizes_secure_channel_establishment(self):
+		scheduler = AdaptivePollScheduler()
+		established = Device(address=0x01, use_crc=False, use_secure_channel=False)
+		establishing = Device(address=0x02, use_crc=False, use_secure_channel=True)
+		established.valid_reply_has_been_received()
+		establishing.valid_reply_has_been_received()
+
+		self.assertTrue(establishing.is_establishing_secure_channel)
+		self.assertEqual(scheduler.poll_order([established, establishing]), [establishing, established])
+		self.assertIsInstance(establishing.get_next_command_data(), SecurityInitializationRequestCommand)
+
+		reply = self.parse_reply(establishing, '53 FF 07 00 01 40 66')
+		self.assertEqual(scheduler.delay_after_reply(establishing, reply, self.idle_line_delay), timedelta(seconds=0))
+		self.assertEqual(scheduler.delay_before_cycle(datetime.now()), timedelta(seconds=0))
+
+		scheduler = AdaptivePollScheduler(prioritize_secure_channel_establishment=False)
+		self.assertEqual(scheduler.poll_order([established, establishing]), [established, establishing])
+
+	def test_adaptive_scheduler_offline_backoff(self):
+		scheduler = AdaptivePollScheduler(
+			offline_poll_interval=timedelta(seconds=1), max_offline_poll_interval=timedelta(seconds=3)
+		)
+		first = Device(address=0x01, use_crc=False, use_secure_channel=False)
+		second = Device(address=0x02, use_crc=False, use_secure_channel=False)
+
+		def expire_backoff():
+			for address, (_, interval) in scheduler._offline_backoff.items():
+				scheduler._offline_backoff[address] = (datetime.min, interval)
+			scheduler.delay_before_cycle(datetime.now())
+
+		self.assertTrue(scheduler.should_poll(first))
+		self.assertTrue(scheduler.should_poll(second))
+		self.assertEqual(scheduler.offline_poll_interval_for(first), timedelta(seconds=1))
+
+		# Only one offline device is rediscovered per pass
+		expire_backoff()
+		self.assertTrue(scheduler.should_poll(first))
+		self.assertFalse(scheduler.should_poll(second))
+		self.assertEqual(scheduler.offline_poll_interval_for(first), timedelta(seconds=2))
+
+		expire_backoff()
+		self.assertTrue(scheduler.should_poll(second))
+		self.assertFalse(scheduler.should_poll(first))
+
+		expire_backoff()
+		self.assertTrue(scheduler.should_poll(first))
+		self.assertEqual(scheduler.offline_poll_interval_for(first), timedelta(seconds=3))
+
+		first.valid_reply_has_been_received()
+		self.assertTrue(scheduler.should_poll(first))
+		self.assertIsNone(scheduler.offline_poll_interval_for(first))
+
+	def test_poll_statistics(self):
+		statistics = PollStatistics()
+		start = datetime.now()
+		statistics.cycle_started(start)
+		statistics.cycle_started(start + timedelta(milliseconds=100))
+		statistics.cycle_started(start + timedelta(milliseconds=300))
+
+		self.assertEqual(statistics.cycle_count, 2)
+		self.assertEqual(statistics.last_cycle_time, timedelta(milliseconds=200))
+		self.assertEqual(statistics.min_cycle_time, timedelta(milliseconds=100))
+		self.assertEqual(statistics.max_cycle_time, timedelta(milliseconds=200))
+
+
+if __name__ == '__main__':
+	unittest.main()
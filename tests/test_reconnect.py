@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for reconnecting OSDP connections"""
+
+import logging
+import os
+import sys
+import time
+import unittest
+from datetime import timedelta
+
+from context import *
+
+log = logging.getLogger('osdp')
+
+
+class FlakyOsdpConnection(SimulatedOsdpConnection):
+
+	def __init__(self, simulator: DeviceSimulator, failed_opens: int):
+		super().__init__(simulator)
+		self.failed_opens = failed_opens
+		self.open_times = []
+
+	def open(self):
+		self.open_times.append(time.time())
+		if len(self.open_times) <= self.failed_opens:
+			raise ConnectionRefusedError("Serial server refused the connection")
+		super().open()
+
+
+class ReconnectTestCase(unittest.TestCase):
+
+	"""Test reconnecting connections for OSDP Python Module."""
+
+	def setUp(self):
+		"""Setup."""
+		self.simulator = DeviceSimulator([SimulatedDevice(0x01)])
+		self.control_panel = ControlPanel()
+
+	def tearDown(self):
+		"""Teardown."""
+		self.control_panel.shutdown()
+		self.simulator.close()
+
+	def test_backoff(self):
+		policy = ReconnectPolicy(timedelta(milliseconds=100), timedelta(seconds=1), jitter=0.0)
+		self.assertEqual(policy.delay_for(0), timedelta(0))
+		self.assertEqual(
+			[policy.delay_for(failures).total_seconds() for failures in range(1, 6)], [0.1, 0.2, 0.4, 0.8, 1.0]
+		)
+		self.assertEqual(policy.delay_for(10000), timedelta(seconds=1))
+
+		policy.jitter = 0.5
+		delays = [policy.delay_for(3).total_seconds() for _ in range(100)]
+		self.assertTrue(all(0.2 <= delay <= 0.4 for delay in delays))
+		self.assertGreater(len(set(delays)), 1)
+
+	def test_reconnect_events(self):
+		connection = FlakyOsdpConnection(self.simulator, failed_opens=4)
+		stream = self.control_panel.events(event_types=(ConnectionStatus.Connected, ConnectionStatus.Disconnected))
+		policy = ReconnectPolicy(timedelta(milliseconds=20), timedelta(milliseconds=100), jitter=0.0)
+
+		with self.assertLogs('osdp', level='WARNING') as logs:
+			connection_id = self.control_panel.start_connection(connection, reconnect_policy=policy)
+			self.control_panel.add_device(connection_id, 0x01, True, False)
+			self.assertEqual(stream.get(timeout=5.0).type, ConnectionStatus.Connected)
+
+		# The first failure is logged, the next ones within the log interval are not
+		self.assertEqual(len(logs.output), 1)
+		self.assertEqual(len(connection.open_times), 5)
+		gaps = [later - earlier for earlier, later in zip(connection.open_times, connection.open_times[1:])]
+		self.assertGreater(gaps[2], gaps[0] * 1.5)
+		self.assertTrue(self.control_panel.is_connected(connection_id))
+
+		deadline = time.time() + 5.0
+		while not self.control_panel.is_online(connection_id, 0x01) and time.time() < deadline:
+			time.sleep(0.01)
+		# Lost from under the bus, as when a serial server drops the link
+		connection.close()
+		event = stream.get(timeout=5.0)
+		self.assertEqual((event.connection_id, event.type), (connection_id, ConnectionStatus.Disconnected))
+		self.assertEqual(stream.get(timeout=5.0).type, ConnectionStatus.Connected)
+		self.assertEqual(self.control_panel.id_report(connection_id, 0x01).serial_number, 0x01)
+
+	def test_tcp_client_reopens(self):
+		port = self.simulator.serve_tcp()
+		connection = TcpClientOsdpConnection('127.0.0.1', port, read_timeout=0.5)
+		for _ in range(2):
+			connection.open()
+			self.assertTrue(connection.is_open)
+			connection.close()
+			self.assertFalse(connection.is_open)
+
+		self.simulator.close()
+		with self.assertRaises(OSError):
+			connection.open()
+		self.assertFalse(connection.is_open)
+		with self.assertRaises(ConnectionError):
+			connection.write(bytes([0xFF]))
+
+
+if __name__ == '__main__':
+	unittest.main()
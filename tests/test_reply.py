@@ -161,5 +161,33 @@ class ReplyTestCase(unittest.TestCase):
 		device.message_control.increment_sequence()
 		self.assertEqual(device.message_control.sequence, 3)
 
+	def test_reply_data_view(self):
+		bus_id = uuid4()
+		device = Device(address=0x7F, use_crc=True, use_secure_channel=False)
+
+		command = PollCommand(address=0x7F)
+		data = bytearray.fromhex('53FF0E000553FF043132333481B6')
+		reply = Reply.parse(data, bus_id, command, device)
+		self.assertIsInstance(reply.reply_data_view, memoryview)
+		self.assertEqual(reply.reply_data_view.hex().upper(), 'FF0431323334')
+		self.assertIsInstance(reply.extract_reply_data, bytes)
+		self.assertIsInstance(reply.message_for_mac_generation, bytes)
+
+		keypad_data = KeypadData.parse_data(reply)
+		self.assertIsInstance(keypad_data.data, bytes)
+
+		data[8] = 0x00
+		self.assertEqual(reply.reply_data_view.hex().upper(), 'FF0400323334')
+
+	def test_decoded_data_is_lazy_and_cached(self):
+		device = Device(address=0x7F, use_crc=True, use_secure_channel=False)
+		reply = Reply.parse(bytes.fromhex('53FF0E000553FF043132333481B6'), uuid4(), PollCommand(address=0x7F), device)
+		self.assertIsNone(reply._decoded_data)
+
+		keypad_data = reply.decoded_data
+		self.assertIsInstance(keypad_data, KeypadData)
+		self.assertEqual(keypad_data.data, b'1234')
+		self.assertIs(reply.decoded_data, keypad_data)
+
 if __name__ == '__main__':
 	unittest.main()
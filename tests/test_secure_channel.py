@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for OSDP secure channel"""
+
+import os
+import sys
+import unittest
+
+from Crypto.Cipher import AES
+
+from context import *
+
+
+class SecureChannelTestCase(unittest.TestCase):
+
+	"""Test secure channel for OSDP Python Module."""
+
+	def setUp(self):
+		"""Setup."""
+		self.secure_channel = SecureChannel(master_key=bytes(range(16)))
+		self.secure_channel.cuid = bytes.fromhex('A4D9A403FF330001')
+		self.enc = self.initialize(self.secure_channel, self.secure_channel.calculate_scbk())
+		self.secure_channel.establish(bytes(range(16, 32)))
+
+	@staticmethod
+	def session_key(scbk: bytes, key_type: int, server_random_number: bytes) -> bytes:
+		return AES.new(scbk, AES.MODE_ECB).encrypt(bytes([0x01, key_type]) + server_random_number[:6] + bytes(8))
+
+	def initialize(self, secure_channel: SecureChannel, scbk: bytes) -> bytes:
+		server_random_number = secure_channel.server_random_number
+		client_random_number = bytes(range(8))
+
+		enc = self.session_key(scbk, 0x82, server_random_number)
+		client_cryptogram = AES.new(enc, AES.MODE_ECB).encrypt(server_random_number + client_random_number)
+
+		secure_channel.initialize(secure_channel.cuid, client_random_number, client_cryptogram)
+		return enc
+
+	def tearDown(self):
+		"""Teardown."""
+
+	def test_mac_of_full_blocks(self):
+		message = bytes(range(32))
+		expected = AES.new(self.secure_channel._smac1, AES.MODE_CBC, bytes(range(16, 32))).encrypt(message)[-16:]
+		self.assertEqual(self.secure_channel.generate_mac(message, True), expected)
+
+	def test_mac_of_partial_block(self):
+		message = bytes(range(20))
+		iv = AES.new(self.secure_channel._smac1, AES.MODE_CBC, bytes(range(16, 32))).encrypt(message[:16])
+		expected = AES.new(self.secure_channel._smac2, AES.MODE_CBC, iv).encrypt(message[16:] + b'\x80' + bytes(11))
+		self.assertEqual(self.secure_channel.generate_mac(memoryview(message), True), expected)
+
+	def test_encrypt_decrypt(self):
+		data = bytes(range(40))
+		self.secure_channel.generate_mac(b'\x53\x7F', True)
+		self.secure_channel.generate_mac(b'\x53\xFF', False)
+
+		encrypted = self.secure_channel.encrypt_data(data)
+		iv = bytes([(~b) & 0xFF for b in self.secure_channel._rmac])
+		padded = data + b'\x80' + bytes(7)
+		self.assertEqual(encrypted, AES.new(self.enc, AES.MODE_CBC, iv).encrypt(padded))
+
+		iv = bytes([(~b) & 0xFF for b in self.secure_channel._cmac])
+		encrypted = AES.new(self.enc, AES.MODE_CBC, iv).encrypt(padded)
+		self.assertEqual(self.secure_channel.decrypt_data(memoryview(encrypted)), data)
+
+	def test_cached_ciphers_match_cbc(self):
+		def cbc_mac(smac1: bytes, smac2: bytes, message: bytes, iv: bytes) -> bytes:
+			full_length = len(message) - len(message) % 16
+			mac = bytes(16)
+			if full_length > 0:
+				mac = iv = AES.new(smac1, AES.MODE_CBC, iv).encrypt(message[:full_length])[-16:]
+			if full_length < len(message):
+				padded = message[full_length:] + b'\x80' + bytes(15 - len(message) % 16)
+				mac = AES.new(smac2, AES.MODE_CBC, iv).encrypt(padded)
+			return mac
+
+		channel = SecureChannel(master_key=None)
+		channel.cuid = bytes.fromhex('A4D9A403FF330001')
+		# Sessions with derived and default keys, each replacing the key schedules of the one before
+		for master_key in (bytes(range(16)), bytes(range(16, 32)), None, bytes(range(16))):
+			channel.master_key = master_key
+			channel.select_scbk(0x01 if master_key is not None else 0x00)
+			channel.reset()
+			scbk = channel.calculate_scbk() if master_key is not None else SecureChannel.default_secure_channel_key
+			enc = self.initialize(channel, scbk)
+			smac1 = self.session_key(scbk, 0x01, channel.server_random_number)
+			smac2 = self.session_key(scbk, 0x02, channel.server_random_number)
+			rmac = bytes(reversed(range(16)))
+			channel.establish(rmac)
+			cmac = None
+
+			for length in (1, 15, 16, 17, 31, 32, 40):
+				message = bytes((scbk[i % 16] + i) & 0xFF for i in range(length))
+				cmac = cbc_mac(smac1, smac2, message, rmac)
+				self.assertEqual(channel.generate_mac(message, True), cmac)
+				rmac = cbc_mac(smac1, smac2, message[::-1], cmac)
+				self.assertEqual(channel.generate_mac(message[::-1], False), rmac)
+
+				padded = message + b'\x80' + bytes(15 - length % 16)
+				iv = bytes([(~b) & 0xFF for b in rmac])
+				self.assertEqual(channel.encrypt_data(message), AES.new(enc, AES.MODE_CBC, iv).encrypt(padded))
+				iv = bytes([(~b) & 0xFF for b in cmac])
+				self.assertEqual(channel.decrypt_data(AES.new(enc, AES.MODE_CBC, iv).encrypt(padded)), message)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for OSDP ShardedControlPanel"""
+
+import logging
+import os
+import sys
+import time
+import unittest
+from uuid import uuid4
+
+from puppet_connection import PuppetOsdpConnection
+from context import *
+
+log = logging.getLogger('osdp')
+
+
+class RecordingControlPanel(ShardedControlPanel):
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self.raw_card_data = DataEvent()
+
+	def on_raw_card_data_reply_received(self, address: int, raw_card_data: RawCardData):
+		self.raw_card_data.set_data((address, raw_card_data))
+
+
+class ShardedControlPanelTestCase(unittest.TestCase):
+
+	"""Test ShardedControlPanel for OSDP Python Module."""
+
+	def setUp(self):
+		"""Setup."""
+		self.id_report_reply = bytes.fromhex('53 FF 13 00 03 45 A4 D9 A4 03 FF 33 00 01 70 03 00 02 87')
+
+	def tearDown(self):
+		"""Teardown."""
+
+	def test_id_report_across_processes(self):
+		cp = ShardedControlPanel(processes=2)
+		try:
+			bus_ids = [cp.start_connection(PuppetOsdpConnection(self.id_report_reply)) for _ in range(2)]
+			for bus_id in bus_ids:
+				cp.add_device(connection_id=bus_id, address=0x7F, use_crc=False, use_secure_channel=False)
+
+			results = cp.send_commands([(bus_id, 0x7F, IdReportCommand) for bus_id in bus_ids], timeout=10.0)
+			replies = [result.reply for result in results]
+			self.assertEqual(len(replies), 2)
+			for reply in replies:
+				self.assertIsNotNone(reply)
+				self.assertIn(reply.connection_id, bus_ids)
+				self.assertEqual(DeviceIdentification.parse_data(reply).serial_number, 1879113779)
+
+			self.assertTrue(cp.is_online(connection_id=bus_ids[0], address=0x7F))
+			self.assertEqual(cp.command_queue_depth(connection_id=bus_ids[0], address=0x7F), 0)
+			statistics = cp.command_queue_statistics(connection_id=bus_ids[0], address=0x7F)
+			self.assertEqual(statistics.sent, {CommandPriority.Diagnostics: 1})
+			self.assertGreater(cp.poll_statistics(connection_id=bus_ids[0]).cycle_count, 0)
+		finally:
+			cp.shutdown()
+
+	def test_reply_events(self):
+		raw_card_data_reply = bytes.fromhex('53 FF 0F 00 02 50 FF 01 1A 00 CD 22 C7 16 67')
+		cp = RecordingControlPanel(processes=1)
+		try:
+			bus_id = cp.start_connection(PuppetOsdpConnection(raw_card_data_reply))
+			cp.add_device(connection_id=bus_id, address=0x7F, use_crc=False, use_secure_channel=False)
+
+			address, raw_card_data = cp.raw_card_data.wait_data(10.0)
+			self.assertEqual(address, 0x7F)
+			self.assertEqual(raw_card_data.bit_count, 26)
+		finally:
+			cp.shutdown()
+
+	def test_unknown_connection(self):
+		cp = ShardedControlPanel(processes=1)
+		try:
+			self.assertFalse(cp.is_online(connection_id=uuid4(), address=0x7F))
+			results = list(cp.send_commands([(uuid4(), 0x7F, IdReportCommand)], timeout=1.0))
+			self.assertIsInstance(results[0].error, KeyError)
+		finally:
+			cp.shutdown()
+
+	def test_unanswered_command_tokens_dropped(self):
+		cp = ShardedControlPanel(processes=1)
+		try:
+			bus_id = cp.start_connection(PuppetOsdpConnection(self.id_report_reply))
+			# The puppet only replies for 0x7F, commands to 0x05 are never answered
+			cp.add_device(connection_id=bus_id, address=0x05, use_crc=False, use_secure_channel=False)
+
+			with self.assertRaises(TimeoutError):
+				cp.send_command(bus_id, IdReportCommand(0x05), timeout=0.5)
+
+			deadline = time.time() + 5.0
+			while cp.issued_command_count(bus_id) != 0 and time.time() < deadline:
+				time.sleep(0.05)
+			self.assertEqual(cp.issued_command_count(bus_id), 0)
+		finally:
+			cp.shutdown()
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the simulated OSDP devices"""
+
+import logging
+import os
+import sys
+import time
+import unittest
+
+from context import *
+
+log = logging.getLogger('osdp')
+
+
+class SimulatorTestCase(unittest.TestCase):
+
+	"""Test simulated devices for OSDP Python Module."""
+
+	def setUp(self):
+		"""Setup."""
+		self.simulator = DeviceSimulator()
+		self.control_panel = ControlPanel(master_key=bytes(range(16)))
+
+	def tearDown(self):
+		"""Teardown."""
+		self.control_panel.shutdown()
+		self.simulator.close()
+
+	def start(self, connection, address: int, use_crc: bool, use_secure_channel: bool):
+		connection_id = self.control_panel.start_connection(connection)
+		self.control_panel.add_device(connection_id, address, use_crc, use_secure_channel)
+		deadline = time.time() + 5.0
+		while not self.control_panel.is_online(connection_id, address) and time.time() < deadline:
+			time.sleep(0.01)
+		return connection_id
+
+	def test_reports(self):
+		self.simulator.add_device(SimulatedDevice(address=0x01, input_count=2))
+		connection_id = self.start(SimulatedOsdpConnection(self.simulator), 0x01, False, False)
+
+		self.assertEqual(self.control_panel.id_report(connection_id, 0x01).serial_number, 0x01)
+		self.assertEqual(self.control_panel.input_status(connection_id, 0x01).statuses, [False, False])
+		capabilities = self.control_panel.device_capabilities(connection_id, 0x01).capabilities
+		self.assertIn(CapabilityFunction.CommunicationSecurity, [capability.function for capability in capabilities])
+
+		output_controls = OutputControls([OutputControl(0x02, OutputControlCode.PermanentStateOnAbortTimedOperation, 0)])
+		self.assertTrue(self.control_panel.output_control(connection_id, 0x01, output_controls))
+		self.assertEqual(self.control_panel.output_status(connection_id, 0x01).statuses, [False, False, True, False])
+
+	def test_secure_channel(self):
+		device = SimulatedDevice(address=0x02)
+		self.simulator.add_device(device)
+		connection_id = self.start(SimulatedOsdpConnection(self.simulator), 0x02, True, True)
+
+		deadline = time.time() + 5.0
+		while device.scbk is None and time.time() < deadline:
+			time.sleep(0.01)
+		# Keyed from the default key to the one derived from the master key, then used to set up the channel again
+		self.assertIsNotNone(device.scbk)
+		self.assertEqual(self.control_panel.local_status(connection_id, 0x02).tamper, False)
+		self.assertTrue(device.is_security_established)
+
+		leds = ReaderLedControls([ReaderLedControl(
+			0, 0, TemporaryReaderControlCode.Nop, 0, 0, LedColor.Black, LedColor.Black, 0,
+			PermanentReaderControlCode.SetPermanentState, 1, 0, LedColor.Green, LedColor.Black
+		)])
+		self.assertTrue(self.control_panel.reader_led_control(connection_id, 0x02, leds))
+		self.assertEqual(device.reader_led_control_data, leds.build_data())
+
+	def test_generated_card_reads(self):
+		self.simulator.add_device(SimulatedDevice(address=0x03, card_reads_per_second=100.0))
+		stream = self.control_panel.events(event_types=(ReplyType.RawReaderData,))
+		self.start(SimulatedOsdpConnection(self.simulator), 0x03, True, False)
+
+		event = stream.get(timeout=5.0)
+		self.assertEqual(event.address, 0x03)
+		self.assertEqual(event.data.bit_count, 26)
+
+	def test_tcp(self):
+		device = SimulatedDevice(address=0x04)
+		device.press_keys('1234')
+		self.simulator.add_device(device)
+		port = self.simulator.serve_tcp()
+
+		stream = self.control_panel.events(event_types=(ReplyType.KeypadData,))
+		self.start(TcpClientOsdpConnection('127.0.0.1', port), 0x04, True, False)
+		self.assertEqual(stream.get(timeout=5.0).data.data, b'1234')
+
+	def test_repeated_sequence(self):
+		device = SimulatedDevice(address=0x05)
+		command_device = Device(address=0x05, use_crc=True, use_secure_channel=False)
+		command_device.valid_reply_has_been_received()
+		frame = PollCommand(0x05).build_command(command_device)
+
+		device.present_card(bytes([0xAA]), 8)
+		first = device.handle_frame(frame)
+		self.assertEqual(device.handle_frame(frame), first)
+		self.assertEqual(first[5], ReplyType.RawReaderData.value)
+
+		self.assertIsNone(device.handle_frame(PollCommand(0x06).build_command(command_device)))
+		corrupted = frame[:-1] + bytes([frame[-1] ^ 0xFF])
+		self.assertEqual(device.handle_frame(corrupted)[5], ReplyType.Nak.value)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the OSDP TCP servers"""
+
+import asyncio
+import logging
+import os
+import socket
+import sys
+import time
+import unittest
+from threading import Thread
+
+from context import *
+
+log = logging.getLogger('osdp')
+
+
+class TcpServerTestCase(unittest.TestCase):
+
+	"""Test multi-client TCP servers for OSDP Python Module."""
+
+	def setUp(self):
+		"""Setup."""
+		self.simulators = []
+		self.control_panel = ControlPanel()
+		self.server = TcpServer(port_number=0, host='127.0.0.1', read_timeout=0.5)
+
+	def tearDown(self):
+		"""Teardown."""
+		self.control_panel.shutdown()
+		self.server.shutdown()
+		for simulator in self.simulators:
+			simulator.close()
+
+	def connect_peer(self, port: int, address: int) -> socket.socket:
+		simulator = DeviceSimulator([SimulatedDevice(address)])
+		self.simulators.append(simulator)
+		sock = socket.create_connection(('127.0.0.1', port))
+		Thread(target=simulator.serve_socket, args=(sock,), daemon=True).start()
+		return sock
+
+	def wait_online(self, connection_id, address: int, is_online: bool = True):
+		deadline = time.time() + 5.0
+		while self.control_panel.is_online(connection_id, address) != is_online and time.time() < deadline:
+			time.sleep(0.01)
+		return self.control_panel.is_online(connection_id, address)
+
+	def test_peers_started_as_buses(self):
+		buses = {}
+
+		def on_client_connected(connection):
+			address = len(buses) + 1
+			buses[address] = self.control_panel.start_connection(connection)
+			self.control_panel.add_device(buses[address], address, True, False)
+
+		self.server = TcpServer(port_number=0, host='127.0.0.1', on_client_connected=on_client_connected)
+		port = self.server.start()
+		for address in range(1, 4):
+			self.connect_peer(port, address)
+			deadline = time.time() + 5.0
+			while address not in buses and time.time() < deadline:
+				time.sleep(0.01)
+
+		self.assertEqual(len(self.server.connections), 3)
+		for address, connection_id in buses.items():
+			self.assertTrue(self.wait_online(connection_id, address))
+			self.assertEqual(self.control_panel.id_report(connection_id, address).serial_number, address)
+
+	def test_peer_claimed_by_host(self):
+		connection = self.server.connection(peer_host='127.0.0.1')
+		connection_id = self.control_panel.start_connection(connection)
+		self.control_panel.add_device(connection_id, 0x05, True, False)
+		port = self.server.start()
+
+		peer = self.connect_peer(port, 0x05)
+		self.assertTrue(self.wait_online(connection_id, 0x05))
+
+		# Without a connection waiting for it, a second peer is refused
+		refused = socket.create_connection(('127.0.0.1', port))
+		refused.settimeout(5.0)
+		self.assertEqual(refused.recv(1), b'')
+		refused.close()
+
+		# Reconnecting from the same host goes back to the same bus
+		peer.shutdown(socket.SHUT_RDWR)
+		self.assertFalse(self.wait_online(connection_id, 0x05, False))
+		self.connect_peer(port, 0x05)
+		self.assertTrue(self.wait_online(connection_id, 0x05))
+		self.assertEqual(connection.peer_address[0], '127.0.0.1')
+
+	def test_async_server(self):
+		async def run():
+			control_panel = AsyncControlPanel()
+			server = AsyncTcpServer(port_number=0, host='127.0.0.1', read_timeout=0.5)
+			connection_id = control_panel.start_connection(server.connection())
+			control_panel.add_device(connection_id, 0x06, True, False)
+			port = await server.start()
+
+			simulator = DeviceSimulator([SimulatedDevice(0x06)])
+			self.simulators.append(simulator)
+			reader, writer = await asyncio.open_connection('127.0.0.1', port)
+			frame_reader = FrameReader()
+
+			async def serve():
+				while True:
+					data = await reader.read(1024)
+					if not data:
+						return
+					writer.write(simulator.process(frame_reader, data))
+
+			try:
+				serving = asyncio.ensure_future(serve())
+				serial_number = (await asyncio.wait_for(control_panel.id_report(connection_id, 0x06), 5.0)).serial_number
+				serving.cancel()
+			finally:
+				writer.close()
+				await control_panel.shutdown()
+				await server.shutdown()
+			return serial_number
+
+		self.assertEqual(asyncio.run(run()), 0x06)
+
+
+if __name__ == '__main__':
+	unittest.main()